@@ -0,0 +1,196 @@
+import queue
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+# Local imports
+from model import NoisyDuelingMLP, InferenceDuelingMLP
+from replay_buffer import PrioritizedReplayBuffer
+from rollout import BatchRollout
+from enivronment import STATE_FEATURE_SCALES
+from dql_agent import DeferredPriorities, optimize_step, fused_optimize_step, export_policy_net
+from config import *
+
+
+# ---------------- ACTOR SIDE ----------------
+class _TransitionChunks:
+    """
+    push_batch target for an actor's BatchRollout. Rounds are collected
+    locally and shipped to the learner as one chunk of arrays once
+    `chunk_size` transitions are waiting, together with the rewards of the
+    hands that finished in the meantime. Lane ids are offset by
+    `stream_offset`, so every actor's lanes are distinct n-step streams on
+    the learner.
+    """
+    def __init__(self, out_queue, chunk_size, stop, stream_offset=0):
+        self.out_queue = out_queue
+        self.chunk_size = chunk_size
+        self.stop = stop
+        self.stream_offset = stream_offset
+        self.parts = []
+        self.hand_rewards = []
+        self.size = 0
+
+    def push_batch(self, states, actions, rewards, next_states, dones, streams):
+        self.parts.append((states, actions, rewards, next_states, dones, streams + self.stream_offset))
+        self.size += len(states)
+
+    def add_hands(self, hand_rewards):
+        self.hand_rewards.append(hand_rewards)
+
+    def maybe_send(self):
+        if self.size < self.chunk_size:
+            return
+        chunk = tuple(np.concatenate(col) for col in zip(*self.parts))
+        chunk += (np.concatenate(self.hand_rewards),)
+        self.parts, self.hand_rewards, self.size = [], [], 0
+        # Blocks while the learner is ACTOR_QUEUE_DEPTH chunks behind
+        while not self.stop.is_set():
+            try:
+                self.out_queue.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+def _actor_loop(actor_id, shared_net, weights_version, weights_lock, out_queue, stop,
+                seed, lanes, chunk_size):
+    """Play hands with a local copy of the policy, reloading it whenever the learner publishes."""
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+    net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=HIDDEN)
+    version = -1
+    chunks = _TransitionChunks(out_queue, chunk_size, stop, stream_offset=actor_id * lanes)
+    rollout = BatchRollout(net, lanes, device="cpu", reward_scale=REWARD_SCALE,
+                           shaping_coeff=SHAPING_COEFF, seed=seed)
+    while not stop.is_set():
+        if weights_version.value != version:
+            with weights_lock:
+                net.load_state_dict(shared_net.state_dict())
+                version = weights_version.value
+            if ACTOR_INFERENCE_NET:
+                rollout.policy_net = InferenceDuelingMLP(net, noisy=True)
+        net.reset_noise()  # each actor explores with its own noise draws
+        if ACTOR_INFERENCE_NET:
+            rollout.policy_net.fold_head(net, noisy=True)
+        chunks.add_hands(rollout.step(chunks))
+        chunks.maybe_send()
+    out_queue.cancel_join_thread()
+
+
+# ---------------- LEARNER SIDE ----------------
+def _publish(policy_net, shared_net, weights_version, weights_lock):
+    with weights_lock:
+        shared_net.load_state_dict(policy_net.state_dict())
+        weights_version.value += 1
+
+
+def _drain(in_queue, replay, block):
+    """Move every waiting chunk into the replay buffer; returns (hands, reward sum)."""
+    hands, reward_sum = 0, 0.0
+    while True:
+        try:
+            chunk = in_queue.get(timeout=1.0) if block else in_queue.get_nowait()
+        except queue.Empty:
+            return hands, reward_sum
+        block = False
+        states, actions, rewards, next_states, dones, streams, hand_rewards = chunk
+        replay.push_batch(states, actions, rewards, next_states, dones, streams)
+        hands += len(hand_rewards)
+        reward_sum += float(hand_rewards.sum())
+
+
+def train_apex(num_updates=NUM_EPISODES, num_actors=NUM_ACTORS, print_progress=True,
+               log_every=10_000, seed=0):
+    """
+    Ape-X style training: `num_actors` processes play hands with periodically
+    synced copies of the policy and stream transitions to this process,
+    which owns the replay buffer and the optimizer and runs `num_updates`
+    Double-DQN updates with the same step as dql_agent (fused_optimize_step
+    with deferred priorities when FUSED_LEARNER is set). Returns the update
+    count, hands played and wall time of the run.
+    """
+    state_dim = 6
+    ctx = mp.get_context("spawn")
+
+    # ---- Model ----
+    policy_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
+    target_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
+    target_net.load_state_dict(policy_net.state_dict())
+    target_net.eval()
+    optimizer = torch.optim.Adam(policy_net.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+
+    replay = PrioritizedReplayBuffer(REPLAY_CAPACITY, state_shape=(state_dim,), alpha=PER_ALPHA, device=DEVICE,
+                                     feature_scales=STATE_FEATURE_SCALES if REPLAY_COMPACT else None,
+                                     n_step=N_STEP, gamma=GAMMA)
+    priorities = DeferredPriorities(replay)
+
+    # ---- Shared weights + actors ----
+    shared_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN)
+    shared_net.load_state_dict(policy_net.state_dict())
+    shared_net.share_memory()
+    weights_version = ctx.Value("l", 0)
+    weights_lock = ctx.Lock()
+    transitions = ctx.Queue(maxsize=ACTOR_QUEUE_DEPTH)
+    stop = ctx.Event()
+    actors = [
+        ctx.Process(target=_actor_loop, daemon=True,
+                    args=(i, shared_net, weights_version, weights_lock, transitions, stop,
+                          seed + 1 + i, ACTOR_LANES, ACTOR_CHUNK))
+        for i in range(num_actors)
+    ]
+    for p in actors:
+        p.start()
+    print(f"[🟢] Started {num_actors} actors ({ACTOR_LANES} hands in flight each)")
+
+    step_count = 0
+    hands = 0
+    window_hands, window_reward = 0, 0.0
+    smoothed_loss = 0.0
+    start_time = last_log = time.time()
+    try:
+        while step_count < num_updates:
+            n, r = _drain(transitions, replay, block=len(replay) < REPLAY_WARMUP)
+            hands += n
+            window_hands += n
+            window_reward += r
+            if len(replay) < REPLAY_WARMUP:
+                continue
+
+            beta = min(1.0, PER_BETA_START + step_count / PER_BETA_FRAMES)
+            if FUSED_LEARNER:
+                loss = fused_optimize_step(policy_net, target_net, optimizer, replay, beta, priorities)
+            else:
+                loss = optimize_step(policy_net, target_net, optimizer, replay, beta)
+            # Kept on the device; only read back when logging
+            smoothed_loss = 0.99 * smoothed_loss + 0.01 * loss
+
+            step_count += 1
+            policy_net.reset_noise()
+            if step_count % TARGET_UPDATE_STEPS == 0:
+                target_net.load_state_dict(policy_net.state_dict())
+                target_net.reset_noise()
+            if step_count % ACTOR_SYNC_INTERVAL == 0:
+                _publish(policy_net, shared_net, weights_version, weights_lock)
+
+            # ---- Logging ----
+            if print_progress and step_count % log_every == 0:
+                now = time.time()
+                avg_reward = window_reward / max(window_hands, 1)
+                print(f"[Upd {step_count:,}] AvgR={avg_reward:.3f} | Hands={hands:,} "
+                      f"({window_hands / (now - last_log):,.0f}/s) | Replay={len(replay):,} | "
+                      f"Loss={float(smoothed_loss):.4f} | Time={now - start_time:.1f}s")
+                window_hands, window_reward, last_log = 0, 0.0, now
+    finally:
+        stop.set()
+        priorities.flush()
+        _drain(transitions, replay, block=False)
+        for p in actors:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+    elapsed = time.time() - start_time
+    export_policy_net(policy_net)
+    print("[✅] Training complete — final policy exported!")
+    return {"updates": step_count, "hands": hands, "seconds": elapsed}
@@ -0,0 +1,409 @@
+import numpy as np
+import torch
+import torch.nn as nn
+from config import COUNT_BINS, NUM_ACTIONS, NUM_DECKS, MAX_STEPS, SHOE_PENETRATION, ANALYTIC_DEALER
+from dealer_dist import dealer_table
+from enivronment import HILO_TAGS, Shoe, play_single_hand_dqn
+from hand_tables import EMPTY_HAND, NEXT_STATE, HAND_TOTAL, HAND_FEATURES, unpack_hand
+
+HIT, STAND, DOUBLE, SPLIT, SURRENDER = range(5)
+
+
+# ---------------- VECTORIZED HAND HELPERS ----------------
+
+def true_count_bin_arrays(running_count, cards_remaining):
+    """Array version of enivronment.true_count_bin_from_running."""
+    decks_left = np.maximum(cards_remaining / 52.0, 0.25)
+    tc = np.rint(running_count / decks_left).astype(np.int64)
+    tc = np.clip(tc, COUNT_BINS[0], COUNT_BINS[-1])
+    return tc + abs(COUNT_BINS[0])
+
+
+def encode_state_arrays(hands, dealer_up, tc_idx):
+    """Array version of enivronment.encode_hand_state for packed hand states -> (N, 6) float32."""
+    features = HAND_FEATURES[hands]
+    out = np.empty((len(hands), 6), dtype=np.float32)
+    out[:, :2] = features[:, :2]
+    out[:, 2] = (dealer_up - 1) / 9.0
+    out[:, 3] = tc_idx / (len(COUNT_BINS) - 1)
+    out[:, 4:] = features[:, 2:]
+    return out
+
+
+# ---------------- BATCHED ENVIRONMENT ----------------
+class BatchBlackjackEnv:
+    """
+    Plays `num_envs` independent hands in lock-step with NumPy arrays.
+
+    Rules, rewards, count handling and the 6-feature state encoding follow
+    step_blackjack_env / play_single_hand_dqn, so `reset` and `step` return
+    (N, 6) float32 states that can go straight into the policy net and the
+    replay buffer. Each lane owns a persistent shoe like enivronment.Shoe:
+    hands run back to back through it, every dealt card is counted, and the
+    lane is reshuffled on `reset` once its cut card has been passed.
+
+    Differences from the scalar engine, both limited to splits:
+      - a hand can be split once (two hand slots per lane),
+      - the dealer plays once for both split hands.
+
+    With `analytic_dealer`, STAND / DOUBLE hands are settled from the
+    precomputed dealer table (one gather per step) and the dealer only
+    draws for hands that still need it.
+    """
+    def __init__(self, num_envs, num_decks=NUM_DECKS, penetration=SHOE_PENETRATION,
+                 reward_scale=1.0, shaping_coeff=0.0, max_steps=MAX_STEPS, seed=None,
+                 analytic_dealer=ANALYTIC_DEALER):
+        self.num_envs = num_envs
+        self.dealer_table = dealer_table() if analytic_dealer else None
+        self.reward_scale = reward_scale
+        self.shaping_coeff = shaping_coeff
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+
+        one_shoe = np.array([min(r, 10) for r in range(1, 14)] * 4 * num_decks, dtype=np.int8)
+        self.shoe_size = len(one_shoe)
+        self.cut = int(self.shoe_size * penetration)
+        self.shoes = np.tile(one_shoe, (num_envs, 1))
+        self.cursor = np.full(num_envs, self.shoe_size, dtype=np.int64)
+        self.running_count = np.zeros(num_envs, dtype=np.int64)
+
+        # Player hands: two slots per lane (slot 1 only used after a split)
+        self.first_cards = np.zeros((num_envs, 2, 2), dtype=np.int64)
+        self.hand = np.zeros((num_envs, 2), dtype=np.int64)      # packed hand states (hand_tables)
+        self.bet = np.ones((num_envs, 2), dtype=np.int64)
+        self.slot_reward = np.zeros((num_envs, 2), dtype=np.float64)
+        self.slot_vs_dealer = np.zeros((num_envs, 2), dtype=bool)
+        self.num_slots = np.ones(num_envs, dtype=np.int64)
+        self.active_slot = np.zeros(num_envs, dtype=np.int64)
+
+        # Dealer
+        self.dealer_up = np.zeros(num_envs, dtype=np.int64)
+        self.dealer_hand = np.zeros(num_envs, dtype=np.int64)
+        self.dealer_bj = np.zeros(num_envs, dtype=bool)
+
+        self.tc_idx = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.done = np.ones(num_envs, dtype=bool)
+
+    # ---- shoe ----
+    def _shuffle(self, lanes, orders=None):
+        if orders is None:
+            self.shoes[lanes] = self.rng.permuted(self.shoes[lanes], axis=1)
+        else:
+            self.shoes[lanes] = orders
+        self.cursor[lanes] = 0
+        self.running_count[lanes] = 0
+
+    def _draw(self, lanes):
+        empty = lanes[self.cursor[lanes] >= self.shoe_size]
+        if len(empty):
+            self._shuffle(empty)
+        cards = self.shoes[lanes, self.cursor[lanes]].astype(np.int64)
+        self.cursor[lanes] += 1
+        self.running_count[lanes] += HILO_TAGS[cards]
+        return cards
+
+    # ---- public API ----
+    def cards_remaining(self):
+        return self.shoe_size - self.cursor
+
+    def reset(self, lanes=None, shoe_orders=None):
+        """
+        Start a fresh hand in `lanes` (default: all) and return their states.
+        Lanes past the cut card are reshuffled first. `shoe_orders` instead
+        loads a fresh shoe with a fixed card order into every reset lane,
+        shape (len(lanes), 52 * num_decks).
+        """
+        lanes = np.arange(self.num_envs) if lanes is None else np.asarray(lanes, dtype=np.int64)
+        if shoe_orders is not None:
+            self._shuffle(lanes, shoe_orders)
+        else:
+            cut = lanes[self.cursor[lanes] >= self.cut]
+            if len(cut):
+                self._shuffle(cut)
+
+        # Same deal order as the training loop: dealer first, then player
+        d1, d2 = self._draw(lanes), self._draw(lanes)
+        p1, p2 = self._draw(lanes), self._draw(lanes)
+
+        self.dealer_up[lanes] = d1
+        self.dealer_hand[lanes] = NEXT_STATE[NEXT_STATE[EMPTY_HAND, d1], d2]
+        self.dealer_bj[lanes] = (d1 + d2 == 11) & ((d1 == 1) | (d2 == 1))
+
+        self.first_cards[lanes, 0, 0] = p1
+        self.first_cards[lanes, 0, 1] = p2
+        self.hand[lanes] = EMPTY_HAND
+        self.hand[lanes, 0] = NEXT_STATE[NEXT_STATE[EMPTY_HAND, p1], p2]
+        self.bet[lanes] = 1
+        self.slot_reward[lanes] = 0.0
+        self.slot_vs_dealer[lanes] = False
+        self.num_slots[lanes] = 1
+        self.active_slot[lanes] = 0
+
+        self.tc_idx[lanes] = true_count_bin_arrays(self.running_count[lanes], self.cards_remaining()[lanes])
+        self.steps[lanes] = 0
+        self.done[lanes] = False
+        return self._encode(lanes, self.tc_idx[lanes])
+
+    def states(self, lanes=None):
+        """Current states of `lanes`, using the lane's current true count."""
+        lanes = np.arange(self.num_envs) if lanes is None else np.asarray(lanes, dtype=np.int64)
+        tc = true_count_bin_arrays(self.running_count[lanes], self.cards_remaining()[lanes])
+        return self._encode(lanes, tc)
+
+    def step(self, actions):
+        """
+        Apply one action per lane. Lanes that are already done are ignored.
+        Returns (next_states (N, 6), rewards (N,), dones (N,), active (N,)),
+        where `active` marks the lanes that actually took a step. Next states
+        of finished hands are zeros, like play_single_hand_dqn.
+        """
+        actions = np.minimum(np.asarray(actions, dtype=np.int64), NUM_ACTIONS - 1)
+        active = ~self.done
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        finishing = np.zeros(self.num_envs, dtype=bool)   # slot finished this step
+        settle = np.zeros(self.num_envs, dtype=bool)      # lane finished this step
+
+        lanes = np.flatnonzero(active)
+        slot = self.active_slot[lanes]
+        split_lane = self.num_slots[lanes] == 2
+
+        # Out of steps: the current hand is lost
+        timed_out = self.steps[lanes] >= self.max_steps
+        self._finish(lanes[timed_out], slot[timed_out], -1.0, finishing)
+
+        # Naturals (only possible while the active hand has two cards)
+        c0 = self.first_cards[lanes, slot, 0]
+        c1 = self.first_cards[lanes, slot, 1]
+        two_cards = (unpack_hand(self.hand[lanes, slot])[2] == 2) & ~timed_out
+        player_bj = two_cards & (c0 + c1 == 11) & ((c0 == 1) | (c1 == 1))
+        dealer_bj = two_cards & self.dealer_bj[lanes]
+        natural = player_bj | dealer_bj
+        nat_reward = np.where(player_bj & ~dealer_bj, 1.5, np.where(dealer_bj & ~player_bj, -1.0, 0.0))
+        # A natural on the opening hand ends the round outright
+        whole = natural & ~split_lane
+        rewards[lanes[whole]] = nat_reward[whole]
+        self.done[lanes[whole]] = True
+        self._finish(lanes[natural & split_lane], slot[natural & split_lane],
+                     nat_reward[natural & split_lane], finishing)
+
+        live = ~timed_out & ~natural
+        act = actions[lanes]
+
+        # SPLIT (one split per lane)
+        can_split = two_cards & (c0 == c1) & ~split_lane
+        do_split = live & (act == SPLIT) & can_split
+        if do_split.any():
+            self._split(lanes[do_split])
+        # Invalid SPLIT: no-op that uses up a step, as in step_blackjack_env
+        bad_split = live & (act == SPLIT) & ~can_split
+        self.steps[lanes[bad_split]] += 1
+
+        # SURRENDER
+        sur = live & (act == SURRENDER)
+        self._finish(lanes[sur], slot[sur], -0.5, finishing)
+
+        # DOUBLE: one card, then the hand is played out against the dealer
+        dbl = live & (act == DOUBLE)
+        if dbl.any():
+            d_lanes, d_slot = lanes[dbl], slot[dbl]
+            self.steps[d_lanes] += 1
+            over = self.steps[d_lanes] > self.max_steps
+            self._finish(d_lanes[over], d_slot[over], -1.0, finishing)
+            d_lanes, d_slot = d_lanes[~over], d_slot[~over]
+            self._add_card(d_lanes, d_slot, self._draw(d_lanes))
+            self.bet[d_lanes, d_slot] = 2
+            self._stand(d_lanes, d_slot, finishing)
+
+        # HIT
+        hit = live & (act == HIT)
+        if hit.any():
+            h_lanes, h_slot = lanes[hit], slot[hit]
+            self.steps[h_lanes] += 1
+            over = self.steps[h_lanes] > self.max_steps
+            self._finish(h_lanes[over], h_slot[over], -1.0, finishing)
+            h_lanes, h_slot = h_lanes[~over], h_slot[~over]
+            self._add_card(h_lanes, h_slot, self._draw(h_lanes))
+            bust = HAND_TOTAL[self.hand[h_lanes, h_slot]] > 21
+            self._finish(h_lanes[bust], h_slot[bust], -1.0, finishing)
+
+        # STAND
+        std = live & (act == STAND)
+        self._stand(lanes[std], slot[std], finishing)
+
+        # Move split lanes on to their second hand, everything else settles
+        fin_lanes = np.flatnonzero(finishing)
+        to_second = (self.num_slots[fin_lanes] == 2) & (self.active_slot[fin_lanes] == 0)
+        self.active_slot[fin_lanes[to_second]] = 1
+        settle[fin_lanes[~to_second]] = True
+        if settle.any():
+            s_lanes = np.flatnonzero(settle)
+            rewards[s_lanes] = self._settle(s_lanes)
+
+        # Shaping on non-terminal steps of unsplit hands, like play_single_hand_dqn
+        dones = self.done.copy()
+        if self.shaping_coeff != 0.0:
+            shaped = active & ~dones & (self.num_slots == 1)
+            s_lanes = np.flatnonzero(shaped)
+            total = HAND_TOTAL[self.hand[s_lanes, 0]]
+            rewards[s_lanes] += self.shaping_coeff * (total / 21.0)
+
+        next_states = np.zeros((self.num_envs, 6), dtype=np.float32)
+        cont = np.flatnonzero(active & ~dones)
+        if len(cont):
+            next_states[cont] = self.states(cont)
+        return next_states, (rewards * self.reward_scale).astype(np.float32), dones, active
+
+    # ---- internals ----
+    def _encode(self, lanes, tc_idx):
+        slot = self.active_slot[lanes]
+        return encode_state_arrays(self.hand[lanes, slot], self.dealer_up[lanes], tc_idx)
+
+    def _add_card(self, lanes, slot, cards):
+        self.hand[lanes, slot] = NEXT_STATE[self.hand[lanes, slot], cards]
+
+    def _finish(self, lanes, slot, reward, finishing):
+        self.slot_reward[lanes, slot] = reward
+        self.slot_vs_dealer[lanes, slot] = False
+        finishing[lanes] = True
+
+    def _stand(self, lanes, slot, finishing):
+        """Hand done drawing: settle it from the dealer table, or leave it for the dealer."""
+        if self.dealer_table is not None:
+            tc = true_count_bin_arrays(self.running_count[lanes], self.cards_remaining()[lanes])
+            reward = self.dealer_table.stand_ev(self.dealer_up[lanes], tc, HAND_TOTAL[self.hand[lanes, slot]],
+                                                self.bet[lanes, slot])
+            self._finish(lanes, slot, reward, finishing)
+            return
+        self.slot_vs_dealer[lanes, slot] = True
+        finishing[lanes] = True
+
+    def _split(self, lanes):
+        c = self.first_cards[lanes, 0, 0]
+        n1, n2 = self._draw(lanes), self._draw(lanes)
+        for s, new in ((0, n1), (1, n2)):
+            self.first_cards[lanes, s, 0] = c
+            self.first_cards[lanes, s, 1] = new
+            self.hand[lanes, s] = NEXT_STATE[NEXT_STATE[EMPTY_HAND, c], new]
+            self.bet[lanes, s] = 1
+        self.num_slots[lanes] = 2
+        self.active_slot[lanes] = 0
+
+    def _play_dealer(self, lanes):
+        """Dealer draws to 17 in every lane of `lanes`; returns lanes that ran out of steps."""
+        timed_out = np.zeros(self.num_envs, dtype=bool)
+        drawing = lanes
+        while len(drawing):
+            drawing = drawing[HAND_TOTAL[self.dealer_hand[drawing]] < 17]
+            if not len(drawing):
+                break
+            self.steps[drawing] += 1
+            over = self.steps[drawing] > self.max_steps
+            timed_out[drawing[over]] = True
+            drawing = drawing[~over]
+            cards = self._draw(drawing)
+            self.dealer_hand[drawing] = NEXT_STATE[self.dealer_hand[drawing], cards]
+        return timed_out
+
+    def _settle(self, lanes):
+        vs_dealer = self.slot_vs_dealer[lanes]
+        timed_out = self._play_dealer(lanes[vs_dealer.any(axis=1)])[lanes]
+        dealer_total = HAND_TOTAL[self.dealer_hand[lanes]].astype(np.int64)
+
+        player_total = HAND_TOTAL[self.hand[lanes]].astype(np.int64)
+        dt = dealer_total[:, None]
+        bet = self.bet[lanes]
+        outcome = np.where(player_total > 21, -1.0,
+                  np.where((dt > 21) | (player_total > dt), 1.0,
+                  np.where(player_total < dt, -1.0, 0.0)))
+        outcome = np.where(timed_out[:, None], -1.0, outcome)
+        slot_reward = np.where(vs_dealer, outcome * bet, self.slot_reward[lanes])
+        self.slot_reward[lanes] = slot_reward
+
+        split = self.num_slots[lanes] == 2
+        self.done[lanes] = True
+        return np.where(split, slot_reward.mean(axis=1), slot_reward[:, 0])
+
+
+# ---------------- PARITY CHECK ----------------
+def _rule_actions(states):
+    """Fixed, split-free strategy on encoded states, used to drive both engines."""
+    total = np.rint(states[:, 0] * 17 + 4)
+    usable = states[:, 1] > 0.5
+    dealer = np.rint(states[:, 2] * 9 + 1)
+    ncards = np.rint(states[:, 4] * 5)
+    actions = np.full(len(states), HIT, dtype=np.int64)
+    actions[(total >= 17) | ((total >= 13) & (dealer >= 2) & (dealer <= 6))] = STAND
+    actions[usable & (total < 18)] = HIT
+    actions[(ncards == 2) & (total >= 10) & (total <= 11) & (dealer >= 2) & (dealer <= 9)] = DOUBLE
+    actions[(ncards == 2) & ~usable & (total == 16) & ((dealer == 1) | (dealer >= 9))] = SURRENDER
+    return actions
+
+
+class _RulePolicy(nn.Module):
+    """Wraps _rule_actions as one-hot Q-values so play_single_hand_dqn can run it."""
+    def __init__(self):
+        super().__init__()
+        self.anchor = nn.Parameter(torch.zeros(1), requires_grad=False)
+
+    def forward(self, x):
+        actions = torch.as_tensor(_rule_actions(x.cpu().numpy()))
+        return nn.functional.one_hot(actions, NUM_ACTIONS).float()
+
+
+class _TransitionLog:
+    def __init__(self):
+        self.items = []
+
+    def push(self, state, action, reward, next_state, done):
+        self.items.append((np.array(state), int(action), float(reward), np.array(next_state), bool(done)))
+
+
+def check_parity(num_shoes=500, hands_per_shoe=5, seed=0, shaping_coeff=0.01):
+    """
+    Play the same shoes through play_single_hand_dqn (on an enivronment.Shoe)
+    and BatchBlackjackEnv with a fixed strategy, several hands back to back
+    per shoe, and check that every transition, reward, running count and card
+    dealt matches. Splits are excluded because the two engines resolve them
+    differently by design. Returns the number of hands compared.
+    """
+    rng = np.random.default_rng(seed)
+    env = BatchBlackjackEnv(num_shoes, shaping_coeff=shaping_coeff, seed=seed)
+    orders = rng.permuted(env.shoes, axis=1)
+    shoes = [Shoe.from_order(order) for order in orders]
+    policy = _RulePolicy()
+
+    for hand in range(hands_per_shoe):
+        # ---- batched ----
+        batch_logs = [[] for _ in range(num_shoes)]
+        batch_rewards = np.zeros(num_shoes)
+        states = env.reset(shoe_orders=orders if hand == 0 else None)
+        while not env.done.all():
+            actions = _rule_actions(states)
+            next_states, rewards, dones, active = env.step(actions)
+            for i in np.flatnonzero(active):
+                batch_logs[i].append((states[i], int(actions[i]), float(rewards[i]), next_states[i], bool(dones[i])))
+            batch_rewards[active] += rewards[active]
+            states = next_states
+
+        # ---- scalar ----
+        for i, shoe in enumerate(shoes):
+            assert not shoe.needs_shuffle, "parity run crossed the cut card"
+            dealer_hand = [shoe.draw(), shoe.draw()]
+            player_hand = [shoe.draw(), shoe.draw()]
+            log = _TransitionLog()
+            reward, running_count, _ = play_single_hand_dqn(
+                policy, shoe, shoe.running_count, dealer_hand, player_hand, shoe.tc_idx,
+                device=torch.device("cpu"), replay=log,
+                shaping_coeff=shaping_coeff, max_steps=env.max_steps
+            )
+
+            assert len(log.items) == len(batch_logs[i]), f"shoe {i}: transition count differs"
+            for (s, a, r, ns, d), (bs, ba, br, bns, bd) in zip(log.items, batch_logs[i]):
+                assert np.array_equal(s, bs) and np.array_equal(ns, bns), f"shoe {i}: state differs"
+                assert a == ba and d == bd and abs(r - br) < 1e-5, f"shoe {i}: transition differs"
+            assert abs(reward - batch_rewards[i]) < 1e-5, f"shoe {i}: reward differs"
+            assert running_count == shoe.running_count == env.running_count[i], f"shoe {i}: running count differs"
+            assert len(shoe) == env.cards_remaining()[i], f"shoe {i}: cards dealt differ"
+
+    return num_shoes * hands_per_shoe
@@ -0,0 +1,78 @@
+"""
+Q-network forward latency/throughput: training module vs inference exports.
+
+Times the NoisyDuelingMLP itself (eval mode, no_grad), the eager
+InferenceDuelingMLP (noisy means and dueling head folded into one linear),
+its frozen TorchScript export and the int8 dynamically quantized export, at
+batch 1 (one decision, as play_single_hand_dqn) and batch 4096 (a
+BatchRollout / evaluation round). Also reports how often each export picks
+the same action as the training module.
+
+    python benchmarks/bench_inference.py
+    python benchmarks/bench_inference.py --hidden 256 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from config import HIDDEN, NUM_ACTIONS  # noqa: E402
+from model import InferenceDuelingMLP, NoisyDuelingMLP, export_inference_net  # noqa: E402
+
+
+def _seconds_per_call(net, batch, repeats):
+    x = torch.rand(batch, 6)
+    with torch.no_grad():
+        for _ in range(5):  # warm-up (TorchScript profiles the first runs)
+            net(x)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            net(x)
+    return (time.perf_counter() - start) / repeats
+
+
+def run(hidden=HIDDEN, repeats_small=3_000, repeats_large=40, seed=0):
+    """Return {name: {"latency_us", "throughput", "agreement"}} per network variant."""
+    torch.manual_seed(seed)
+    net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden).eval()
+    variants = {
+        "training": net,
+        "folded": InferenceDuelingMLP(net),
+        "script": export_inference_net(net),
+        "script_int8": export_inference_net(net, quantize=True),
+    }
+    probe = torch.rand(4096, 6)
+    with torch.no_grad():
+        reference = net(probe).argmax(1)
+    results = {}
+    for name, variant in variants.items():
+        with torch.no_grad():
+            agreement = (variant(probe).argmax(1) == reference).float().mean().item()
+        results[name] = {
+            "latency_us": _seconds_per_call(variant, 1, repeats_small) * 1e6,
+            "throughput": 4096 / _seconds_per_call(variant, 4096, repeats_large),
+            "agreement": agreement,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    results = run(args.hidden)
+    base = results["training"]
+    for name, r in results.items():
+        print(f"{name:>12}: batch-1 {r['latency_us']:7.1f} us ({base['latency_us'] / r['latency_us']:.2f}x) | "
+              f"batch-4096 {r['throughput']:10,.0f} states/s ({r['throughput'] / base['throughput']:.2f}x) | "
+              f"same action {r['agreement']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
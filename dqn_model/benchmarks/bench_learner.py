@@ -0,0 +1,82 @@
+"""
+Learner steps/sec: optimize_step vs fused_optimize_step.
+
+optimize_step runs policy_net(ns), target_net(ns) and policy_net(s) (twice
+while BC is on), then copies the TD errors to the host for every batch.
+fused_optimize_step does one policy forward over [s; ns], reuses the logits
+for the BC loss and batches priority updates through DeferredPriorities.
+Both run on the same filled PrioritizedReplayBuffer, with and without BC.
+
+    python benchmarks/bench_learner.py
+    python benchmarks/bench_learner.py --steps 500 --hidden 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from config import BATCH_SIZE, HIDDEN, LR, NUM_ACTIONS, WEIGHT_DECAY  # noqa: E402
+from dql_agent import DeferredPriorities, fused_optimize_step, optimize_step  # noqa: E402
+from model import NoisyDuelingMLP  # noqa: E402
+from bench_prefetch import _filled_buffer  # noqa: E402
+
+
+def _steps_per_sec(replay, fused, bc_weight, steps, hidden, batch_size, seed):
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    policy_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    target_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    target_net.load_state_dict(policy_net.state_dict())
+    optimizer = torch.optim.Adam(policy_net.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+    priorities = DeferredPriorities(replay)
+
+    def step():
+        if fused:
+            fused_optimize_step(policy_net, target_net, optimizer, replay, 0.5, priorities,
+                                bc_weight=bc_weight, batch_size=batch_size)
+        else:
+            optimize_step(policy_net, target_net, optimizer, replay, 0.5,
+                          bc_weight=bc_weight, batch_size=batch_size)
+        policy_net.reset_noise()
+
+    step()  # warm-up
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    priorities.flush()
+    return steps / (time.perf_counter() - start)
+
+
+def run(capacity=500_000, steps=300, hidden=HIDDEN, batch_size=BATCH_SIZE, seed=0):
+    """Return {"<path>_<td|bc>": steps/s} for both learner paths."""
+    replay = _filled_buffer(capacity, seed)
+    results = {}
+    for label, bc_weight in (("td", 0.0), ("bc", 1.0)):
+        for path, fused in (("current", False), ("fused", True)):
+            results[f"{path}_{label}"] = _steps_per_sec(replay, fused, bc_weight, steps,
+                                                        hidden, batch_size, seed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=500_000)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    results = run(args.capacity, args.steps, args.hidden, args.batch_size)
+    for label in ("td", "bc"):
+        base = results[f"current_{label}"]
+        for path in ("current", "fused"):
+            rate = results[f"{path}_{label}"]
+            print(f"{path + '_' + label:>12}: {rate:8.1f} steps/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Wall-clock time to a target evaluation EV, 1-step vs n-step replay.
+
+Runs _train_and_export_core once per (N_STEP, seed) in a scratch directory
+(final export skipped) with the usual background evaluations every
+--eval-every episodes, and records how long training took to produce the
+first policy whose eval EV reaches the target: --target, or else basic
+strategy's EV on the same shoes minus --margin. The clock of an evaluation
+is read when its policy snapshot was taken, not when its result came back.
+Evaluation size and every other setting come from config.py
+(DQN_CONFIG_OVERRIDES applies as usual).
+
+    python benchmarks/bench_nstep.py
+    python benchmarks/bench_nstep.py --n-steps 1 3 5 --seeds 0 1 2 --episodes 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import dql_agent  # noqa: E402
+
+
+def _time_to_target(n_step, seed, episodes, eval_every, target, margin):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    clock = {}        # episode -> seconds since start, taken as its eval snapshot is submitted
+    hit = {}
+    windows = [0]
+
+    def should_stop():
+        windows[0] += 1
+        clock[windows[0] * eval_every] = time.perf_counter() - start
+        return bool(hit)
+
+    def on_eval(episode, result):
+        ev = result["policies"]["net"]["ev"]
+        goal = target if target is not None else result["policies"]["basic"]["ev"] - margin
+        if not hit and ev >= goal:
+            # The final evaluation may come after the last window
+            seconds = clock.get(episode, time.perf_counter() - start)
+            hit.update(episode=episode, seconds=seconds, ev=float(ev), target=float(goal))
+
+    export, n_step_before = dql_agent.export_policy_net, dql_agent.N_STEP
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        dql_agent.export_policy_net = lambda policy_net, device=None: None
+        dql_agent.N_STEP = n_step
+        try:
+            start = time.perf_counter()
+            dql_agent._train_and_export_core(episodes, print_progress=True, reward_window=eval_every,
+                                             eval_callback=on_eval, should_stop=should_stop)
+            elapsed = time.perf_counter() - start
+        finally:
+            dql_agent.export_policy_net, dql_agent.N_STEP = export, n_step_before
+            os.chdir(cwd)
+    return {"reached": bool(hit), **hit, "run_seconds": elapsed}
+
+
+def run(n_steps=(1, 3), seeds=(0,), episodes=100_000, eval_every=5_000, target=None, margin=0.01):
+    """
+    Return {"n<k>": {"runs": [per-seed result], "median_seconds": ...}};
+    median_seconds counts a run that never reached the target as infinite.
+    """
+    results = {}
+    for n_step in n_steps:
+        runs = [dict(seed=seed, **_time_to_target(n_step, seed, episodes, eval_every, target, margin))
+                for seed in seeds]
+        times = [r["seconds"] if r["reached"] else float("inf") for r in runs]
+        results[f"n{n_step}"] = {"runs": runs, "median_seconds": float(np.median(times))}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-steps", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--episodes", type=int, default=100_000, help="training budget per run")
+    parser.add_argument("--eval-every", type=int, default=5_000)
+    parser.add_argument("--target", type=float, help="absolute EV per hand (default: basic EV - margin)")
+    parser.add_argument("--margin", type=float, default=0.01)
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.n_steps, args.seeds, args.episodes, args.eval_every, args.target, args.margin)
+    print(f"{'N_STEP':>6}  {'seed':>4}  {'episode':>9}  {'seconds':>9}  {'EV':>8}  {'target':>8}")
+    for name, result in results.items():
+        for r in result["runs"]:
+            if r["reached"]:
+                print(f"{name[1:]:>6}  {r['seed']:>4}  {r['episode']:>9,}  {r['seconds']:>9.1f}  "
+                      f"{r['ev']:>+8.4f}  {r['target']:>+8.4f}")
+            else:
+                print(f"{name[1:]:>6}  {r['seed']:>4}  {'-':>9}  {'-':>9}  not reached in {r['run_seconds']:.1f}s")
+    base = results.get("n1", {}).get("median_seconds")
+    for name, result in results.items():
+        speedup = (f" ({base / result['median_seconds']:.2f}x vs 1-step)"
+                   if name != "n1" and base is not None and np.isfinite(base) else "")
+        print(f"[✅] N_STEP={name[1:]}: median time to target {result['median_seconds']:.1f}s{speedup}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Learner steps/sec with inline sampling vs the background PrefetchSampler.
+
+Fills a compact PrioritizedReplayBuffer with random transitions and runs
+optimize_step (the same Double-DQN update the training loop uses) for a
+fixed number of steps, first sampling inline and then through
+PrefetchSampler at each requested depth.
+
+    python benchmarks/bench_prefetch.py
+    python benchmarks/bench_prefetch.py --steps 500 --depths 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from config import BATCH_SIZE, HIDDEN, LR, NUM_ACTIONS, PER_ALPHA, WEIGHT_DECAY  # noqa: E402
+from dql_agent import optimize_step  # noqa: E402
+from enivronment import STATE_FEATURE_SCALES  # noqa: E402
+from model import NoisyDuelingMLP  # noqa: E402
+from replay_buffer import PrefetchSampler, PrioritizedReplayBuffer  # noqa: E402
+
+
+def _filled_buffer(capacity, seed):
+    rng = np.random.default_rng(seed)
+    replay = PrioritizedReplayBuffer(capacity, state_shape=(6,), alpha=PER_ALPHA,
+                                     feature_scales=STATE_FEATURE_SCALES)
+    limits = np.array(STATE_FEATURE_SCALES) + 1
+    states = rng.integers(0, limits, (capacity, 6)) / np.array(STATE_FEATURE_SCALES, dtype=np.float64)
+    replay.push_batch(states, rng.integers(0, NUM_ACTIONS, capacity), rng.normal(size=capacity),
+                      states[::-1], rng.integers(0, 2, capacity))
+    return replay
+
+
+def _steps_per_sec(replay, steps, hidden, batch_size, seed):
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    policy_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    target_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    target_net.load_state_dict(policy_net.state_dict())
+    optimizer = torch.optim.Adam(policy_net.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+
+    optimize_step(policy_net, target_net, optimizer, replay, 0.5, batch_size=batch_size)  # warm-up
+    start = time.perf_counter()
+    for _ in range(steps):
+        optimize_step(policy_net, target_net, optimizer, replay, 0.5, batch_size=batch_size)
+        policy_net.reset_noise()
+    return steps / (time.perf_counter() - start)
+
+
+def run(capacity=500_000, steps=300, depths=(1, 2, 4), hidden=HIDDEN, batch_size=BATCH_SIZE, seed=0):
+    """Return {"inline": steps/s, "prefetch_<depth>": steps/s, ...}."""
+    replay = _filled_buffer(capacity, seed)
+    results = {"inline": _steps_per_sec(replay, steps, hidden, batch_size, seed)}
+    for depth in depths:
+        sampler = PrefetchSampler(replay, batch_size, depth=depth)
+        results[f"prefetch_{depth}"] = _steps_per_sec(sampler, steps, hidden, batch_size, seed)
+        sampler.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=500_000)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    args = parser.parse_args()
+
+    results = run(args.capacity, args.steps, args.depths, args.hidden)
+    base = results["inline"]
+    for name, rate in results.items():
+        print(f"{name:>12}: {rate:8.1f} steps/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Replay buffer latency benchmark.
+
+Fills a PrioritizedReplayBuffer at each capacity with random priorities and
+times push, sample and update_priorities. The legacy column replays the old
+O(N) sampling path (priorities ** alpha, normalize, np.random.choice) on the
+same priorities for comparison.
+
+    python benchmarks/bench_replay.py
+    python benchmarks/bench_replay.py --capacities 10000 100000
+    python benchmarks/bench_replay.py --compact        # uint8 state storage
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from enivronment import STATE_FEATURE_SCALES  # noqa: E402
+from replay_buffer import PrioritizedReplayBuffer  # noqa: E402
+
+CAPACITIES = [10_000, 100_000, 1_000_000, 5_000_000]
+
+
+def _time_per_call(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def _filled_buffer(capacity, alpha, seed, compact=False):
+    rng = np.random.default_rng(seed)
+    replay = PrioritizedReplayBuffer(capacity, state_shape=(6,), alpha=alpha,
+                                     feature_scales=STATE_FEATURE_SCALES if compact else None)
+    codes = rng.integers(0, 5, (capacity, 6))
+    replay.states[:] = codes
+    replay.next_states[:] = codes
+    replay.actions[:] = rng.integers(0, 5, capacity)
+    replay._set_priorities(np.arange(capacity), rng.random(capacity) + 1e-5)
+    replay.size = capacity
+    return replay
+
+
+def run(capacities=CAPACITIES, batch_size=512, alpha=0.7, repeats=50, legacy=True, compact=False, seed=0):
+    """Return one dict of per-call latencies (seconds) and memory per capacity."""
+    np.random.seed(seed)
+    state = np.zeros(6, dtype=np.float32)
+    results = []
+    for capacity in capacities:
+        replay = _filled_buffer(capacity, alpha, seed, compact)
+        idxs = np.random.randint(0, capacity, batch_size)
+        tds = np.random.random(batch_size)
+        row = {
+            "capacity": capacity,
+            "compact": compact,
+            "nbytes": replay.nbytes(),
+            "push": _time_per_call(lambda: replay.push(state, 0, 0.0, state, False), repeats * 10),
+            "sample": _time_per_call(lambda: replay.sample(batch_size, beta=0.5), repeats),
+            "update_priorities": _time_per_call(lambda: replay.update_priorities(idxs, tds), repeats),
+        }
+        if legacy:
+            raw = replay.sum_tree.leaves(np.arange(capacity)) ** (1 / alpha)
+
+            def legacy_sample():
+                scaled = raw ** alpha
+                probs = scaled / scaled.sum()
+                np.random.choice(capacity, batch_size, p=probs, replace=True)
+            row["legacy_sample"] = _time_per_call(legacy_sample, max(3, repeats // 10))
+        results.append(row)
+        del replay
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacities", type=int, nargs="+", default=CAPACITIES)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--no-legacy", action="store_true")
+    parser.add_argument("--compact", action="store_true", help="uint8 state storage")
+    args = parser.parse_args()
+
+    rows = run(args.capacities, args.batch_size, repeats=args.repeats,
+               legacy=not args.no_legacy, compact=args.compact)
+    print(f"{'capacity':>10} {'MB':>8} {'push us':>9} {'sample ms':>10} {'update ms':>10} {'legacy sample ms':>17}")
+    for row in rows:
+        legacy = f"{row['legacy_sample'] * 1e3:17.2f}" if "legacy_sample" in row else f"{'-':>17}"
+        print(f"{row['capacity']:>10,} {row['nbytes'] / 2**20:8.1f} {row['push'] * 1e6:9.1f} "
+              f"{row['sample'] * 1e3:10.3f} {row['update_priorities'] * 1e3:10.3f} {legacy}")
+
+
+if __name__ == "__main__":
+    main()
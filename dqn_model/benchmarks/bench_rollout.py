@@ -0,0 +1,76 @@
+"""
+Policy decisions/sec: per-hand play_single_hand_dqn vs batched BatchRollout.
+
+The scalar path plays hands one at a time through a persistent Shoe with a
+batch-1 forward pass per decision, as the training loop does. BatchRollout
+keeps N hands in flight and picks all their actions with one forward pass
+per round. Both push every transition into a ReplayBuffer.
+
+    python benchmarks/bench_rollout.py
+    python benchmarks/bench_rollout.py --lanes 1 64 1024 --hands 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from config import HIDDEN, MAX_STEPS, NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION  # noqa: E402
+from enivronment import Shoe, shoe_draw, play_single_hand_dqn  # noqa: E402
+from model import NoisyDuelingMLP  # noqa: E402
+from replay_buffer import ReplayBuffer  # noqa: E402
+from rollout import BatchRollout  # noqa: E402
+
+
+def _scalar_rate(policy_net, hands, seed):
+    replay = ReplayBuffer(hands * 4, state_shape=(6,))
+    shoe = Shoe(NUM_DECKS, penetration=SHOE_PENETRATION)
+    start = time.perf_counter()
+    for _ in range(hands):
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+        dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
+        player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
+        play_single_hand_dqn(policy_net, shoe, shoe.running_count, dealer_hand, player_hand,
+                             shoe.tc_idx, device="cpu", replay=replay, step_counter=0, max_steps=MAX_STEPS)
+    return len(replay) / (time.perf_counter() - start)
+
+
+def _batched_rate(policy_net, lanes, hands, seed):
+    replay = ReplayBuffer(hands * 4 + lanes * MAX_STEPS, state_shape=(6,))
+    rollout = BatchRollout(policy_net, lanes, device="cpu", seed=seed)
+    rollout.step(replay)  # warm-up
+    start = time.perf_counter()
+    decisions = rollout.decisions
+    rollout.play_hands(hands, replay)
+    return (rollout.decisions - decisions) / (time.perf_counter() - start)
+
+
+def run(lanes=(1, 16, 256, 4096), hands=10_000, hidden=HIDDEN, seed=0):
+    """Return {"scalar": decisions/s, "batch_<lanes>": decisions/s, ...}."""
+    torch.manual_seed(seed)
+    policy_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    policy_net.eval()
+    results = {"scalar": _scalar_rate(policy_net, hands, seed)}
+    for n in lanes:
+        results[f"batch_{n}"] = _batched_rate(policy_net, n, hands, seed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lanes", type=int, nargs="+", default=[1, 16, 256, 4096])
+    parser.add_argument("--hands", type=int, default=10_000)
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    args = parser.parse_args()
+
+    results = run(args.lanes, args.hands, args.hidden)
+    base = results["scalar"]
+    for name, rate in results.items():
+        print(f"{name:>12}: {rate:10.0f} decisions/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
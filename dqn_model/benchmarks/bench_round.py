@@ -0,0 +1,77 @@
+"""
+Hands/sec and cards/round: per-seat dealers vs the single-round table engine.
+
+The legacy path is the old training-loop round: every PLAYER_TYPES seat
+plays against its own dealer draws through play_fixed_player, then the DQN
+hand plays through play_single_hand_dqn. play_round deals the same table
+but resolves every player decision first and runs the dealer once.
+
+    python benchmarks/bench_round.py
+    python benchmarks/bench_round.py --rounds 20000 --hidden 128
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from config import HIDDEN, MAX_STEPS, NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION  # noqa: E402
+from enivronment import (Shoe, shoe_draw, play_fixed_player, play_single_hand_dqn,  # noqa: E402
+                         play_round, PLAYER_TYPES)
+from model import NoisyDuelingMLP  # noqa: E402
+
+
+def _legacy_round(policy_net, shoe):
+    dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
+    for strat_fn in PLAYER_TYPES:
+        play_fixed_player([shoe_draw(shoe), shoe_draw(shoe)], dealer_hand[0], shoe, shoe.running_count, strat_fn)
+    player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
+    play_single_hand_dqn(policy_net, shoe, shoe.running_count, dealer_hand, player_hand,
+                         shoe.tc_idx, device="cpu", replay=None, step_counter=0, max_steps=MAX_STEPS)
+
+
+def _table_round(policy_net, shoe):
+    play_round(shoe, policy_net, PLAYER_TYPES, device="cpu", max_steps=MAX_STEPS)
+
+
+def _measure(round_fn, policy_net, rounds):
+    shoe = Shoe(NUM_DECKS, penetration=SHOE_PENETRATION)
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+        before = shoe.cursor
+        round_fn(policy_net, shoe)
+        cards += shoe.cursor - before
+    elapsed = time.perf_counter() - start
+    hands = rounds * (len(PLAYER_TYPES) + 1)
+    return {"hands_per_sec": hands / elapsed, "cards_per_round": cards / rounds}
+
+
+def run(rounds=10_000, hidden=HIDDEN, seed=0):
+    """Return {"legacy": {...}, "play_round": {...}} with hands/s and cards/round."""
+    torch.manual_seed(seed)
+    policy_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    policy_net.eval()
+    return {"legacy": _measure(_legacy_round, policy_net, rounds),
+            "play_round": _measure(_table_round, policy_net, rounds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10_000)
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    args = parser.parse_args()
+
+    results = run(args.rounds, args.hidden)
+    base = results["legacy"]["hands_per_sec"]
+    for name, r in results.items():
+        print(f"{name:>12}: {r['hands_per_sec']:9.0f} hands/s  ({r['hands_per_sec'] / base:.2f}x)  "
+              f"{r['cards_per_round']:.2f} cards/round")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Seeded benchmark suite: env, replay, model, end-to-end training and Ape-X throughput.
+
+Runs offline with fixed seeds and writes one JSON file of metrics plus the
+machine / library versions they were taken on. Metric names end in
+"_per_sec" (higher is better) or "_us" (lower is better); --compare checks
+every shared metric against a stored baseline and exits 1 when one is worse
+by more than --tolerance.
+
+    python benchmarks/suite.py --out benchmarks/results.json
+    python benchmarks/suite.py --quick --rounds 1 --compare benchmarks/baseline.json
+    python benchmarks/suite.py --only env model
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import apex  # noqa: E402
+import dql_agent  # noqa: E402
+from config import HIDDEN, MAX_STEPS, NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION  # noqa: E402
+from enivronment import (Shoe, make_shoe, shoe_draw, play_fixed_player,  # noqa: E402
+                         play_single_hand_dqn, PLAYER_TYPES)
+from model import NoisyDuelingMLP  # noqa: E402
+from replay_buffer import ReplayBuffer  # noqa: E402
+from bench_replay import _filled_buffer, _time_per_call  # noqa: E402
+
+SECTIONS = ("env", "replay", "model", "train", "apex")
+
+
+def _seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def _rate(fn, n):
+    for _ in range(max(n // 10, 1)):  # warm-up
+        fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+
+# ---------------- SECTIONS ----------------
+def bench_env(hands, hidden, seed):
+    """Hands/sec of play_fixed_player per PLAYER_TYPES strategy and of play_single_hand_dqn, make_shoe cost."""
+    _seed(seed)
+    out = {}
+    shoe = Shoe(NUM_DECKS, penetration=SHOE_PENETRATION, rng=np.random.default_rng(seed))
+
+    def deal():
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+        return [shoe_draw(shoe), shoe_draw(shoe)], shoe_draw(shoe)
+
+    for strat_fn in PLAYER_TYPES:
+        def fixed_hand():
+            cards, up = deal()
+            play_fixed_player(cards, up, shoe, shoe.running_count, strat_fn)
+        out[f"env.play_fixed_player.{strat_fn.__name__}.hands_per_sec"] = _rate(fixed_hand, hands)
+
+    policy_net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden).eval()
+
+    def dqn_hand():
+        cards, up = deal()
+        play_single_hand_dqn(policy_net, shoe, shoe.running_count, [up, shoe_draw(shoe)], cards,
+                             shoe.tc_idx, device="cpu", replay=None, step_counter=0, max_steps=MAX_STEPS)
+    out["env.play_single_hand_dqn.hands_per_sec"] = _rate(dqn_hand, max(hands // 4, 1))
+    out["env.make_shoe_us"] = _time_per_call(make_shoe, 200) * 1e6
+    out["env.shoe_shuffle_us"] = _time_per_call(shoe.shuffle, 2_000) * 1e6
+    return out
+
+
+def bench_replay(capacities, batch_size, repeats, seed):
+    """push / push_batch / sample / update_priorities latency per capacity, uniform and prioritized."""
+    _seed(seed)
+    out = {}
+    state = np.zeros(6, dtype=np.float32)
+    batch = [np.zeros((batch_size, 6), np.float32), np.zeros(batch_size, np.int64),
+             np.zeros(batch_size, np.float32), np.zeros((batch_size, 6), np.float32),
+             np.zeros(batch_size, np.float32)]
+    for capacity in capacities:
+        per = _filled_buffer(capacity, 0.7, seed)
+        idxs = np.random.randint(0, capacity, batch_size)
+        tds = np.random.random(batch_size)
+        key = f"replay.per.{capacity}"
+        out[f"{key}.push_us"] = _time_per_call(lambda: per.push(state, 0, 0.0, state, False), repeats * 10) * 1e6
+        out[f"{key}.push_batch_us"] = _time_per_call(lambda: per.push_batch(*batch), repeats) * 1e6
+        out[f"{key}.sample_us"] = _time_per_call(lambda: per.sample(batch_size, beta=0.5), repeats) * 1e6
+        out[f"{key}.update_priorities_us"] = _time_per_call(lambda: per.update_priorities(idxs, tds),
+                                                            repeats) * 1e6
+        del per
+
+        uniform = ReplayBuffer(capacity, state_shape=(6,))
+        for _ in range(-(-capacity // 65_536)):
+            n = min(65_536, capacity)
+            uniform.push_batch(np.zeros((n, 6), np.float32), np.zeros(n, np.int64), np.zeros(n, np.float32),
+                               np.zeros((n, 6), np.float32), np.zeros(n, np.float32))
+        key = f"replay.uniform.{capacity}"
+        out[f"{key}.push_us"] = _time_per_call(lambda: uniform.push(state, 0, 0.0, state, False),
+                                               repeats * 10) * 1e6
+        out[f"{key}.sample_us"] = _time_per_call(lambda: uniform.sample(batch_size), repeats) * 1e6
+        del uniform
+    return out
+
+
+def bench_model(hidden, repeats, seed):
+    """NoisyDuelingMLP forward (no_grad) and forward+backward+Adam step at batch 1 and 512."""
+    _seed(seed)
+    out = {}
+    net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+    optimizer = torch.optim.Adam(net.parameters(), lr=1e-4)
+    for batch in (1, 512):
+        x = torch.rand(batch, 6)
+        net.eval()
+        with torch.no_grad():
+            out[f"model.forward.b{batch}_us"] = _time_per_call(lambda: net(x), repeats) * 1e6
+        net.train()
+
+        def train_step():
+            optimizer.zero_grad()
+            net(x).square().mean().backward()
+            optimizer.step()
+        out[f"model.train_step.b{batch}_us"] = _time_per_call(train_step, max(repeats // 10, 3)) * 1e6
+    return out
+
+
+def bench_train(episodes, seed):
+    """
+    Episodes/sec of _train_and_export_core over `episodes` episodes (replay
+    pre-fill included, final export skipped), run in a scratch directory.
+    """
+    _seed(seed)
+    export = dql_agent.export_policy_net
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        dql_agent.export_policy_net = lambda policy_net, device=None: None
+        try:
+            start = time.perf_counter()
+            dql_agent._train_and_export_core(episodes, print_progress=False)
+            elapsed = time.perf_counter() - start
+        finally:
+            dql_agent.export_policy_net = export
+            os.chdir(cwd)
+    return {"train.episodes_per_sec": episodes / elapsed}
+
+
+def bench_apex(actor_counts, updates, seed):
+    """
+    Hands/sec the actors deliver and learner updates/sec of train_apex with
+    each number of actors, `updates` updates per run (replay warm-up
+    included, final export skipped), run in a scratch directory.
+    """
+    out = {}
+    export = apex.export_policy_net
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        apex.export_policy_net = lambda policy_net, device=None: None
+        try:
+            for n in actor_counts:
+                _seed(seed)
+                stats = apex.train_apex(updates, num_actors=n, print_progress=False, seed=seed)
+                out[f"apex.actors{n}.hands_per_sec"] = stats["hands"] / stats["seconds"]
+                out[f"apex.actors{n}.updates_per_sec"] = stats["updates"] / stats["seconds"]
+        finally:
+            apex.export_policy_net = export
+            os.chdir(cwd)
+    return out
+
+
+# ---------------- SUITE ----------------
+def _environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        rev = ""
+    return {"python": platform.python_version(), "numpy": np.__version__, "torch": torch.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(), "git": rev,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _best(a, b):
+    return {k: (max if k.endswith("_per_sec") else min)(v, b[k]) for k, v in a.items()}
+
+
+def run(sections=SECTIONS, quick=False, hidden=HIDDEN, seed=0, rounds=1):
+    """
+    Return {"environment": {...}, "settings": {...}, "metrics": {name: value}},
+    keeping the best value of each metric over `rounds` repetitions.
+    """
+    settings = {
+        "hidden": hidden, "seed": seed, "quick": quick, "rounds": rounds,
+        "hands": 2_000 if quick else 20_000,
+        "capacities": [10_000, 100_000] if quick else [10_000, 100_000, 1_000_000],
+        "batch_size": 512,
+        "repeats": 20 if quick else 100,
+        "train_episodes": 100 if quick else 500,
+        "apex_actors": [1, 2] if quick else [1, 2, 4],
+        "apex_updates": 200 if quick else 2_000,
+    }
+    metrics = None
+    for _ in range(rounds):
+        current = {}
+        if "env" in sections:
+            current.update(bench_env(settings["hands"], hidden, seed))
+        if "replay" in sections:
+            current.update(bench_replay(settings["capacities"], settings["batch_size"], settings["repeats"], seed))
+        if "model" in sections:
+            current.update(bench_model(hidden, settings["repeats"], seed))
+        if "train" in sections:
+            current.update(bench_train(settings["train_episodes"], seed))
+        if "apex" in sections:
+            current.update(bench_apex(settings["apex_actors"], settings["apex_updates"], seed))
+        metrics = current if metrics is None else _best(metrics, current)
+    return {"environment": _environment(), "settings": settings, "metrics": metrics}
+
+
+def compare(results, baseline, tolerance=0.10):
+    """
+    Rows of (metric, baseline, current, change, regressed) for the metrics in
+    both runs. change > 0 is always an improvement; a metric regresses when
+    it is worse than the baseline by more than `tolerance`.
+    """
+    rows = []
+    for name, base in baseline["metrics"].items():
+        if name not in results["metrics"] or not base:
+            continue
+        current = results["metrics"][name]
+        ratio = current / base
+        change = ratio - 1 if name.endswith("_per_sec") else 1 / ratio - 1
+        rows.append((name, base, current, change, change < -tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.json"))
+    parser.add_argument("--compare", help="baseline JSON written by an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    parser.add_argument("--hidden", type=int, default=HIDDEN)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="repetitions; the best value per metric is kept")
+    args = parser.parse_args()
+
+    results = run(args.only, args.quick, args.hidden, args.seed, args.rounds)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, value in results["metrics"].items():
+        print(f"{name:<48} {value:14,.2f}")
+    print(f"[✅] Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        regressions = [r for r in rows if r[4]]
+        for name, base, current, change, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<48} {base:14,.2f} -> {current:14,.2f} ({change:+.1%}){flag}")
+        print(f"[{'❌' if regressions else '✅'}] {len(regressions)} of {len(rows)} metrics regressed "
+              f"by more than {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
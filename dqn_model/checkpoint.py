@@ -0,0 +1,178 @@
+import os
+import random
+import shutil
+import numpy as np
+import torch
+from config import CHECKPOINT_KEEP, DEVICE
+from enivronment import Shoe
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+
+# Layout of one checkpoint directory (<root>/ep<episode>/):
+#   state.pt     nets, Adam state, counters, RNG states, shoe, replay scalars
+#   replay/*.npy transition arrays and the sum / min priority trees
+# Partial n-step windows are not saved: hands in flight are re-dealt on resume.
+# <root>/latest names the newest complete checkpoint; it is only replaced
+# once that checkpoint is fully written, so a crash mid-save leaves the
+# previous one in place.
+_TRANSITION_ARRAYS = ("states", "actions", "rewards", "next_states", "dones")
+_PRIORITY_ARRAYS = {"sum_tree": ("sum_tree", "tree"), "min_tree": ("min_tree", "tree")}
+
+
+# ---------------- RNG / SHOE STATE ----------------
+def rng_state():
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def shoe_state(shoe):
+    return {"cards": shoe.cards.copy(), "cut": shoe.cut, "cursor": shoe.cursor,
+            "running_count": shoe.running_count, "tc_idx": shoe.tc_idx, "rng": shoe.rng.bit_generator.state}
+
+
+def restore_shoe(state):
+    """Shoe dealing on from exactly where shoe_state() left it."""
+    cards = state["cards"]
+    shoe = Shoe(len(cards) // 52, penetration=state["cut"] / len(cards))
+    shoe.cards[:] = cards
+    shoe.cut = state["cut"]
+    shoe.cursor, shoe.running_count, shoe.tc_idx = state["cursor"], state["running_count"], state["tc_idx"]
+    shoe.rng.bit_generator.state = state["rng"]
+    return shoe
+
+
+# ---------------- REPLAY ARRAYS ----------------
+def _replay_arrays(replay):
+    arrays = {name: getattr(replay, name) for name in _TRANSITION_ARRAYS}
+    if isinstance(replay, PrioritizedReplayBuffer):
+        for name, path in _PRIORITY_ARRAYS.items():
+            obj = replay
+            for attr in path:
+                obj = getattr(obj, attr)
+            arrays[name] = obj
+    return arrays
+
+
+def save_replay(replay, path):
+    """
+    Write the buffer arrays as .npy files under `path` (straight from the
+    buffer memory, no staging copy) and return the scalars needed to
+    rebuild it.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, array in _replay_arrays(replay).items():
+        np.save(os.path.join(path, name + ".npy"), array)
+    meta = {"prioritized": isinstance(replay, PrioritizedReplayBuffer), "capacity": replay.capacity,
+            "state_shape": replay.states.shape[1:], "position": replay.position, "size": replay.size,
+            "feature_scales": replay._scales.tolist() if replay.compact else None,
+            "n_step": replay.n_step, "gamma": replay.gamma}
+    if meta["prioritized"]:
+        meta.update(alpha=replay.alpha, max_priority=replay.max_priority)
+    return meta
+
+
+def load_replay(path, meta, device=DEVICE, mmap_mode="c"):
+    """
+    Rebuild a buffer from save_replay output. The arrays are memory-mapped
+    (copy-on-write by default: pages are read on first touch and the
+    checkpoint files are never modified), so resuming does not read the
+    whole buffer up front.
+    """
+    kwargs = {"device": device, "feature_scales": meta["feature_scales"],
+              "n_step": meta.get("n_step", 1), "gamma": meta.get("gamma")}
+    if meta["prioritized"]:
+        # 1-slot placeholder storage; every array is swapped for its memmap below
+        replay = PrioritizedReplayBuffer(1, meta["state_shape"], alpha=meta["alpha"], **kwargs)
+        replay.max_priority = meta["max_priority"]
+    else:
+        replay = ReplayBuffer(1, meta["state_shape"], **kwargs)
+    replay.capacity, replay.position, replay.size = meta["capacity"], meta["position"], meta["size"]
+    for name in _replay_arrays(replay):
+        array = np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+        if name in _PRIORITY_ARRAYS:
+            tree = getattr(replay, name)
+            tree.capacity = meta["capacity"]
+            tree.leaf_offset = len(array) // 2
+            tree.tree = array
+        else:
+            setattr(replay, name, array)
+    return replay
+
+
+# ---------------- SAVE / LOAD ----------------
+def save_checkpoint(root, episode, policy_net, target_net, optimizer, replay, shoe, extra=None,
+                    keep=CHECKPOINT_KEEP):
+    """
+    Checkpoint a training run after `episode` episodes into <root>/ep<episode>
+    and point <root>/latest at it; only the newest `keep` are kept. `replay`
+    must be the underlying buffer (not a PrefetchSampler) and `extra` holds
+    any other picklable loop state (step counts, run arguments, ...).
+    """
+    name = f"ep{episode:09d}"
+    path = os.path.join(root, name)
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    replay_meta = save_replay(replay, os.path.join(tmp, "replay"))
+    torch.save({
+        "episode": episode,
+        "policy_net": policy_net.state_dict(),
+        "target_net": target_net.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "replay": replay_meta,
+        "shoe": shoe_state(shoe) if shoe is not None else None,
+        "rng": rng_state(),
+        "extra": extra or {},
+    }, os.path.join(tmp, "state.pt"))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+    with open(os.path.join(root, "latest.tmp"), "w") as f:
+        f.write(name)
+    os.replace(os.path.join(root, "latest.tmp"), os.path.join(root, "latest"))
+
+    # Removing a checkpoint the live buffer still maps is safe: the mapping keeps the file alive
+    old = sorted(d for d in os.listdir(root) if d.startswith("ep") and not d.endswith(".tmp"))
+    for d in old[:-keep] if keep else []:
+        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+    return path
+
+
+def checkpoint_path(path):
+    """A checkpoint directory, or the one <path>/latest points at."""
+    latest = os.path.join(path, "latest")
+    if os.path.exists(latest):
+        with open(latest) as f:
+            return os.path.join(path, f.read().strip())
+    return path
+
+
+def read_checkpoint(path):
+    """The state.pt contents (nets, counters, RNG, ...) of a checkpoint, without loading the replay."""
+    return torch.load(os.path.join(checkpoint_path(path), "state.pt"), map_location="cpu", weights_only=False)
+
+
+def load_checkpoint(path, policy_net, target_net, optimizer, device=DEVICE, mmap_mode="c"):
+    """
+    Restore nets, optimizer and global RNG states in place from a checkpoint
+    (or the latest one under `path`) and return (replay, shoe, state), state
+    being the read_checkpoint dict with its episode and `extra` loop state.
+    """
+    path = checkpoint_path(path)
+    state = read_checkpoint(path)
+    policy_net.load_state_dict(state["policy_net"])
+    target_net.load_state_dict(state["target_net"])
+    optimizer.load_state_dict(state["optimizer"])
+    replay = load_replay(os.path.join(path, "replay"), state["replay"], device, mmap_mode)
+    shoe = restore_shoe(state["shoe"]) if state["shoe"] is not None else None
+    set_rng_state(state["rng"])
+    return replay, shoe, state
@@ -1,3 +1,5 @@
+import json
+import os
 import random
 import numpy as np
 import torch
@@ -11,16 +13,19 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 # BLACKJACK ENVIRONMENT SETTINGS
 # ------------------------
 NUM_DECKS = 6
+SHOE_PENETRATION = 0.75  # fraction of the shoe dealt before the cut card
 NUM_ACTIONS = 5
 ACTION_NAMES = ["HIT", "STAND", "DOUBLE", "SPLIT", "SURRENDER"]
 COUNT_BINS = list(range(-5, 6))  # e.g., card counting feature range
 MAX_STEPS = 30
+ANALYTIC_DEALER = False      # settle STAND/DOUBLE with the precomputed dealer outcome table (dealer_dist)
 # ------------------------
 # TRAINING PARAMETERS
 # ------------------------
 NUM_EPISODES = 500_000
 BATCH_SIZE = 512
 REPLAY_CAPACITY = 500_000
+REPLAY_COMPACT = True  # store states/actions/dones as uint8 codes (PER buffer ~2.3x smaller: ~35 vs ~81 B/slot at 1M)
 REPLAY_WARMUP = 1_000
 TARGET_UPDATE_STEPS = 2_000
 
@@ -28,6 +33,7 @@ TARGET_UPDATE_STEPS = 2_000
 # DQN / RL HYPERPARAMETERS
 # ------------------------
 GAMMA = 0.995
+N_STEP = 1  # >1: replay stores n-step returns, bootstrapped with GAMMA ** N_STEP
 LR = 5e-4
 HIDDEN = 512
 GRAD_CLIP = 5.0
@@ -47,7 +53,84 @@ EPS_DECAY = 1_000_000  # ignored if USE_NOISY_NETS=True
 USE_PER = True
 PER_ALPHA = 0.7
 PER_BETA_START = 0.5
-PER_BETA_FRAMES = int(NUM_EPISODES * 0.5)
+# PER_BETA_FRAMES (beta anneals to 1 over half of NUM_EPISODES) is derived at the end of this file
+PREFETCH_BATCHES = 0  # batches sampled ahead on a worker thread (0 = sample inline)
+FUSED_LEARNER = True       # fused_optimize_step: one policy forward over [s; ns], deferred priorities
+PRIORITY_FLUSH_STEPS = 8   # updates whose TD errors are batched into one update_priorities call
+
+# ------------------------
+# ACTOR / LEARNER (main.py apex)
+# ------------------------
+NUM_ACTORS = 4             # actor processes playing hands for one learner
+ACTOR_LANES = 64           # hands each actor keeps in flight (BatchRollout)
+ACTOR_CHUNK = 1_024        # transitions per message sent to the learner
+ACTOR_SYNC_INTERVAL = 200  # learner updates between weight publishes
+ACTOR_QUEUE_DEPTH = 16     # chunks in flight before actors block
+ACTOR_INFERENCE_NET = True # actors act through model.InferenceDuelingMLP, refolded per noise draw
+INFERENCE_QUANTIZE = False # int8 dynamic quantization for evaluation / exported inference nets
+DENSE_EXPORT_CHUNK = 16_384  # states per forward pass when building the dense Q-table (0 = one pass)
+
+# ------------------------
+# WIN-RATE TABLE (main.py winrates)
+# ------------------------
+WINRATE_HALF_WIDTH = 1.0     # target 95% CI half-width per cell, in win-rate points (0-100)
+WINRATE_MIN_HANDS = 2_000    # hands per cell before the CI is checked
+WINRATE_MAX_HANDS = 100_000  # hard cap per cell
+WINRATE_BATCH = 2_048        # hands simulated per vectorized batch
+WINRATE_WORKERS = 0          # pool processes (0 = all cores)
+
+# ------------------------
+# PROFILING (profiler.PhaseProfiler in the training loop)
+# ------------------------
+PROFILE_PATH = None             # e.g. "exports/train_metrics.jsonl" (or .csv) to record every window
+PROFILE_EVERY = 1_000           # loop iterations per metrics window
+PROFILE_CPROFILE_WINDOW = None  # window index (0-based) to run under cProfile
+
+# ------------------------
+# OFFLINE DATASETS (dataset.py, main.py dataset)
+# ------------------------
+DATASET_PATH = None            # dataset directory: BC pretraining + replay warm start before training
+DATASET_SHARD_SIZE = 1_000_000 # transitions per shard (~18 MB with uint8 state codes)
+DATASET_LANES = 4_096          # hands in flight per generator worker
+DATASET_WORKERS = 0            # generator pool processes (0 = all cores)
+DATASET_SEED = 0
+DATASET_REPLAY_FILL = 200_000  # transitions copied into the replay buffer (0 = keep the basic-strategy pre-fill)
+BC_PRETRAIN_EPOCHS = 1         # passes over the dataset before the first episode (0 = none)
+BC_PRETRAIN_BATCH = 4_096
+
+# ------------------------
+# SWEEPS (sweep.py, main.py sweep <spec.json>)
+# ------------------------
+SWEEP_THREADS = 1              # torch / BLAS threads per trial
+SWEEP_PARALLEL = 0             # trials run at once (0 = cores // SWEEP_THREADS)
+SWEEP_PRUNE_WARMUP = 2         # evaluations a trial gets before it can be pruned
+SWEEP_PRUNE_MIN_TRIALS = 4     # trials needed at an episode before the median rule applies
+SWEEP_FINAL_EVAL_HANDS = 500_000  # hands of the final seeded evaluation each finished trial gets
+
+# ------------------------
+# CHECKPOINTS (checkpoint.py, main.py resume <dir>)
+# ------------------------
+CHECKPOINT_DIR = "checkpoints"  # train_and_export writes here (None = no checkpoints)
+CHECKPOINT_EVERY = 50_000       # episodes between checkpoints
+CHECKPOINT_KEEP = 2             # most recent checkpoints kept on disk
+
+# ------------------------
+# EVALUATION (evaluation.py, run in the background during training)
+# ------------------------
+EVAL_HANDS = 200_000         # hands per policy per evaluation
+EVAL_HANDS_PER_SHOE = 20     # hands played back to back from each seeded shoe
+EVAL_LANES = 1_000           # shoes per worker job
+EVAL_WORKERS = 2             # evaluation processes (0 = all cores)
+EVAL_SEED = 1_234            # fixed shoes, so every evaluation is comparable
+
+# ------------------------
+# WHOLE-SHOE BET-SPREAD SIMULATION (main.py shoesim)
+# ------------------------
+BET_RAMP = [1, 1, 1, 1, 1, 1, 2, 4, 6, 8, 8]  # units bet per true-count bin (COUNT_BINS order)
+SIM_LANES = 4_096            # shoes in flight per worker
+SIM_WORKERS = 0              # pool processes (0 = all cores)
+SIM_HANDS_PER_HOUR = 100     # for the per-hour win rate
+SIM_BANKROLL = 1_000         # units, for the risk of ruin
 
 # ------------------------
 # REWARD SHAPING
@@ -57,6 +140,8 @@ SHAPING_COEFF = 0.01
 #Pre fill settings
 PRE_FILL_STEPS = 10
 PRE_FILL_TRANSITIONS = 2000
+PRE_FILL_FLUSH = 256  # transitions staged locally before one push_batch
+ROLLOUT_LANES = 0  # >0: training hands come from a BatchRollout with this many hands in flight
 # ------------------------
 # REPRODUCIBILITY
 # ------------------------
@@ -75,3 +160,17 @@ TEST_MAX_STEPS = 10         # max steps per hand (optional)
 TEST_REWARD_SCALE = 1.0        # same reward scale
 TEST_SHAPING_COEFF = 0.0       # no shaping to simplify
 
+# ---------------- Per-run overrides ----------------
+# JSON {name: value} applied on import, so every module and every spawned
+# worker of a run sees the same settings (sweep.py sets it per trial).
+# Derived settings are computed below, after the overrides, and cannot be
+# overridden themselves: override what they derive from instead.
+DERIVED_SETTINGS = ("PER_BETA_FRAMES",)
+_overrides = json.loads(os.environ.get("DQN_CONFIG_OVERRIDES") or "{}")
+_derived = sorted(set(_overrides) & set(DERIVED_SETTINGS))
+if _derived:
+    raise ValueError(f"DQN_CONFIG_OVERRIDES sets derived settings: {', '.join(_derived)}")
+globals().update(_overrides)
+
+# ---------------- Derived settings ----------------
+PER_BETA_FRAMES = int(NUM_EPISODES * 0.5)
@@ -0,0 +1,232 @@
+import json
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.multiprocessing as mp
+from batch_env import BatchBlackjackEnv
+from config import (DEVICE, LR, NUM_ACTIONS, REWARD_SCALE, SHAPING_COEFF, DATASET_SHARD_SIZE, DATASET_LANES,
+                    DATASET_WORKERS, DATASET_SEED, BC_PRETRAIN_EPOCHS, BC_PRETRAIN_BATCH)
+from enivronment import STATE_FEATURE_SCALES
+from policy_table import PolicyTable
+from shoe_sim import build_policy, policy_spec
+
+# Layout: <dir>/manifest.json plus one <dir>/shard_NNNNN/ per shard holding
+# one .npy per column. States are stored as uint8 feature codes
+# (state * STATE_FEATURE_SCALES, as in compact replay storage). "lanes" is
+# the env lane of each row: the n-step stream it belongs to (older datasets
+# lack it and can only fill 1-step buffers).
+_COLUMNS = {"states": np.uint8, "actions": np.uint8, "rewards": np.float32,
+            "next_states": np.uint8, "dones": np.uint8, "lanes": np.int32}
+_TRANSITION_COLUMNS = ("states", "actions", "rewards", "next_states", "dones")
+
+
+def teacher_spec(name="basic"):
+    """policy_spec of a teacher: "basic", "solver", "header" (blackjack_policy.h) or an exported .npy / .npz / .pt."""
+    if name in ("basic", "solver"):
+        return policy_spec(name)
+    if name == "header":
+        return policy_spec()
+    if name.endswith(".pt"):
+        return policy_spec(policy_net=name)
+    if name.endswith(".npz"):
+        return policy_spec(PolicyTable.load(name))
+    return policy_spec(np.load(name))
+
+
+# ---------------- GENERATION ----------------
+def generate_shard(policy, path, size, seed, lanes=DATASET_LANES, reward_scale=REWARD_SCALE,
+                   shaping_coeff=SHAPING_COEFF):
+    """
+    Play a batched `policy` (shoe_sim.build_policy) on a BatchBlackjackEnv
+    and write its first `size` decisions straight into memory-mapped .npy
+    files under `path`. Returns the shard's manifest entry.
+    """
+    env = BatchBlackjackEnv(lanes, reward_scale=reward_scale, shaping_coeff=shaping_coeff, seed=seed)
+    os.makedirs(path, exist_ok=True)
+    out = {name: np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="w+", dtype=dtype,
+                                           shape=(size, len(STATE_FEATURE_SCALES)) if "states" in name else (size,))
+           for name, dtype in _COLUMNS.items()}
+    scales = np.asarray(STATE_FEATURE_SCALES, dtype=np.float32)
+
+    states = env.reset()
+    written = hands = 0
+    while written < size:
+        actions = np.minimum(policy(env, states), NUM_ACTIONS - 1)
+        next_states, rewards, dones, active = env.step(actions)
+        rows = np.flatnonzero(active)[:size - written]
+        end = written + len(rows)
+        out["states"][written:end] = np.rint(states[rows] * scales)
+        out["actions"][written:end] = actions[rows]
+        out["rewards"][written:end] = rewards[rows]
+        out["next_states"][written:end] = np.rint(next_states[rows] * scales)
+        out["dones"][written:end] = dones[rows]
+        out["lanes"][written:end] = rows
+        written = end
+
+        finished = np.flatnonzero(dones & active)
+        hands += len(finished)
+        if len(finished):
+            next_states[finished] = env.reset(finished)
+        states = next_states
+    for array in out.values():
+        array.flush()
+    return {"path": os.path.basename(path), "size": size, "hands": hands}
+
+
+def _init_worker(spec):
+    # Built once per process: the solver teacher memoizes its EVs across shards
+    global _teacher
+    torch.set_num_threads(1)
+    _teacher = build_policy(spec)
+
+
+def _generate_job(args):
+    return generate_shard(_teacher, *args)
+
+
+def generate_dataset(path, num_transitions, teacher=None, seed=DATASET_SEED, workers=DATASET_WORKERS,
+                     lanes=DATASET_LANES, shard_size=DATASET_SHARD_SIZE, reward_scale=REWARD_SCALE,
+                     shaping_coeff=SHAPING_COEFF):
+    """
+    Write `num_transitions` labeled (state, action, reward, next_state,
+    done) transitions of `teacher` (a policy_spec, default basic strategy)
+    to `path`, one shard per worker job, and return the manifest. Shards
+    only depend on `seed`, not on the number of workers; manifest.json is
+    written last, so a directory without one is incomplete.
+    """
+    spec = teacher if teacher is not None else policy_spec("basic")
+    sizes = [min(shard_size, num_transitions - start) for start in range(0, num_transitions, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(os.path.join(path, f"shard_{i:05d}"), size, s, lanes, reward_scale, shaping_coeff)
+            for i, (size, s) in enumerate(zip(sizes, seeds))]
+    os.makedirs(path, exist_ok=True)
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(spec)
+        shards = [_generate_job(job) for job in jobs]
+    else:
+        with mp.get_context("spawn").Pool(min(workers or os.cpu_count(), len(jobs)),
+                                          initializer=_init_worker, initargs=(spec,)) as pool:
+            shards = pool.map(_generate_job, jobs)
+    elapsed = time.perf_counter() - start
+
+    manifest = {"teacher": spec[0], "transitions": num_transitions, "hands": sum(s["hands"] for s in shards),
+                "seed": seed, "reward_scale": reward_scale, "shaping_coeff": shaping_coeff,
+                "feature_scales": list(STATE_FEATURE_SCALES), "shards": shards}
+    with open(os.path.join(path, "manifest.json.tmp"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(path, "manifest.json.tmp"), os.path.join(path, "manifest.json"))
+    print(f"[✅] Wrote {num_transitions:,} {spec[0]} transitions ({len(shards)} shards) to {path} "
+          f"in {elapsed:.1f}s ({num_transitions / elapsed:,.0f}/s)")
+    return manifest
+
+
+# ---------------- STREAMING READS ----------------
+class TransitionDataset:
+    """
+    Read side of generate_dataset. Shards are memory-mapped read-only and
+    rows are decoded to float32 states only when gathered, so memory use
+    is bounded by the batch, not the dataset.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.shards = [{name: np.load(os.path.join(path, shard["path"], name + ".npy"), mmap_mode="r")
+                        for name in _COLUMNS if name in _TRANSITION_COLUMNS
+                        or os.path.exists(os.path.join(path, shard["path"], name + ".npy"))}
+                       for shard in self.manifest["shards"]]
+        self.has_lanes = all("lanes" in shard for shard in self.shards)
+        self.sizes = [shard["size"] for shard in self.manifest["shards"]]
+        scales = np.asarray(self.manifest["feature_scales"], dtype=np.float64)
+        self._lut = (np.arange(256)[None, :] / scales[:, None]).astype(np.float32)
+        self._lut_cols = np.arange(len(scales))
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    def rows(self, shard, idx):
+        """(states, actions, rewards, next_states, dones) NumPy arrays for rows `idx` (index or slice) of a shard."""
+        cols = self.shards[shard]
+        return (self._lut[self._lut_cols, cols["states"][idx]], cols["actions"][idx].astype(np.int64),
+                np.asarray(cols["rewards"][idx]), self._lut[self._lut_cols, cols["next_states"][idx]],
+                cols["dones"][idx].astype(np.float32))
+
+    def lanes(self, shard, idx):
+        """Env lane of rows `idx` of a shard (their n-step stream)."""
+        return np.asarray(self.shards[shard]["lanes"][idx], dtype=np.int64)
+
+    def batches(self, batch_size, shuffle=True, seed=None, device="cpu"):
+        """
+        One pass over the dataset as tuples of torch tensors in rows() order.
+        With `shuffle`, shards are visited in random order and rows are
+        permuted within each shard (each batch's rows are sorted, so reads
+        stay local); the last batch of a shard may be short.
+        """
+        rng = np.random.default_rng(seed)
+        for shard in (rng.permutation(len(self.shards)) if shuffle else range(len(self.shards))):
+            size = self.sizes[shard]
+            order = rng.permutation(size) if shuffle else None
+            for start in range(0, size, batch_size):
+                idx = np.sort(order[start:start + batch_size]) if shuffle else slice(start, start + batch_size)
+                yield tuple(torch.from_numpy(x).to(device) for x in self.rows(shard, idx))
+
+
+def fill_replay(replay, dataset, limit=None, chunk=65_536):
+    """
+    Push the first `limit` dataset transitions (default all) into `replay`
+    in push_batch chunks. An n-step buffer gets each row's lane as its
+    stream; hands cut off by a shard end or by `limit` are dropped, so
+    `replay` may keep fewer rows than the returned number of pushed ones.
+    """
+    n_step = getattr(replay, "n_step", 1) > 1
+    if n_step and not dataset.has_lanes:
+        raise ValueError(f"{dataset.path} has no lane ids (written before n-step support); "
+                         "regenerate it to fill an n-step buffer")
+    remaining = len(dataset) if limit is None else min(limit, len(dataset))
+    pushed = 0
+    for shard, size in enumerate(dataset.sizes):
+        for start in range(0, size, chunk):
+            n = min(chunk, size - start, remaining - pushed)
+            if n <= 0:
+                break
+            idx = slice(start, start + n)
+            replay.push_batch(*dataset.rows(shard, idx), streams=dataset.lanes(shard, idx) if n_step else None)
+            pushed += n
+        if n_step:
+            replay.end_streams()  # lane ids restart with every shard
+        if pushed >= remaining:
+            break
+    return pushed
+
+
+def pretrain_bc(policy_net, dataset, epochs=BC_PRETRAIN_EPOCHS, batch_size=BC_PRETRAIN_BATCH, lr=LR,
+                device=DEVICE, seed=DATASET_SEED):
+    """
+    Behavior-cloning pretraining: cross-entropy of the net's Q-values
+    against the teacher's actions, streamed from `dataset`. Returns the
+    last epoch's mean loss and accuracy.
+    """
+    optimizer = torch.optim.Adam(policy_net.parameters(), lr=lr)
+    policy_net.train()
+    stats = {}
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        total_loss = correct = seen = 0
+        for states, actions, *_ in dataset.batches(batch_size, seed=seed + epoch, device=device):
+            q = policy_net(states)
+            loss = nn.functional.cross_entropy(q, actions)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            policy_net.reset_noise()
+            total_loss += loss.detach() * len(actions)
+            correct += (q.argmax(1) == actions).sum()
+            seen += len(actions)
+        stats = {"loss": float(total_loss) / seen, "accuracy": float(correct) / seen}
+        print(f"[🟢] BC epoch {epoch + 1}/{epochs}: loss={stats['loss']:.4f} "
+              f"acc={stats['accuracy']:.3f} ({seen / (time.perf_counter() - start):,.0f} transitions/s)")
+    return stats
@@ -0,0 +1,116 @@
+import numpy as np
+from config import COUNT_BINS, NUM_DECKS, SHOE_PENETRATION
+from hand_tables import EMPTY_HAND, COUNT_BITS, next_hand_state, hand_total_of
+
+# Outcome slots of a dealer distribution
+DEALER_TOTALS = (17, 18, 19, 20, 21)
+BUST, BLACKJACK = 5, 6
+NUM_OUTCOMES = 7
+
+
+# ---------------- DEALER DRAW-OUT ----------------
+def _draw_out(state, freqs, memo):
+    """Final-outcome probs (plain list) from dealer hand `state`, drawing rank r with prob freqs[r]."""
+    key = state >> COUNT_BITS   # the card count never changes the outcome
+    out = memo.get(key)
+    if out is not None:
+        return out
+    total = hand_total_of[state]
+    out = [0.0] * NUM_OUTCOMES
+    if total >= 17:
+        out[BUST if total > 21 else total - 17] = 1.0
+    else:
+        nxt = next_hand_state[state]
+        for r in range(1, 11):
+            f = freqs[r]
+            if f > 0:
+                sub = _draw_out(nxt[r], freqs, memo)
+                for k in range(BLACKJACK):
+                    out[k] += f * sub[k]
+    memo[key] = out
+    return out
+
+
+def dealer_outcome_probs(upcard, counts):
+    """
+    Distribution of the dealer's final hand given the upcard and the unseen
+    cards `counts` (counts[r] for r = 1..10, index 0 unused; the hole card is
+    still among them). The dealer draws while hand_total < 17, same rule as
+    the engines. The hole card is removed from `counts` exactly; later draws
+    use the rank frequencies left after it. hand_total's ace rule lets the
+    dealer keep drawing past 21, so tracking depletion on every draw blows
+    up, while the frequency draw-out is one memo over hand states.
+    Returns probs over [17, 18, 19, 20, 21, bust, blackjack].
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    n = counts[1:11].sum()
+    state = next_hand_state[EMPTY_HAND][upcard]
+    out = np.zeros(NUM_OUTCOMES)
+    for hole in range(1, 11):
+        if counts[hole] <= 0:
+            continue
+        p = counts[hole] / n
+        if {upcard, hole} == {1, 10}:
+            out[BLACKJACK] += p
+            continue
+        rest = counts.copy()
+        rest[hole] -= 1
+        freqs = (rest / max(n - 1, 1.0)).tolist()
+        out += p * np.asarray(_draw_out(next_hand_state[state][hole], freqs, {}))
+    return out
+
+
+def stand_ev(player_total, probs, bet=1):
+    """
+    Expected reward of standing on `player_total` against a dealer
+    distribution with no blackjack (the engines settle naturals first),
+    using the same win/push/lose comparison as step_blackjack_env.
+    """
+    if player_total > 21:
+        return -1.0 * bet
+    no_bj = probs[:BLACKJACK] / max(1.0 - probs[BLACKJACK], 1e-12)
+    win = no_bj[BUST]
+    lose = 0.0
+    for i, t in enumerate(DEALER_TOTALS):
+        if player_total > t:
+            win += no_bj[i]
+        elif player_total < t:
+            lose += no_bj[i]
+    return float(win - lose) * bet
+
+
+# ---------------- PRECOMPUTED TABLE ----------------
+class DealerOutcomeTable:
+    """
+    dealer_outcome_probs for every (upcard, true-count bin) on the solver's
+    count-bin compositions (solver.count_bin_composition), and the stand EV
+    of every player total against each, so settling a STAND / DOUBLE is one
+    index operation on ints or arrays. Building it takes a few seconds, once.
+    """
+    MAX_TOTAL = 22   # every bust total shares the last column
+
+    def __init__(self, num_decks=NUM_DECKS, penetration=SHOE_PENETRATION):
+        from solver import count_bin_composition  # solver imports this module
+        bins = len(COUNT_BINS)
+        self.probs = np.zeros((11, bins, NUM_OUTCOMES))
+        self.stand = np.zeros((11, bins, self.MAX_TOTAL + 1))
+        for tc_idx in range(bins):
+            counts = count_bin_composition(tc_idx, num_decks, penetration)
+            for upcard in range(1, 11):
+                probs = self.probs[upcard, tc_idx] = dealer_outcome_probs(upcard, counts)
+                self.stand[upcard, tc_idx] = [stand_ev(t, probs) for t in range(self.MAX_TOTAL + 1)]
+
+    def stand_ev(self, upcard, tc_idx, player_total, bet=1):
+        """Expected reward of standing on `player_total` with `bet` (ints or arrays)."""
+        return self.stand[upcard, tc_idx, np.minimum(player_total, self.MAX_TOTAL)] * bet
+
+
+_DEALER_TABLE = None
+
+
+def dealer_table():
+    """The shared DealerOutcomeTable, built on first use."""
+    global _DEALER_TABLE
+    if _DEALER_TABLE is None:
+        _DEALER_TABLE = DealerOutcomeTable()
+    return _DEALER_TABLE
@@ -1,21 +1,37 @@
+import os
 import time
+from collections import deque
+from contextlib import nullcontext
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 # Local imports
-from model import NoisyDuelingMLP
-from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
-from enivronment import make_shoe, shoe_draw, play_fixed_player, play_single_hand_dqn, PLAYER_TYPES
-from enivronment import encode_state_vec, true_count_bin_from_running
+from model import NoisyDuelingMLP, save_inference_net
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer, TransitionStaging, PrefetchSampler
+from enivronment import Shoe, shoe_draw, play_single_hand_dqn, play_round, PLAYER_TYPES
+from enivronment import encode_state_vec, STATE_FEATURE_SCALES
+from hand_tables import hand_cell, hand_state
 from utils import export_policy
+from rollout import BatchRollout
+from evaluation import AsyncEvaluator, format_eval
+from shoe_sim import policy_spec
+from winrate_table import starting_cards
+from policy_table import PolicyTable
+from profiler import PhaseProfiler
+from checkpoint import save_checkpoint, load_checkpoint, read_checkpoint
+from dataset import TransitionDataset, fill_replay, pretrain_bc
 from config import *
 
 DEVICE = DEVICE  # from config
 
 # ---------------- Full Training Function ----------------
 def train_and_export(num_episodes=NUM_EPISODES):
-    _train_and_export_core(num_episodes, print_progress=True)
+    _train_and_export_core(num_episodes, print_progress=True, checkpoint_dir=CHECKPOINT_DIR)
+def resume_training(path):
+    """Continue a checkpointed run (a checkpoint directory or its root) with its original arguments."""
+    run = read_checkpoint(path)["extra"]["run"]
+    _train_and_export_core(**run, resume=path)
 def train_and_export_test(num_episodes=1000):
     _train_and_export_core(num_episodes, print_progress=True, reward_window=100)
 def train_and_export_quick():
@@ -46,12 +62,13 @@ def train_and_export_quick():
 
     # ---- Pre-fill buffer quickly ----
     print("[🟢] Quick pre-fill of replay buffer...")
+    shoe = Shoe(NUM_DECKS)
     while len(replay) < 10:  # only 10 transitions
-        shoe = make_shoe()
-        running_count = 0
+        if shoe.needs_shuffle:
+            shoe.shuffle()
         dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
         player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-        tc_idx = true_count_bin_from_running(running_count, len(shoe))
+        running_count, tc_idx = shoe.running_count, shoe.tc_idx
 
         reward, running_count, _ = play_single_hand_dqn(
             policy_net, shoe, running_count, dealer_hand,
@@ -64,11 +81,11 @@ def train_and_export_quick():
 
     # ---- Run 5 mini training episodes ----
     for ep in range(5):
-        shoe = make_shoe()
-        running_count = 0
+        if shoe.needs_shuffle:
+            shoe.shuffle()
         dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
         player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-        tc_idx = true_count_bin_from_running(running_count, len(shoe))
+        running_count, tc_idx = shoe.running_count, shoe.tc_idx
 
         reward, running_count, _ = play_single_hand_dqn(
             policy_net, shoe, running_count, dealer_hand,
@@ -107,159 +124,392 @@ def train_and_export_quick():
     
     print("[✅] Quick test done!")
 
-def _train_and_export_core(num_episodes, print_progress=False, reward_window=10_000,
-                           use_bc=True, bc_episodes=500, bc_weight_start=1.0):
-    state_dim = 6
+# ---------------- Learner Update ----------------
+def bootstrap_discount(replay):
+    """Discount of the replay rows' bootstrap: GAMMA ** n for an n-step buffer, GAMMA otherwise."""
+    discount = getattr(replay, "discount", None)
+    return GAMMA if discount is None else discount
 
-    # ---- Model ----
-    policy_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
-    target_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
-    target_net.load_state_dict(policy_net.state_dict())
-    target_net.eval()
-    optimizer = torch.optim.Adam(policy_net.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+def optimize_step(policy_net, target_net, optimizer, replay, beta, bc_weight=0.0, batch_size=BATCH_SIZE,
+                  profiler=None):
+    """
+    One Double-DQN update from a prioritized batch (plus optional BC loss);
+    returns the loss. `profiler` (PhaseProfiler) gets sample /
+    forward_backward / priorities laps.
+    """
+    # New API: prioritized.sample -> (states, actions, rewards, next_states, dones, idxs, weights)
+    s, a, r, ns, done, idxs, weights = replay.sample(batch_size, beta=beta)
+    if profiler is not None:
+        profiler.lap("sample")
+
+    # Ensure shapes: actions as (batch,1) for gather, rewards as (batch,1), done as (batch,1)
+    a_idx = a.detach().long().unsqueeze(1)            # (B,1)
+    r = r.detach().float().unsqueeze(1)               # (B,1)
+    done = done.detach().float().unsqueeze(1)         # (B,1)
 
-    # ---- Replay buffer ----
+    with torch.no_grad():
+        next_actions = policy_net(ns).argmax(1, keepdim=True)     # (B,1)
+        next_q = target_net(ns).gather(1, next_actions)          # (B,1)
+        target_val = r + bootstrap_discount(replay) * (1 - done) * next_q  # (B,1)
+
+    current_val = policy_net(s).gather(1, a_idx)                 # (B,1)
+    td_loss_unreduced = nn.SmoothL1Loss(reduction='none')(current_val, target_val)  # (B,1)
+    td_loss = (td_loss_unreduced * weights).mean()
+
+    if bc_weight > 0:
+        # CrossEntropyLoss expects logits of shape (B, C) and targets of shape (B,)
+        # a.squeeze() would be (B,) dtype long
+        bc_targets = a.detach().long().squeeze()
+        bc_loss = nn.CrossEntropyLoss()(policy_net(s), bc_targets)
+    else:
+        bc_loss = 0.0
+
+    loss = td_loss + bc_weight * bc_loss
+
+    optimizer.zero_grad()
+    loss.backward()
+    torch.nn.utils.clip_grad_norm_(policy_net.parameters(), GRAD_CLIP)
+    optimizer.step()
+    if profiler is not None:
+        profiler.lap("forward_backward")
+
+    # Update priorities using TD magnitude (abs)
+    td_errors = (current_val - target_val).detach().cpu().squeeze().abs().numpy()
+    # replay.update_priorities expects (idxs, new_priorities)
+    replay.update_priorities(idxs, td_errors + 1e-5)
+    if profiler is not None:
+        profiler.lap("priorities")
+    return loss.detach()
+
+class DeferredPriorities:
+    """
+    Keeps TD errors on the learner device and hands them to
+    replay.update_priorities every `flush_every` updates, so the learner
+    waits on the device once per flush instead of once per batch. Each
+    batch keeps the replay's write count from when it was sampled, so
+    slots that pushes overwrite before the flush keep their new priority.
+    """
+    def __init__(self, replay, flush_every=PRIORITY_FLUSH_STEPS):
+        self.replay = replay
+        self.flush_every = flush_every
+        self.idxs = []
+        self.errors = []
+        self.written = []
+
+    def add(self, idxs, td_errors):
+        self.idxs.append(idxs)
+        self.errors.append(td_errors)
+        self.written.append(np.full(len(idxs), self.replay.writes))
+        if len(self.idxs) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.idxs:
+            return
+        errors = torch.cat(self.errors).cpu().numpy()
+        self.replay.update_priorities(np.concatenate(self.idxs), errors + 1e-5,
+                                      written=np.concatenate(self.written))
+        self.idxs.clear()
+        self.errors.clear()
+        self.written.clear()
+
+
+def fused_optimize_step(policy_net, target_net, optimizer, replay, beta, priorities,
+                        bc_weight=0.0, batch_size=BATCH_SIZE, profiler=None):
+    """
+    optimize_step with one set of policy logits for the state batch, reused
+    by the TD and BC losses. On CUDA the policy runs once over [s; ns] (the
+    step is launch-bound there); on CPU the extra backward rows cost more
+    than a second forward, so ns goes through a no-grad pass instead. TD
+    errors go to `priorities` (DeferredPriorities) without leaving the
+    device; returns the loss as a device tensor.
+    """
+    s, a, r, ns, done, idxs, weights = replay.sample(batch_size, beta=beta)
+    if profiler is not None:
+        profiler.lap("sample")
+    if s.is_cuda:
+        q, q_next = policy_net(torch.cat((s, ns))).split(len(s))
+    else:
+        q = policy_net(s)
+        with torch.no_grad():
+            q_next = policy_net(ns)
+
+    with torch.no_grad():
+        next_actions = q_next.argmax(1, keepdim=True)
+        next_q = target_net(ns).gather(1, next_actions)
+        target_val = r.unsqueeze(1) + bootstrap_discount(replay) * (1 - done.unsqueeze(1)) * next_q
+
+    current_val = q.gather(1, a.unsqueeze(1))
+    loss = (nn.functional.smooth_l1_loss(current_val, target_val, reduction='none') * weights).mean()
+    if bc_weight > 0:
+        loss = loss + bc_weight * nn.functional.cross_entropy(q, a)
+
+    optimizer.zero_grad(set_to_none=True)
+    loss.backward()
+    torch.nn.utils.clip_grad_norm_(policy_net.parameters(), GRAD_CLIP, foreach=True)
+    optimizer.step()
+    if profiler is not None:
+        profiler.lap("forward_backward")
+
+    priorities.add(idxs, (current_val.detach() - target_val).abs().squeeze(1))
+    if profiler is not None:
+        profiler.lap("priorities")
+    return loss.detach()
+
+def _prefill_replay(state_dim, dataset=None):
+    """
+    Replay buffer warm-started with DATASET_REPLAY_FILL transitions of an
+    offline `dataset` (dataset.TransitionDataset), or else holding
+    PRE_FILL_TRANSITIONS basic-strategy transitions.
+    """
     # NOTE: new ReplayBuffer / PrioritizedReplayBuffer expect state_shape and device
     if USE_PER:
-        replay = PrioritizedReplayBuffer(REPLAY_CAPACITY, state_shape=(state_dim,), alpha=PER_ALPHA, device=DEVICE)
+        replay = PrioritizedReplayBuffer(REPLAY_CAPACITY, state_shape=(state_dim,), alpha=PER_ALPHA, device=DEVICE,
+                                         feature_scales=STATE_FEATURE_SCALES if REPLAY_COMPACT else None,
+                                         n_step=N_STEP, gamma=GAMMA)
     else:
         raise ValueError("PER must be True for this agent")
 
-    step_count = 0
-    total_reward_window = 0.0
-    smoothed_loss = 0.0
-    start_time = time.time()
+    if dataset is not None:
+        pushed = fill_replay(replay, dataset, limit=DATASET_REPLAY_FILL)
+        print(f"[🟢] Replay buffer warm-started with {pushed:,} {dataset.manifest['teacher']} transitions")
+        return replay
 
-    # ==== Pre-fill buffer with basic strategy ====
     print("[🟢] Pre-filling replay buffer with basic strategy...")
-    shoe = make_shoe(NUM_DECKS)
-    running_count = 0
-    while len(replay) < PRE_FILL_TRANSITIONS:
-        if len(shoe) < 52:
-            shoe = make_shoe()
-            running_count = 0
-        
+    shoe = Shoe(NUM_DECKS, penetration=SHOE_PENETRATION)
+    staging = TransitionStaging()
+    while len(replay) + len(staging) < PRE_FILL_TRANSITIONS:
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+
         dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
         player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-        tc_idx = true_count_bin_from_running(running_count, len(shoe))
+        running_count, tc_idx = shoe.running_count, shoe.tc_idx
 
         reward, running_count, _ = play_single_hand_dqn(
         None, shoe, running_count, dealer_hand,
-        player_hand, tc_idx, device=DEVICE, replay=replay,
+        player_hand, tc_idx, device=DEVICE, replay=staging,
         reward_scale=REWARD_SCALE, shaping_coeff=0.0,
         step_counter=0, max_steps=5,
         use_basic_strategy=True   # add a flag to use basic strategy only
 )
-    
+        if len(staging) >= PRE_FILL_FLUSH:
+            staging.flush(replay)
+    staging.flush(replay)
     print(f"[🟢] Replay buffer pre-filled ({len(replay)} transitions)")
-    # ==== Main DQN training loop ====
-    for ep in range(num_episodes):
-        shoe = make_shoe()
-        running_count = 0
-        dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-        for strat_fn in PLAYER_TYPES:
-            play_fixed_player([shoe_draw(shoe), shoe_draw(shoe)], dealer_hand[0], shoe, running_count, strat_fn)
+    return replay
 
-        player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-        tc_idx = true_count_bin_from_running(running_count, len(shoe))
+def _train_and_export_core(num_episodes, print_progress=False, reward_window=10_000,
+                           use_bc=True, bc_episodes=500, bc_weight_start=1.0,
+                           checkpoint_dir=None, resume=None, eval_callback=None, should_stop=None):
+    """
+    DQN training loop; returns the trained policy net. With
+    `checkpoint_dir`, the full run state is saved there every
+    CHECKPOINT_EVERY episodes (checkpoint.save_checkpoint); `resume`
+    restores one and carries on from its episode. In-flight BatchRollout
+    hands are not saved: a resumed rollout deals new hands.
+
+    With `print_progress`, `eval_callback(episode, result)` receives every
+    background evaluation (evaluation.summarize_eval output), the final
+    one of the trained net included, and
+    `should_stop()` is asked every `reward_window` episodes whether to end
+    training early (sweep.py uses both to prune trials).
+    """
+    run = dict(num_episodes=num_episodes, print_progress=print_progress, reward_window=reward_window,
+               use_bc=use_bc, bc_episodes=bc_episodes, bc_weight_start=bc_weight_start,
+               checkpoint_dir=checkpoint_dir)
+    state_dim = 6
 
-        reward, running_count, _ = play_single_hand_dqn(
-            policy_net, shoe, running_count, dealer_hand,
-            player_hand, tc_idx, device=DEVICE, replay=replay,
-            reward_scale=REWARD_SCALE, shaping_coeff=SHAPING_COEFF,
-            step_counter=0, max_steps=MAX_STEPS
-        )
+    # ---- Model ----
+    policy_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
+    target_net = NoisyDuelingMLP(state_dim, NUM_ACTIONS, hidden=HIDDEN).to(DEVICE)
+    target_net.load_state_dict(policy_net.state_dict())
+    target_net.eval()
+    optimizer = torch.optim.Adam(policy_net.parameters(), lr=LR, weight_decay=WEIGHT_DECAY)
+
+    step_count = 0
+    start_ep = 0
+    total_reward_window = 0.0
+    smoothed_loss = 0.0
+    start_time = time.time()
+
+    if resume is not None:
+        # ---- Restore nets, optimizer, RNGs, shoe and the memory-mapped replay ----
+        replay, shoe, ckpt = load_checkpoint(resume, policy_net, target_net, optimizer, device=DEVICE)
+        start_ep = ckpt["episode"]
+        step_count = ckpt["extra"]["step_count"]
+        smoothed_loss = ckpt["extra"]["smoothed_loss"]
+        total_reward_window = ckpt["extra"]["total_reward_window"]
+        print(f"[🟢] Resumed from {resume} at episode {start_ep:,} ({len(replay):,} transitions)")
+    else:
+        dataset = TransitionDataset(DATASET_PATH) if DATASET_PATH else None
+        if dataset is not None and BC_PRETRAIN_EPOCHS > 0:
+            # Behavior-cloning pretraining on the offline teacher's actions
+            pretrain_bc(policy_net, dataset, device=DEVICE)
+            target_net.load_state_dict(policy_net.state_dict())
+        replay = _prefill_replay(state_dim, dataset if DATASET_REPLAY_FILL > 0 else None)
+        # Episodes run back to back through one shoe until the cut card
+        shoe = Shoe(NUM_DECKS, penetration=SHOE_PENETRATION)
+    if PREFETCH_BATCHES > 0:
+        # Sample upcoming batches on a worker thread while the learner trains
+        replay = PrefetchSampler(replay, BATCH_SIZE, depth=PREFETCH_BATCHES, device=DEVICE)
+    priorities = DeferredPriorities(replay)
+    # ==== Main DQN training loop ====
+    # Evaluation runs in worker processes on fixed seeded shoes: the current
+    # net, the one from the previous evaluation point and basic_strategy all
+    # play the same shoes, and results are printed once they come back
+    evaluator = AsyncEvaluator() if print_progress else None
+    prev_spec, eval_ep = None, None
+    # Batched rollout: many hands in flight, one forward pass per decision round.
+    # Finished hands are queued and consumed one per episode, so the
+    # one-update-per-hand schedule below stays the same.
+    rollout = None
+    if ROLLOUT_LANES > 0:
+        rollout = BatchRollout(policy_net, ROLLOUT_LANES, device=DEVICE,
+                               reward_scale=REWARD_SCALE, shaping_coeff=SHAPING_COEFF)
+        finished_rewards = deque()
+    # Per-phase timings and hands / decisions / gradient steps per second
+    prof = PhaseProfiler(phases=("rollout", "shuffle", "sample", "forward_backward", "priorities",
+                                 "target_sync", "eval", "checkpoint", "other"),
+                         counters=("hands", "decisions", "grad_steps"))
+    for ep in range(start_ep, num_episodes):
+        prof.lap("other")
+        if rollout is not None:
+            decisions = rollout.decisions
+            while not finished_rewards:
+                finished_rewards.extend(rollout.step(replay).tolist())
+            reward = finished_rewards.popleft()
+            prof.count("decisions", rollout.decisions - decisions)
+        else:
+            if shoe.needs_shuffle:
+                shoe.shuffle()
+                prof.lap("shuffle")
+            # One table round: the PLAYER_TYPES seats and the DQN seat all
+            # play against a single dealer hand
+            (reward,), _, decisions = play_round(
+                shoe, policy_net, PLAYER_TYPES, device=DEVICE, replay=replay,
+                reward_scale=REWARD_SCALE, shaping_coeff=SHAPING_COEFF, max_steps=MAX_STEPS
+            )
+            prof.count("decisions", decisions)
+        prof.lap("rollout")
+        prof.count("hands")
         total_reward_window += reward
 
         # ---- Training update ----
         if len(replay) >= REPLAY_WARMUP:
             beta = min(1.0, PER_BETA_START + step_count / PER_BETA_FRAMES)
 
-            # New API: prioritized.sample -> (states, actions, rewards, next_states, dones, idxs, weights)
-            s, a, r, ns, done, idxs, weights = replay.sample(BATCH_SIZE, beta=beta)
-
-            # Ensure shapes: actions as (batch,1) for gather, rewards as (batch,1), done as (batch,1)
-            a_idx = a.detach().long().unsqueeze(1)            # (B,1)
-            r = r.detach().float().unsqueeze(1)               # (B,1)
-            done = done.detach().float().unsqueeze(1)         # (B,1)
-
-            with torch.no_grad():
-                next_actions = policy_net(ns).argmax(1, keepdim=True)     # (B,1)
-                next_q = target_net(ns).gather(1, next_actions)          # (B,1)
-                target_val = r + GAMMA * (1 - done) * next_q            # (B,1)
-
-            current_val = policy_net(s).gather(1, a_idx)                 # (B,1)
-            td_loss_unreduced = nn.SmoothL1Loss(reduction='none')(current_val, target_val)  # (B,1)
-            td_loss = (td_loss_unreduced * weights).mean()
-
             # ---- Behavior Cloning weight schedule ----
             bc_weight = bc_weight_start * max(0, (bc_episodes - ep) / bc_episodes) if use_bc else 0.0
 
-            if bc_weight > 0:
-                # CrossEntropyLoss expects logits of shape (B, C) and targets of shape (B,)
-                # a.squeeze() would be (B,) dtype long
-                bc_targets = a.detach().long().squeeze()
-                bc_loss = nn.CrossEntropyLoss()(policy_net(s), bc_targets)
+            if FUSED_LEARNER:
+                loss = fused_optimize_step(policy_net, target_net, optimizer, replay, beta,
+                                           priorities, bc_weight, profiler=prof)
             else:
-                bc_loss = 0.0
-
-            loss = td_loss + bc_weight * bc_loss
-
-            optimizer.zero_grad()
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(policy_net.parameters(), GRAD_CLIP)
-            optimizer.step()
-
-            # Update priorities using TD magnitude (abs)
-            td_errors = (current_val - target_val).detach().cpu().squeeze().abs().numpy()
-            # replay.update_priorities expects (idxs, new_priorities)
-            replay.update_priorities(idxs, td_errors + 1e-5)
+                loss = optimize_step(policy_net, target_net, optimizer, replay, beta, bc_weight,
+                                     profiler=prof)
+            # Kept on the device; only read back when logging
+            smoothed_loss = 0.99 * smoothed_loss + 0.01 * loss
 
             step_count += 1
             policy_net.reset_noise()
             if step_count % TARGET_UPDATE_STEPS == 0:
                 target_net.load_state_dict(policy_net.state_dict())
                 target_net.reset_noise()
+            prof.lap("target_sync")
+            prof.count("grad_steps")
 
         # ---- Logging ----
         if print_progress and (ep + 1) % reward_window == 0:
             avg_reward = total_reward_window / reward_window
-            policy_net.eval()
-            eval_avg = 0.0
-            for _ in range(500):
-                shoe = make_shoe()
-                running_count = 0
-                dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-                for strat_fn in PLAYER_TYPES:
-                    play_fixed_player([shoe_draw(shoe), shoe_draw(shoe)], dealer_hand[0], shoe, running_count, strat_fn)
-                player_hand = [shoe_draw(shoe), shoe_draw(shoe)]
-                tc_idx = true_count_bin_from_running(running_count, len(shoe))
-                r, _, _ = play_single_hand_dqn(policy_net, shoe, running_count, dealer_hand,
-                                               player_hand, tc_idx, device=DEVICE, replay=None,
-                                               reward_scale=REWARD_SCALE, shaping_coeff=0.0,
-                                               step_counter=0, max_steps=MAX_STEPS)
-                eval_avg += r
-            eval_avg /= 500
-            policy_net.train()
+            for tag, result in evaluator.poll():
+                print(f"[Eval @ Ep {tag:,}] {format_eval(result)}")
+                if eval_callback is not None:
+                    eval_callback(tag, result)
+            spec = policy_spec(policy_net=policy_net)
+            policies = {"net": spec, "prev": prev_spec, "basic": policy_spec("basic")}
+            dropped = evaluator.submit({k: v for k, v in policies.items() if v is not None}, tag=ep + 1)
+            if dropped is not None:
+                print(f"[🟢] Eval @ Ep {dropped:,} dropped: Ep {ep + 1:,} replaced it while the pool was busy")
+            prev_spec, eval_ep = spec, ep + 1
             elapsed = time.time() - start_time
-            print(f"[Ep {ep+1:,}] AvgR={avg_reward:.3f} | EvalR={eval_avg:.3f} | "
+            print(f"[Ep {ep+1:,}] AvgR={avg_reward:.3f} | "
                   f"Steps={step_count:,} | Replay={len(replay):,} | "
-                  f"Loss={smoothed_loss:.4f} | Time={elapsed:.1f}s")
+                  f"Loss={float(smoothed_loss):.4f} | Time={elapsed:.1f}s")
+            if prof.last_record is not None:
+                print(f"    {prof.summary()}")
             total_reward_window = 0
+            prof.lap("eval")
+            if should_stop is not None and should_stop():
+                print(f"[🟢] Stopped early at episode {ep + 1:,}")
+                break
+
+        # ---- Checkpoint ----
+        if checkpoint_dir and (ep + 1) % CHECKPOINT_EVERY == 0:
+            priorities.flush()
+            extra = {"run": run, "step_count": step_count, "smoothed_loss": float(smoothed_loss),
+                     "total_reward_window": total_reward_window}
+            with replay.paused() if isinstance(replay, PrefetchSampler) else nullcontext(replay) as buffer:
+                path = save_checkpoint(checkpoint_dir, ep + 1, policy_net, target_net, optimizer,
+                                       buffer, shoe, extra)
+            if print_progress:
+                print(f"[✅] Checkpoint saved to {path}")
+            prof.lap("checkpoint")
+        prof.tick()
+
+    priorities.flush()
+    prof.close()
+    if isinstance(replay, PrefetchSampler):
+        replay.close()
+    if evaluator is not None:
+        # The trained net is always evaluated, unless the last window already submitted it
+        final_ep = ep + 1 if num_episodes > start_ep else start_ep
+        if eval_ep != final_ep:
+            policies = {"net": policy_spec(policy_net=policy_net), "prev": prev_spec,
+                        "basic": policy_spec("basic")}
+            dropped = evaluator.submit({k: v for k, v in policies.items() if v is not None}, tag=final_ep)
+            if dropped is not None:
+                print(f"[🟢] Eval @ Ep {dropped:,} dropped in favour of the final evaluation")
+        for tag, result in evaluator.poll(wait=True):
+            print(f"[Eval @ Ep {tag:,}] {format_eval(result)}")
+            if eval_callback is not None:
+                eval_callback(tag, result)
+        evaluator.close()
 
     # ---- Export final policy ----
+    export_policy_net(policy_net)
+    print("[✅] Training complete — final policy exported!")
+    return policy_net
+
+def export_policy_net(policy_net, device=DEVICE):
+    """
+    Export the dense Q-table (policy_table.PolicyTable, every encodable
+    state in one forward pass), the [total, usable ace, count bin] firmware
+    table read from it at dealer 6, and the inference net. Table rows are
+    blackjack totals (hand_tables.hand_cell): a soft cell holds an ace
+    counted as 11, as in blackjack_policy.h, and every reader
+    (shoe_sim.TablePolicy, solver.score_policy_table) looks hands up that way.
+    """
     policy_net.eval()
+    dense = PolicyTable.from_net(policy_net)
+    os.makedirs("exports", exist_ok=True)
+    dense_path = os.path.join("exports", "blackjack_q_table.npz")
+    dense.save(dense_path)
+    print(f"[✅] Exported dense Q-table {dense.q.shape} to {dense_path}")
+
     policy_table = np.zeros((22, 2, len(COUNT_BINS)), dtype=np.uint8)
-    with torch.no_grad():
-        for pt in range(4, 22):
-            for ua in [0, 1]:
-                for tc in range(len(COUNT_BINS)):
-                    dealer = 6
-                    hand = [pt - 10 if ua else pt - 2, 2]
-                    state_vec = encode_state_vec(hand, dealer, tc)
-                    s = torch.tensor(state_vec, dtype=torch.float32, device=DEVICE).unsqueeze(0)
-                    q = policy_net(s).cpu().numpy()[0]
-                    policy_table[pt, ua, tc] = np.argmax(q)
+    for pt in range(4, 22):
+        for ua in [0, 1]:
+            hand = starting_cards(pt, ua)
+            if hand is None:
+                continue
+            assert tuple(map(int, hand_cell(hand_state(hand)))) == (pt, ua), (pt, ua, hand)
+            for tc in range(len(COUNT_BINS)):
+                q = dense.q_values(encode_state_vec(hand, 6, tc)[None])[0]
+                policy_table[pt, ua, tc] = np.argmax(q)
 
     export_policy(policy_table)
-    print("[✅] Training complete — final policy exported!")
+    # Forward-only TorchScript copy for rollouts / evaluation (shoe_sim.policy_spec accepts the path)
+    net_path = os.path.join("exports", "blackjack_policy_net.pt")
+    save_inference_net(policy_net, net_path, quantize=INFERENCE_QUANTIZE)
+    print(f"[✅] Exported inference net to {net_path}")
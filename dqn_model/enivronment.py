@@ -1,9 +1,15 @@
 import random
 from collections import deque
 import numpy as np
-from config import COUNT_BINS, NUM_ACTIONS, NUM_DECKS, DEVICE, MAX_STEPS
+from config import COUNT_BINS, NUM_ACTIONS, NUM_DECKS, DEVICE, MAX_STEPS, SHOE_PENETRATION, ANALYTIC_DEALER
+from replay_buffer import TransitionStaging
+from hand_tables import hand_state, next_hand_state, hand_total_of, usable_ace_of, hand_features_of
+from dealer_dist import dealer_table
 import torch
 
+# Hi-Lo tag indexed by card value (index 0 unused, 1 = ace ... 10 = ten/face)
+HILO_TAGS = np.array([0, -1, 1, 1, 1, 1, 1, 0, 0, 0, -1], dtype=np.int64)
+
 # ---------------- SHOE & COUNT ----------------
 def make_shoe(num_decks=NUM_DECKS):
     shoe = []
@@ -31,7 +37,69 @@ def true_count_bin_from_running(running_count, cards_remaining):
     tc_rounded = max(min(tc_rounded, COUNT_BINS[-1]), COUNT_BINS[0])
     return tc_rounded + abs(COUNT_BINS[0])
 
+def _true_count_table(shoe_size):
+    """tc bin for every (running_count, cards_remaining) pair, indexed [rc + shoe_size, remaining]."""
+    rc = np.arange(-shoe_size, shoe_size + 1)[:, None]
+    remaining = np.arange(shoe_size + 1)[None, :]
+    decks_left = np.maximum(remaining / 52.0, 0.25)
+    tc = np.clip(np.rint(rc / decks_left), COUNT_BINS[0], COUNT_BINS[-1])
+    return (tc + abs(COUNT_BINS[0])).astype(np.int8)
+
+class Shoe:
+    """
+    Persistent shoe backed by a preallocated int8 array and a cursor.
+    Cards are dealt in order until the cut card (`penetration` of the shoe)
+    is passed, then `needs_shuffle` turns True and `shuffle()` reshuffles the
+    same array in place. The Hi-Lo running count and the
+    true_count_bin_from_running bin (`tc_idx`) are updated on every draw, so
+    hands can run back to back through one shoe with a meaningful count.
+    """
+    _tc_tables = {}
+
+    def __init__(self, num_decks=NUM_DECKS, penetration=SHOE_PENETRATION, rng=None):
+        self.cards = np.array([min(r, 10) for r in range(1, 14)] * 4 * num_decks, dtype=np.int8)
+        self.size = len(self.cards)
+        self.cut = int(self.size * penetration)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        if self.size not in Shoe._tc_tables:
+            Shoe._tc_tables[self.size] = _true_count_table(self.size)
+        self._tc_table = Shoe._tc_tables[self.size]
+        self.shuffle()
+
+    @classmethod
+    def from_order(cls, order, penetration=SHOE_PENETRATION, rng=None):
+        """Shoe that deals `order` first (used for reproducible comparisons)."""
+        shoe = cls(len(order) // 52, penetration, rng)
+        shoe.cards[:] = order
+        return shoe
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+        self.cursor = 0
+        self.running_count = 0
+        self.tc_idx = int(self._tc_table[self.size, self.size])
+
+    @property
+    def needs_shuffle(self):
+        return self.cursor >= self.cut
+
+    def draw(self):
+        if self.cursor >= self.size:
+            self.shuffle()
+        card = int(self.cards[self.cursor])
+        self.cursor += 1
+        self.running_count += int(HILO_TAGS[card])
+        self.tc_idx = int(self._tc_table[self.running_count + self.size, self.size - self.cursor])
+        return card
+
+    # deque-compatible, so shoe_draw() and existing callers work unchanged
+    popleft = draw
+
+    def __len__(self):
+        return self.size - self.cursor
+
 # ---------------- HAND HELPERS ----------------
+# Reference rule; hand_tables precomputes it for every packed hand state
 def hand_total(cards):
     total = sum(cards)
     aces = cards.count(1)
@@ -41,14 +109,18 @@ def hand_total(cards):
     usable_ace = 1 in cards and sum(cards) + 10 <= 21
     return total, usable_ace
 
+# Every encode_state_vec feature is an integer code divided by its scale
+STATE_FEATURE_SCALES = (21 - 4, 1, 9, len(COUNT_BINS) - 1, 5, 4)
+
 def encode_state_vec(cards, dealer_up, tc_idx):
-    total, usable = hand_total(cards)
-    total_clamped = min(max(total, 4), 21)
-    hand_size = min(len(cards), 5) / 5.0
-    num_aces = cards.count(1) / 4.0
+    return encode_hand_state(hand_state(cards), dealer_up, tc_idx)
+
+def encode_hand_state(state, dealer_up, tc_idx):
+    """encode_state_vec for a packed hand state (see hand_tables)."""
+    total, usable, hand_size, num_aces = hand_features_of[state]
     return np.array([
-        (total_clamped - 4) / (21 - 4),
-        1.0 if usable else 0.0,
+        total,
+        usable,
         (dealer_up - 1) / 9.0,
         tc_idx / (len(COUNT_BINS) - 1),
         hand_size,
@@ -56,33 +128,30 @@ def encode_state_vec(cards, dealer_up, tc_idx):
     ], dtype=np.float32)
 
 # ---------------- FIXED PLAYER STRATEGIES ----------------
+def _draw_to(hand, state, shoe, running_count):
+    c = shoe_draw(shoe)
+    hand.append(c)
+    return next_hand_state[state][c], update_count(c, running_count)
+
 def aggressive(player_hand, dealer_up, shoe, running_count):
-    total, _ = hand_total(player_hand)
-    while total < 17:
-        c = shoe_draw(shoe)
-        player_hand.append(c)
-        running_count = update_count(c, running_count)
-        total, _ = hand_total(player_hand)
+    state = hand_state(player_hand)
+    while hand_total_of[state] < 17:
+        state, running_count = _draw_to(player_hand, state, shoe, running_count)
     return player_hand, running_count
 
 def passive(player_hand, dealer_up, shoe, running_count):
-    total, _ = hand_total(player_hand)
-    while total < 12:
-        c = shoe_draw(shoe)
-        player_hand.append(c)
-        running_count = update_count(c, running_count)
-        total, _ = hand_total(player_hand)
+    state = hand_state(player_hand)
+    while hand_total_of[state] < 12:
+        state, running_count = _draw_to(player_hand, state, shoe, running_count)
     return player_hand, running_count
 
 def basic_strategy(player_hand, dealer_up, shoe, running_count):
-    total, usable = hand_total(player_hand)
+    state = hand_state(player_hand)
     while True:
+        total, usable = hand_total_of[state], usable_ace_of[state]
         if usable and total >= 18: break
         if not usable and total >= 17: break
-        c = shoe_draw(shoe)
-        player_hand.append(c)
-        running_count = update_count(c, running_count)
-        total, usable = hand_total(player_hand)
+        state, running_count = _draw_to(player_hand, state, shoe, running_count)
     return player_hand, running_count
 
 PLAYER_TYPES = [aggressive, passive, basic_strategy]
@@ -90,13 +159,11 @@ PLAYER_TYPES = [aggressive, passive, basic_strategy]
 def play_fixed_player(player_hand, dealer_up, shoe, running_count, strategy_fn):
     final_hand, running_count = strategy_fn(player_hand, dealer_up, shoe, running_count)
     dealer_hand = [dealer_up, shoe_draw(shoe)]
-    dealer_total, _ = hand_total(dealer_hand)
-    while dealer_total < 17:
-        c = shoe_draw(shoe)
-        dealer_hand.append(c)
-        running_count = update_count(c, running_count)
-        dealer_total, _ = hand_total(dealer_hand)
-    player_total, _ = hand_total(final_hand)
+    dealer_state = hand_state(dealer_hand)
+    while hand_total_of[dealer_state] < 17:
+        dealer_state, running_count = _draw_to(dealer_hand, dealer_state, shoe, running_count)
+    dealer_total = hand_total_of[dealer_state]
+    player_total = hand_total_of[hand_state(final_hand)]
     if player_total > 21: return -1.0, running_count
     if dealer_total > 21 or player_total > dealer_total: return 1.0, running_count
     if player_total < dealer_total: return -1.0, running_count
@@ -142,7 +209,10 @@ def _simulate_split_hand_dqn(hand, dealer_hand, shoe, running_count,
 # ---------------- ENVIRONMENT STEP ----------------
 def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
                        policy_net=None, tc_idx=None, device=None, replay=None,
-                       step_counter=0, max_steps=MAX_STEPS):
+                       step_counter=0, max_steps=MAX_STEPS, analytic_dealer=ANALYTIC_DEALER):
+    # analytic_dealer: STAND/DOUBLE return the expected reward from the
+    # precomputed dealer table for the current count bin instead of playing
+    # the dealer out
     player_hand = player_hand.copy()
     dealer_hand = dealer_hand.copy()
     reward, done, double_mult = 0.0, False, 1
@@ -167,6 +237,12 @@ def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
         done = True
         return player_hand, dealer_hand, reward, done, running_count, step_counter
 
+    # Invalid SPLIT (not a pair): no-op, but it uses up a step so a
+    # deterministic policy cannot repeat it forever
+    if action == 3:
+        step_counter += 1
+        return player_hand, dealer_hand, reward, done, running_count, step_counter
+
     # SURRENDER
     if action == 4:
         reward = -0.5
@@ -182,17 +258,20 @@ def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
         player_hand.append(c)
         running_count = update_count(c, running_count)
 
+        if analytic_dealer:
+            reward = float(dealer_table().stand_ev(dealer_hand[0], true_count_bin_from_running(running_count, len(shoe)),
+                                                   hand_total_of[hand_state(player_hand)], double_mult))
+            return player_hand, dealer_hand, reward, True, running_count, step_counter
+
         # Dealer plays
-        dealer_total, _ = hand_total(dealer_hand)
-        while dealer_total < 17:
+        dealer_state = hand_state(dealer_hand)
+        while hand_total_of[dealer_state] < 17:
             step_counter += 1
             if step_counter > max_steps: return player_hand, dealer_hand, -1.0 * double_mult, True, running_count, step_counter
-            c = shoe_draw(shoe)
-            dealer_hand.append(c)
-            running_count = update_count(c, running_count)
-            dealer_total, _ = hand_total(dealer_hand)
+            dealer_state, running_count = _draw_to(dealer_hand, dealer_state, shoe, running_count)
 
-        player_total, _ = hand_total(player_hand)
+        dealer_total = hand_total_of[dealer_state]
+        player_total = hand_total_of[hand_state(player_hand)]
         if player_total > 21: reward = -1.0 * double_mult
         elif dealer_total > 21 or player_total > dealer_total: reward = 1.0 * double_mult
         elif player_total < dealer_total: reward = -1.0 * double_mult
@@ -208,8 +287,7 @@ def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
         player_hand.append(c)
         running_count = update_count(c, running_count)
 
-        total, _ = hand_total(player_hand)
-        if total > 21:
+        if hand_total_of[hand_state(player_hand)] > 21:
             reward = -1.0
             done = True
             return player_hand, dealer_hand, reward, done, running_count, step_counter
@@ -219,16 +297,19 @@ def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
 
     # STAND
     if action == 1:
-        dealer_total, _ = hand_total(dealer_hand)
-        while dealer_total < 17:
+        if analytic_dealer:
+            reward = float(dealer_table().stand_ev(dealer_hand[0], true_count_bin_from_running(running_count, len(shoe)),
+                                                   hand_total_of[hand_state(player_hand)]))
+            return player_hand, dealer_hand, reward, True, running_count, step_counter
+
+        dealer_state = hand_state(dealer_hand)
+        while hand_total_of[dealer_state] < 17:
             step_counter += 1
             if step_counter > max_steps: return player_hand, dealer_hand, -1.0, True, running_count, step_counter
-            c = shoe_draw(shoe)
-            dealer_hand.append(c)
-            running_count = update_count(c, running_count)
-            dealer_total, _ = hand_total(dealer_hand)
+            dealer_state, running_count = _draw_to(dealer_hand, dealer_state, shoe, running_count)
 
-        player_total, _ = hand_total(player_hand)
+        dealer_total = hand_total_of[dealer_state]
+        player_total = hand_total_of[hand_state(player_hand)]
         if player_total > 21: reward = -1.0
         elif dealer_total > 21 or player_total > dealer_total: reward = 1.0
         elif player_total < dealer_total: reward = -1.0
@@ -239,6 +320,20 @@ def step_blackjack_env(shoe, player_hand, dealer_hand, action, running_count,
     return player_hand, dealer_hand, reward, done, running_count, step_counter
 
 # ---------------- PLAY SINGLE HAND (DQN) ----------------
+def select_action_dqn(policy_net, state, device):
+    """Greedy action for one encoded state (random if the net returns non-finite values)."""
+    with torch.no_grad():
+        s = torch.tensor(state, dtype=torch.float32, device=device).unsqueeze(0)
+        if not torch.isfinite(s).all(): 
+            s = torch.zeros_like(s)
+        if s.ndim == 1:
+            s = s.unsqueeze(0)
+        s = s.to(next(policy_net.parameters()).device)
+        qvals = policy_net(s)
+        if qvals is None or qvals.numel() == 0 or not torch.isfinite(qvals).all():
+            return np.random.randint(NUM_ACTIONS)
+        return min(int(qvals.argmax().item()), NUM_ACTIONS - 1)
+
 def play_single_hand_dqn(policy_net, shoe, running_count, dealer_hand,
                          player_hand, tc_idx, device, replay,
                          reward_scale=1.0, shaping_coeff=0.0,
@@ -248,18 +343,23 @@ def play_single_hand_dqn(policy_net, shoe, running_count, dealer_hand,
         # Encode current state
         state_vec = encode_state_vec(player_hand, dealer_hand[0], tc_idx)
 
+        # First basic-strategy decision (it only ever hits or stands)
+        hs = hand_state(player_hand)
+        total, usable = hand_total_of[hs], usable_ace_of[hs]
+        first_action = 1 if (usable and total >= 18) or (not usable and total >= 17) else 0
+
         # Play using basic strategy
         reward, running_count = play_fixed_player(
             player_hand, dealer_hand[0], shoe, running_count,
             basic_strategy
         )
 
-        # Push a dummy transition to the replay buffer
-        if replay:
+        # Push the whole hand as one transition to the replay buffer
+        if replay is not None:
             next_state = np.zeros_like(state_vec, dtype=np.float32)
             replay.push(
                 state_vec,      # current state
-                -1,             # dummy action
+                first_action,   # first action taken
                 reward * reward_scale,
                 next_state,
                 True            # done
@@ -268,33 +368,28 @@ def play_single_hand_dqn(policy_net, shoe, running_count, dealer_hand,
         return reward * reward_scale, running_count, step_counter
 
     # ---- Regular DQN gameplay ----
+    # Stage this hand's transitions (split sub-hands included) and write
+    # them to the buffer with one push_batch call at the end
+    target_replay = replay
+    if replay is not None and hasattr(replay, "push_batch"):
+        replay = TransitionStaging()
+
     done = False
     total_reward = 0.0
     state = encode_state_vec(player_hand, dealer_hand[0], tc_idx)
 
     while not done:
+        # Select action
+        action = select_action_dqn(policy_net, state, device)
+
+        # Out of steps: the chosen action ends the hand as a loss
         if step_counter >= max_steps:
-            done = True
             next_state = np.zeros_like(state, dtype=np.float32)
-            if replay:
-                replay.push(state, -1, -1.0 * reward_scale, next_state, True)
+            if replay is not None:
+                replay.push(state, action, -1.0 * reward_scale, next_state, True)
+            total_reward += -1.0 * reward_scale
             break
 
-        # Select action
-        with torch.no_grad():
-            s = torch.tensor(state, dtype=torch.float32, device=device).unsqueeze(0)
-            if not torch.isfinite(s).all(): 
-                s = torch.zeros_like(s)
-            if s.ndim == 1:
-                s = s.unsqueeze(0)
-            s = s.to(next(policy_net.parameters()).device)
-            qvals = policy_net(s)
-            if qvals is None or qvals.numel() == 0 or not torch.isfinite(qvals).all():
-                action = np.random.randint(NUM_ACTIONS)
-            else:
-                action = int(qvals.argmax().item())
-                action = min(action, NUM_ACTIONS - 1)
-
         # Step environment
         next_hand, dealer_hand_new, reward, done, running_count, step_counter = step_blackjack_env(
             shoe, player_hand, dealer_hand, action, running_count,
@@ -303,16 +398,189 @@ def play_single_hand_dqn(policy_net, shoe, running_count, dealer_hand,
         )
 
         if not done and shaping_coeff != 0.0:
-            total, _ = hand_total(next_hand)
+            total = hand_total_of[hand_state(next_hand)]
             reward += shaping_coeff * (total / 21.0)
 
         next_tc_idx = true_count_bin_from_running(running_count, len(shoe)) if not done else 0
         next_state = encode_state_vec(next_hand, dealer_hand_new[0], next_tc_idx) if not done else np.zeros_like(state, dtype=np.float32)
 
-        if replay:
+        if replay is not None:
             replay.push(state, action, float(reward) * reward_scale, next_state, done)
 
         total_reward += float(reward) * reward_scale
         state, player_hand, dealer_hand = next_state, next_hand, dealer_hand_new
 
+    if replay is not target_replay:
+        replay.flush(target_replay)
     return total_reward, running_count, step_counter
+
+# ---------------- TABLE ROUND ----------------
+def _natural_reward(cards, dealer_hand):
+    """Reward if a natural decides `cards` (1.5 / -1 / push), else None."""
+    player_bj = len(cards) == 2 and sorted(cards) == [1, 10]
+    dealer_bj = len(dealer_hand) == 2 and sorted(dealer_hand) == [1, 10]
+    if player_bj and not dealer_bj: return 1.5
+    if dealer_bj and not player_bj: return -1.0
+    if player_bj and dealer_bj: return 0.0
+    return None
+
+def _vs_dealer(player_total, dealer_total):
+    if player_total > 21: return -1.0
+    if dealer_total > 21 or player_total > dealer_total: return 1.0
+    if player_total < dealer_total: return -1.0
+    return 0.0
+
+def _play_dqn_seat(cards, dealer_hand, shoe, policy_net, device, replay,
+                   reward_scale, shaping_coeff, max_steps, max_splits, analytic_dealer=ANALYTIC_DEALER):
+    """
+    Play every decision of one DQN seat, split hands included, before the
+    dealer acts. Hands are [cards, bet, reward, hand state] with reward None
+    while the hand still has to be compared with the dealer. Intermediate transitions
+    are pushed to `replay` right away; the seat's last (state, action) is
+    returned so it can be pushed once the dealer result is known.
+    With `analytic_dealer`, STAND / DOUBLE hands are settled on the spot
+    from the precomputed dealer table instead of waiting for the dealer.
+    Returns (hands, last_transition, reward collected so far, decisions made).
+    """
+    table = dealer_table() if analytic_dealer else None
+    hands = [[cards, 1, None, hand_state(cards)]]
+    i, steps, splits_left = 0, 0, max_splits
+    total_reward = 0.0
+    decisions = 0
+    state = encode_hand_state(hands[0][3], dealer_hand[0], shoe.tc_idx)
+    while True:
+        hand = hands[i]
+        action = select_action_dqn(policy_net, state, device)
+        decisions += 1
+        finished = True
+        natural = _natural_reward(hand[0], dealer_hand)
+
+        if steps >= max_steps:
+            hand[2] = -1.0
+        elif natural is not None:
+            hand[2] = natural
+        elif action == 3 and len(hand[0]) == 2 and hand[0][0] == hand[0][1] and splits_left > 0:
+            splits_left -= 1
+            c1, c2 = shoe_draw(shoe), shoe_draw(shoe)
+            hands[i:i + 1] = [[[hand[0][0], c1], 1, None, hand_state([hand[0][0], c1])],
+                              [[hand[0][1], c2], 1, None, hand_state([hand[0][1], c2])]]
+            finished = False
+        elif action == 3:
+            # Invalid SPLIT: no-op that uses up a step
+            steps += 1
+            finished = False
+        elif action == 4:
+            hand[2] = -0.5
+        elif action == 2:
+            steps += 1
+            if steps > max_steps:
+                hand[2] = -1.0
+            else:
+                c = shoe_draw(shoe)
+                hand[0].append(c)
+                hand[3] = next_hand_state[hand[3]][c]
+                hand[1] = 2
+                if table is not None:
+                    hand[2] = float(table.stand_ev(dealer_hand[0], shoe.tc_idx, hand_total_of[hand[3]], 2))
+        elif action == 0:
+            steps += 1
+            if steps > max_steps:
+                hand[2] = -1.0
+            else:
+                c = shoe_draw(shoe)
+                hand[0].append(c)
+                hand[3] = next_hand_state[hand[3]][c]
+                if hand_total_of[hand[3]] > 21:
+                    hand[2] = -1.0
+                else:
+                    finished = False
+        elif action == 1 and table is not None:
+            hand[2] = float(table.stand_ev(dealer_hand[0], shoe.tc_idx, hand_total_of[hand[3]], hand[1]))
+        # STAND otherwise: the hand waits for the dealer
+
+        if finished:
+            i += 1
+        if i == len(hands):
+            return hands, (state, action), total_reward, decisions
+
+        reward = 0.0
+        if shaping_coeff != 0.0 and len(hands) == 1:
+            reward += shaping_coeff * (hand_total_of[hands[i][3]] / 21.0)
+        next_state = encode_hand_state(hands[i][3], dealer_hand[0], shoe.tc_idx)
+        if replay is not None:
+            replay.push(state, action, reward * reward_scale, next_state, False)
+        total_reward += reward * reward_scale
+        state = next_state
+
+def play_round(shoe, policy_net, seat_strategies=PLAYER_TYPES, dqn_seats=1, device=DEVICE,
+               replay=None, reward_scale=1.0, shaping_coeff=0.0, max_steps=MAX_STEPS, max_splits=1,
+               analytic_dealer=ANALYTIC_DEALER):
+    """
+    Deal and play one full table round from a persistent `Shoe`: the dealer,
+    one seat per fixed strategy in `seat_strategies`, then `dqn_seats` seats
+    driven by `policy_net`. Every player decision (split hands included) is
+    resolved first, the dealer then draws once, and every hand is settled
+    against that single dealer result.
+
+    Rules, rewards and transitions for the DQN seats follow the batched env:
+    one decision chain per seat, shaping only on unsplit hands, and the
+    seat's last transition carries the mean reward of its hands. The dealer
+    draws only if some hand is still live and does not count toward a
+    seat's `max_steps`. Returns (dqn_rewards, seat_rewards, decisions), the
+    last being the number of DQN seat decisions, whether or not their
+    transitions have reached `replay` yet. With `analytic_dealer` the DQN
+    seats' STAND / DOUBLE hands get their expected reward from the dealer
+    table (dealer_dist) and the dealer only draws for the fixed seats.
+    """
+    dealer_hand = [shoe_draw(shoe), shoe_draw(shoe)]
+    fixed = [[shoe_draw(shoe), shoe_draw(shoe)] for _ in seat_strategies]
+    dqn_cards = [[shoe_draw(shoe), shoe_draw(shoe)] for _ in range(dqn_seats)]
+
+    # One staging list per DQN seat, so each seat's decision chain reaches
+    # the buffer in one piece (an n-step buffer reads it as one stream)
+    staged = replay is not None and hasattr(replay, "push_batch")
+    seat_replays = [TransitionStaging() if staged else replay for _ in range(dqn_seats)]
+
+    # ---- Player decisions ----
+    fixed_hands = []
+    for cards, strat_fn in zip(fixed, seat_strategies):
+        natural = _natural_reward(cards, dealer_hand)
+        if natural is None:
+            cards, _ = strat_fn(cards, dealer_hand[0], shoe, shoe.running_count)
+        fixed_hands.append([cards, 1, natural, hand_state(cards)])
+        if natural is None and hand_total_of[fixed_hands[-1][3]] > 21:
+            fixed_hands[-1][2] = -1.0
+
+    seats = [_play_dqn_seat(cards, dealer_hand, shoe, policy_net, device, seat_replay,
+                            reward_scale, shaping_coeff, max_steps, max_splits, analytic_dealer)
+             for cards, seat_replay in zip(dqn_cards, seat_replays)]
+
+    # ---- Dealer plays once for the whole table ----
+    live = any(h[2] is None for h in fixed_hands) or \
+           any(h[2] is None for hands, _, _, _ in seats for h in hands)
+    dealer_state = hand_state(dealer_hand)
+    if live:
+        while hand_total_of[dealer_state] < 17:
+            c = shoe_draw(shoe)
+            dealer_hand.append(c)
+            dealer_state = next_hand_state[dealer_state][c]
+    dealer_total = hand_total_of[dealer_state]
+
+    # ---- Settle ----
+    def settle(hand):
+        if hand[2] is None:
+            hand[2] = _vs_dealer(hand_total_of[hand[3]], dealer_total) * hand[1]
+        return hand[2]
+
+    seat_rewards = [settle(h) for h in fixed_hands]
+    dqn_rewards = []
+    for (hands, (state, action), total_reward, _), seat_replay in zip(seats, seat_replays):
+        reward = sum(settle(h) for h in hands) / len(hands) * reward_scale
+        if seat_replay is not None:
+            seat_replay.push(state, action, reward, np.zeros_like(state, dtype=np.float32), True)
+        dqn_rewards.append(total_reward + reward)
+
+    if staged:
+        for staging in seat_replays:
+            staging.flush(replay)
+    return dqn_rewards, seat_rewards, sum(seat[3] for seat in seats)
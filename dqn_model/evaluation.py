@@ -0,0 +1,149 @@
+import os
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from batch_env import BatchBlackjackEnv
+from config import (NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION, EVAL_HANDS, EVAL_HANDS_PER_SHOE,
+                    EVAL_LANES, EVAL_WORKERS, EVAL_SEED)
+from shoe_sim import build_policy
+
+Z_95 = 1.96
+
+
+# ---------------- WORKER ----------------
+def eval_shoes(specs, seed, num_shoes, hands_per_shoe=EVAL_HANDS_PER_SHOE,
+               num_decks=NUM_DECKS, penetration=SHOE_PENETRATION):
+    """
+    Play `hands_per_shoe` hands back to back from each of `num_shoes` shoes
+    whose card orders come from `seed`, once per policy in `specs`, so every
+    policy sees the same shoes (common random numbers). Returns the total
+    reward per shoe, shape (len(specs), num_shoes).
+    """
+    torch.set_num_threads(1)
+    one_shoe = np.array([min(r, 10) for r in range(1, 14)] * 4 * num_decks, dtype=np.int8)
+    orders = np.random.default_rng(seed).permuted(np.tile(one_shoe, (num_shoes, 1)), axis=1)
+    totals = np.zeros((len(specs), num_shoes))
+    for p, spec in enumerate(specs):
+        policy = build_policy(spec)
+        # Same env seed too, so reshuffles past the cut card line up as far as possible;
+        # the dealer is always played out, whatever the training env uses
+        env = BatchBlackjackEnv(num_shoes, num_decks=num_decks, penetration=penetration, seed=seed,
+                                analytic_dealer=False)
+        for hand in range(hands_per_shoe):
+            states = env.reset(shoe_orders=orders if hand == 0 else None)
+            while not env.done.all():
+                actions = np.minimum(policy(env, states), NUM_ACTIONS - 1)
+                states, rewards, _, active = env.step(actions)
+                totals[p, active] += rewards[active]
+    return totals
+
+
+def _eval_chunk(args):
+    return eval_shoes(*args)
+
+
+# ---------------- STATISTICS ----------------
+def summarize_eval(names, totals, hands_per_shoe=EVAL_HANDS_PER_SHOE):
+    """
+    Mean EV per hand with a 95% CI for every policy (shoes are the
+    independent unit), plus the paired difference of every other policy
+    against the first one, whose CI is narrowed by the shared shoes.
+    """
+    per_hand = totals / hands_per_shoe
+    n = per_hand.shape[1]
+    out = {"hands": n * hands_per_shoe, "policies": {}, "vs_" + names[0]: {}}
+    for name, row in zip(names, per_hand):
+        out["policies"][name] = {"ev": row.mean(), "ci": Z_95 * row.std(ddof=1) / np.sqrt(n)}
+    for name, row in zip(names[1:], per_hand[1:]):
+        diff = per_hand[0] - row
+        out["vs_" + names[0]][name] = {"diff": diff.mean(), "ci": Z_95 * diff.std(ddof=1) / np.sqrt(n)}
+    return out
+
+
+def format_eval(result):
+    """One-line summary of summarize_eval output."""
+    first = next(iter(result["policies"]))
+    parts = [f"{name}={r['ev']:+.4f}±{r['ci']:.4f}" for name, r in result["policies"].items()]
+    parts += [f"{first}-{name}={r['diff']:+.4f}±{r['ci']:.4f}"
+              for name, r in result["vs_" + first].items()]
+    return f"{result['hands']:,} hands | " + " | ".join(parts)
+
+
+# ---------------- SYNC / ASYNC ENTRY POINTS ----------------
+def _jobs(specs, num_hands, seed, lanes, hands_per_shoe):
+    num_shoes = -(-num_hands // hands_per_shoe)
+    chunks = -(-num_shoes // lanes)
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [min(lanes, num_shoes - i * lanes) for i in range(chunks)]
+    return [(specs, s, size, hands_per_shoe) for s, size in zip(seeds, sizes)]
+
+
+def evaluate(policies, num_hands=EVAL_HANDS, seed=EVAL_SEED, workers=EVAL_WORKERS,
+             lanes=EVAL_LANES, hands_per_shoe=EVAL_HANDS_PER_SHOE):
+    """
+    Evaluate `policies` ({name: shoe_sim.policy_spec}) on the same seeded
+    shoes and return summarize_eval output. The shoes only depend on
+    `seed`, not on the number of workers.
+    """
+    names, specs = list(policies), list(policies.values())
+    jobs = _jobs(specs, num_hands, seed, lanes, hands_per_shoe)
+    if workers == 1:
+        parts = [_eval_chunk(job) for job in jobs]
+    else:
+        with mp.get_context("spawn").Pool(workers or os.cpu_count()) as pool:
+            parts = pool.map(_eval_chunk, jobs)
+    return summarize_eval(names, np.concatenate(parts, axis=1), hands_per_shoe)
+
+
+class AsyncEvaluator:
+    """
+    Runs `evaluate` in a background process pool so the learner keeps
+    training. `submit` snapshots the policies and returns at once. One
+    evaluation runs at a time and at most one waits behind it: a newer
+    submission replaces the waiting one, so the newest snapshot is always
+    evaluated. `poll` returns the (tag, result) pairs finished since the
+    last call and starts the waiting evaluation once the pool is free.
+    """
+    def __init__(self, num_hands=EVAL_HANDS, seed=EVAL_SEED, workers=EVAL_WORKERS,
+                 lanes=EVAL_LANES, hands_per_shoe=EVAL_HANDS_PER_SHOE):
+        self.num_hands = num_hands
+        self.seed = seed
+        self.lanes = lanes
+        self.hands_per_shoe = hands_per_shoe
+        self.pool = mp.get_context("spawn").Pool(workers or os.cpu_count())
+        self.pending = None    # (tag, names, AsyncResult) of the running evaluation
+        self.waiting = None    # (tag, policies) queued behind it
+
+    def _start(self, tag, policies):
+        jobs = _jobs(list(policies.values()), self.num_hands, self.seed, self.lanes, self.hands_per_shoe)
+        self.pending = (tag, list(policies), self.pool.map_async(_eval_chunk, jobs))
+
+    def submit(self, policies, tag=None):
+        """
+        Evaluate {name: policy_spec}, now or once the running evaluation is
+        done. Returns the tag of the waiting submission this one replaced,
+        or None if nothing was dropped.
+        """
+        if self.pending is None:
+            self._start(tag, policies)
+            return None
+        dropped = self.waiting[0] if self.waiting is not None else None
+        self.waiting = (tag, policies)
+        return dropped
+
+    def poll(self, wait=False):
+        """Finished (tag, result) pairs; `wait` blocks until the running and waiting evaluations are done."""
+        finished = []
+        while self.pending is not None and (wait or self.pending[2].ready()):
+            tag, names, result = self.pending
+            self.pending = None
+            totals = np.concatenate(result.get(), axis=1)
+            finished.append((tag, summarize_eval(names, totals, self.hands_per_shoe)))
+            if self.waiting is not None:
+                self._start(*self.waiting)
+                self.waiting = None
+        return finished
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,266 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from config import COUNT_BINS
+from policy_table import PolicyTable
+from winrate_table import NUM_TOTALS, NUM_UPCARDS, NUM_TC, SPLIT_CODE, starting_cards
+from enivronment import encode_state_vec
+from hand_tables import upcard_of
+
+SPLIT = 3
+ENCODINGS = ("u8", "packed", "rle", "dict")
+
+
+# ---------------- FIRMWARE TABLE FROM A DENSE Q-TABLE ----------------
+def _pair_cards(pt, ua):
+    """The pair that lands in cell (pt, ua), if any: A,A is soft 12, else two pt/2 cards."""
+    if ua:
+        return [1, 1] if pt == 12 else None
+    return [pt // 2] * 2 if pt % 2 == 0 and 4 <= pt <= 20 else None
+
+
+def firmware_table(dense):
+    """
+    [22][2][10][12] blackjack_policy.h codes from a policy_table.PolicyTable,
+    with every dealer upcard (hand_tables.upcard_column) instead of the dealer-6 slice:
+    the non-pair action, or 30 + it where the pair of the cell would split.
+    The last count column (+6) repeats the +5 bin.
+    """
+    table = np.zeros((NUM_TOTALS, 2, NUM_UPCARDS, NUM_TC), dtype=np.uint8)
+    for pt in range(4, NUM_TOTALS):
+        for ua in range(2):
+            cards = starting_cards(pt, ua)
+            if cards is None:
+                continue
+            pair = _pair_cards(pt, ua)
+            for col in range(NUM_UPCARDS):
+                upcard = upcard_of(col)
+                for tc_col in range(NUM_TC):
+                    tc = min(tc_col, len(COUNT_BINS) - 1)
+                    code = dense.action(encode_state_vec(cards, upcard, tc), pair=False)
+                    if pair is not None and dense.action(encode_state_vec(pair, upcard, tc), pair=True) == SPLIT:
+                        code += SPLIT_CODE
+                    table[pt, ua, col, tc_col] = code
+    return table
+
+
+# ---------------- ENCODINGS ----------------
+def _pack_bits(symbols, bits):
+    """LSB-first bitstream of fixed-width symbols, plus one pad byte for 16-bit reads."""
+    out = np.zeros((len(symbols) * bits + 7) // 8 + 1, dtype=np.uint8)
+    for i, s in enumerate(symbols):
+        for b in range(bits):
+            if s >> b & 1:
+                pos = i * bits + b
+                out[pos >> 3] |= 1 << (pos & 7)
+    return out
+
+
+def encode(table, encoding, run_axes=2):
+    """
+    Encode an integer table for the firmware. Values map to an alphabet of
+    the distinct values, each stored as `bits` = ceil(log2(len(alphabet)))
+    bits.
+      u8     - plain bytes (the current header)
+      packed - `bits` per cell, one bitstream
+      rle    - (symbol, run length) runs over the last `run_axes` axes
+               (count axis fastest), one uint16 offset per block
+      dict   - the distinct count-axis rows, `bits` per cell and byte
+               aligned, plus one row id per (all but the count axis) cell
+    Returns a dict of C arrays and sizes; flash_bytes counts every array.
+    """
+    table = np.asarray(table)
+    alphabet, symbols = np.unique(table, return_inverse=True)
+    symbols = symbols.reshape(table.shape)
+    bits = max(1, int(np.ceil(np.log2(len(alphabet)))))
+    out = {"encoding": encoding, "shape": table.shape, "bits": bits,
+           "arrays": {"alphabet": ("uint8_t", alphabet.astype(np.uint8))}}
+
+    if encoding == "u8":
+        out["arrays"] = {"blob": ("uint8_t", table.astype(np.uint8).ravel())}
+    elif encoding == "packed":
+        out["arrays"]["blob"] = ("uint8_t", _pack_bits(symbols.ravel(), bits))
+    elif encoding == "rle":
+        block = int(np.prod(table.shape[-run_axes:]))
+        out["block"] = block
+        out["wide_runs"] = bits > 4
+        max_run = 256 if bits > 4 else 1 << (8 - bits)
+        runs, offsets = [], []
+        for row in symbols.reshape(-1, block):
+            offsets.append(len(runs))
+            start = 0
+            while start < block:
+                end = start + 1
+                while end < block and row[end] == row[start] and end - start < max_run:
+                    end += 1
+                if bits > 4:
+                    runs += [int(row[start]), end - start - 1]
+                else:
+                    runs.append(int(row[start]) | (end - start - 1) << bits)
+                start = end
+        out["arrays"]["blob"] = ("uint8_t", np.array(runs, dtype=np.uint8))
+        out["arrays"]["offsets"] = ("uint16_t", np.array(offsets, dtype=np.uint16))
+    elif encoding == "dict":
+        row_len = table.shape[-1]
+        rows, row_ids = np.unique(symbols.reshape(-1, row_len), axis=0, return_inverse=True)
+        row_bytes = (row_len * bits + 7) // 8
+        out["row_bytes"] = row_bytes
+        blob = np.concatenate([_pack_bits(r, bits)[:row_bytes] for r in rows] + [np.zeros(1, np.uint8)])
+        out["arrays"]["blob"] = ("uint8_t", blob)
+        out["arrays"]["rows"] = ("uint8_t" if len(rows) <= 256 else "uint16_t",
+                                 row_ids.ravel().astype(np.uint8 if len(rows) <= 256 else np.uint16))
+    else:
+        raise ValueError(f"unknown encoding {encoding!r}")
+
+    out["flash_bytes"] = sum(a.nbytes for _, a in out["arrays"].values())
+    return out
+
+
+# ---------------- C OUTPUT ----------------
+def _c_decode(enc, name):
+    """C body of `<name>_lookup` for an encoding (flat index in `i`)."""
+    mask = (1 << enc["bits"]) - 1
+    if enc["encoding"] == "u8":
+        return f"  return {name}_blob[i];\n"
+    if enc["encoding"] == "packed":
+        return (f"  uint32_t bit = i * {enc['bits']}u;\n"
+                f"  uint16_t w = {name}_blob[bit >> 3] | ({name}_blob[(bit >> 3) + 1] << 8);\n"
+                f"  return {name}_alphabet[(w >> (bit & 7)) & {mask}u];\n")
+    if enc["encoding"] == "dict":
+        row_len = enc["shape"][-1]
+        return (f"  uint32_t bit = {name}_rows[i / {row_len}u] * {enc['row_bytes'] * 8}u"
+                f" + (i % {row_len}u) * {enc['bits']}u;\n"
+                f"  uint16_t w = {name}_blob[bit >> 3] | ({name}_blob[(bit >> 3) + 1] << 8);\n"
+                f"  return {name}_alphabet[(w >> (bit & 7)) & {mask}u];\n")
+    if enc["wide_runs"]:
+        step = (f"    uint32_t len = (uint32_t)p[1] + 1u;\n"
+                f"    if (pos < len) return {name}_alphabet[p[0]];\n"
+                f"    pos -= len;\n    p += 2;\n")
+    else:
+        step = (f"    uint32_t len = ((uint32_t)*p >> {enc['bits']}) + 1u;\n"
+                f"    if (pos < len) return {name}_alphabet[*p & {mask}u];\n"
+                f"    pos -= len;\n    p++;\n")
+    return (f"  const uint8_t *p = {name}_blob + {name}_offsets[i / {enc['block']}u];\n"
+            f"  uint32_t pos = i % {enc['block']}u;\n"
+            f"  for (;;) {{\n{step}  }}\n")
+
+
+def _c_array(ctype, name, values):
+    rows = [", ".join(str(int(v)) for v in values[i:i + 24]) for i in range(0, len(values), 24)]
+    return f"static const {ctype} {name}[{len(values)}] = {{\n  " + ",\n  ".join(rows) + "\n};\n"
+
+
+def c_source(enc, name="blackjack_policy"):
+    """Arrays plus `uint8_t <name>_lookup(i0, ..., in)` for an encoding, as C/C++ source."""
+    shape = enc["shape"]
+    params = ", ".join(f"int i{k}" for k in range(len(shape)))
+    flat = "i0"
+    for k in range(1, len(shape)):
+        flat = f"({flat}) * {shape[k]}u + i{k}"
+    src = "".join(_c_array(ctype, f"{name}_{key}", arr) for key, (ctype, arr) in enc["arrays"].items())
+    src += (f"\nstatic inline uint8_t {name}_lookup({params}) {{\n"
+            f"  uint32_t i = {flat};\n" + _c_decode(enc, name) + "}\n")
+    return src
+
+
+def write_blob_header(enc, path, name="blackjack_policy"):
+    """Write a self-contained header with the encoded table and its lookup routine."""
+    guard = os.path.basename(path).upper().replace(".", "_")
+    dims = "".join(f"[{n}]" for n in enc["shape"])
+    with open(path, "w") as f:
+        f.write(f"#ifndef {guard}\n#define {guard}\n\n#include <stdint.h>\n\n")
+        f.write(f"// Auto-generated compressed table: {name}{dims}, '{enc['encoding']}' encoding, "
+                f"{enc['bits']} bits per symbol, {enc['flash_bytes']:,} bytes of flash\n")
+        f.write(f"// {name}_lookup(i0, ...) returns the same value as {name}{''.join(f'[i{k}]' for k in range(len(enc['shape'])))}\n\n")
+        f.write(c_source(enc, name))
+        f.write(f"\n#endif // {guard}\n")
+
+
+# ---------------- SIZE / SPEED REPORT ----------------
+def _bench_source(table, encs, lookups):
+    shape = table.shape
+    src = "#include <stdint.h>\n#include <stdio.h>\n#include <time.h>\n\n"
+    for enc in encs:
+        src += c_source(enc, f"t_{enc['encoding']}")
+    src += _c_array("uint8_t", "expected", table.astype(np.uint8).ravel())
+    src += f"\nstatic uint32_t rng = 12345u;\nstatic uint32_t next_rand(void) {{ rng = rng * 1664525u + 1013904223u; return rng >> 8; }}\n"
+    src += "int main(void) {\n  int idx[4096][%d];\n" % len(shape)
+    src += "  for (int n = 0; n < 4096; n++) {\n"
+    src += "".join(f"    idx[n][{k}] = next_rand() % {s}u;\n" for k, s in enumerate(shape))
+    src += "  }\n"
+    args = ", ".join(f"idx[n & 4095][{k}]" for k in range(len(shape)))
+    flat = "idx[n][0]"
+    for k in range(1, len(shape)):
+        flat = f"({flat}) * {shape[k]}u + idx[n][{k}]"
+    for enc in encs:
+        name = f"t_{enc['encoding']}"
+        src += (f"  {{\n    long bad = 0;\n"
+                f"    for (int n = 0; n < 4096; n++) bad += {name}_lookup({', '.join(f'idx[n][{k}]' for k in range(len(shape)))}) != expected[{flat}];\n"
+                f"    volatile uint32_t sink = 0;\n    clock_t t0 = clock();\n"
+                f"    for (long n = 0; n < {lookups}L; n++) sink += {name}_lookup({args});\n"
+                f"    double s = (double)(clock() - t0) / CLOCKS_PER_SEC;\n"
+                f"    printf(\"%s %ld %.6f\\n\", \"{enc['encoding']}\", bad, s);\n  }}\n")
+    return src + "  return 0;\n}\n"
+
+
+def report(table, encodings=ENCODINGS, lookups=20_000_000, compiler=None):
+    """
+    Flash bytes of every encoding of `table`, and lookups per second of its
+    C decode routine, compiled for the host with -O2 (None without a C
+    compiler). Raises if any decoder disagrees with the table.
+    """
+    encs = [encode(table, e) for e in encodings]
+    rows = {e["encoding"]: {"flash_bytes": e["flash_bytes"], "lookups_per_sec": None} for e in encs}
+    compiler = compiler or shutil.which("cc") or shutil.which("gcc")
+    if compiler is None:
+        return rows
+    with tempfile.TemporaryDirectory() as tmp:
+        src, exe = os.path.join(tmp, "bench.c"), os.path.join(tmp, "bench")
+        with open(src, "w") as f:
+            f.write(_bench_source(np.asarray(table), encs, lookups))
+        subprocess.run([compiler, "-O2", "-o", exe, src], check=True)
+        output = subprocess.run([exe], check=True, capture_output=True, text=True).stdout
+    for line in output.split("\n"):
+        if line:
+            name, bad, seconds = line.split()
+            if int(bad):
+                raise RuntimeError(f"{name} decoder disagrees with the table on {bad} lookups")
+            rows[name]["lookups_per_sec"] = lookups / max(float(seconds), 1e-9)
+    return rows
+
+
+def print_report(title, rows):
+    base = rows["u8"]["flash_bytes"]
+    print(f"[✅] {title}")
+    for name, r in rows.items():
+        speed = f"{r['lookups_per_sec'] / 1e6:7.1f} M lookups/s" if r["lookups_per_sec"] else "  (no C compiler)"
+        print(f"    {name:>7}: {r['flash_bytes']:7,} bytes ({r['flash_bytes'] / base:6.1%}) | {speed}")
+
+
+def export_blobs(policy=None, winrates=None, encoding=None, out_dir="exports"):
+    """
+    Report every encoding for the policy table (default: blackjack_policy.h;
+    a PolicyTable gives the full dealer/pair table from the net) and the
+    win-rate table (default: src/win_rate_table.h), and write a header for
+    each in `encoding` (default: whichever is smallest for that table).
+    """
+    from winrate_table import load_policy_header, OUTPUT_HEADER
+    if isinstance(policy, PolicyTable):
+        policy = firmware_table(policy)
+    elif policy is None:
+        policy = load_policy_header()
+    if winrates is None and os.path.exists(OUTPUT_HEADER):
+        winrates = load_policy_header(OUTPUT_HEADER, name="blackjack_winrates")
+    os.makedirs(out_dir, exist_ok=True)
+    for title, table, name in (("policy", policy, "blackjack_policy"),
+                               ("win rates", winrates, "blackjack_winrates")):
+        if table is None:
+            continue
+        rows = report(table)
+        print_report(f"{title} {list(table.shape)}", rows)
+        chosen = encoding or min(rows, key=lambda e: rows[e]["flash_bytes"])
+        path = os.path.join(out_dir, f"{name}_blob.h")
+        write_blob_header(encode(table, chosen), path, name)
+        print(f"    wrote {path} ({chosen})")
@@ -0,0 +1,108 @@
+import numpy as np
+
+# ---------------- PACKED HAND STATES ----------------
+# A hand is fully described (for totals, soft flag and state features) by
+# its plain card sum with aces as 1, the number of aces and the card count,
+# so it packs into one small int:
+#
+#     state = hard << 7 | aces << 3 | ncards
+#
+# hard saturates at 255, aces at 15 and ncards at 5 (encode_state_vec caps
+# the card count at 5 anyway). Non-bust hands never get near the hard/ace
+# limits in practice, so every table below is exact for real hands.
+HARD_BITS, ACE_BITS, COUNT_BITS = 8, 4, 3
+MAX_HARD, MAX_ACES, MAX_COUNT = (1 << HARD_BITS) - 1, (1 << ACE_BITS) - 1, 5
+NUM_STATES = 1 << (HARD_BITS + ACE_BITS + COUNT_BITS)
+EMPTY_HAND = 0
+
+
+def pack_hand(hard, aces, ncards):
+    """Pack (hard sum, aces, card count) into a hand state; works on ints and arrays."""
+    return (hard << (ACE_BITS + COUNT_BITS)) | (aces << COUNT_BITS) | ncards
+
+
+def unpack_hand(state):
+    """Inverse of pack_hand -> (hard, aces, ncards)."""
+    return (state >> (ACE_BITS + COUNT_BITS),
+            (state >> COUNT_BITS) & MAX_ACES,
+            state & ((1 << COUNT_BITS) - 1))
+
+
+def _build_tables():
+    states = np.arange(NUM_STATES, dtype=np.int64)
+    hard, aces, ncards = unpack_hand(states)
+
+    # Same rules as enivronment.hand_total: 10 off per ace once the sum is
+    # over 21, and the soft flag only looks at the plain sum
+    over = np.maximum(hard - 21, 0)
+    total = hard - 10 * np.minimum(aces, (over + 9) // 10)
+    usable = (aces > 0) & (hard + 10 <= 21)
+
+    # Hand part of encode_state_vec: total, usable ace, card count, aces
+    features = np.stack([
+        (np.clip(total, 4, 21) - 4) / (21 - 4),
+        usable.astype(np.float64),
+        np.minimum(ncards, 5) / 5.0,
+        aces / 4.0,
+    ], axis=1).astype(np.float32)
+
+    cards = np.arange(11, dtype=np.int64)[None, :]   # index 0 unused, 1 = ace ... 10
+    next_state = pack_hand(np.minimum(hard[:, None] + cards, MAX_HARD),
+                           np.minimum(aces[:, None] + (cards == 1), MAX_ACES),
+                           np.minimum(ncards[:, None] + 1, MAX_COUNT))
+    next_state[:, 0] = states
+    return next_state.astype(np.int32), total.astype(np.int16), usable, features
+
+
+# NumPy tables for the batched engine: NEXT_STATE[state, card], HAND_TOTAL[state],
+# USABLE_ACE[state], HAND_FEATURES[state] -> (total, usable, count, aces) features
+NEXT_STATE, HAND_TOTAL, USABLE_ACE, HAND_FEATURES = _build_tables()
+
+# Plain-list copies for the scalar engine (list indexing beats NumPy scalar indexing)
+next_hand_state = NEXT_STATE.tolist()
+hand_total_of = HAND_TOTAL.tolist()
+usable_ace_of = USABLE_ACE.tolist()
+hand_features_of = HAND_FEATURES.tolist()
+
+
+def hand_state(cards):
+    """Packed state of a list of cards."""
+    state = EMPTY_HAND
+    for c in cards:
+        state = next_hand_state[state][c]
+    return state
+
+
+# ---------------- POLICY TABLE CELLS ----------------
+# HAND_TOTAL keeps every ace at 1 (enivronment.hand_total). Policy tables
+# (blackjack_policy.h, the exported [22, 2, bins] table, win rates) file a
+# hand under its blackjack total instead, as generate_table.cpp does: one
+# ace counts 11 while that does not bust, so A,7 is soft 18. BEST_TOTAL is
+# that total (over 21 = bust); the table row caps it at 21.
+BEST_TOTAL = (unpack_hand(np.arange(NUM_STATES))[0] + 10 * USABLE_ACE).astype(np.int16)
+CELL_TOTAL = np.minimum(BEST_TOTAL, 21)
+cell_total_of = CELL_TOTAL.tolist()
+
+
+def hand_cell(state):
+    """(total, usable ace) policy-table cell of packed hand state(s)."""
+    return CELL_TOTAL[state].astype(np.int64), USABLE_ACE[state].astype(np.int64)
+
+
+# ---------------- FIRMWARE TABLE COLUMNS ----------------
+# Dealer columns of the [22][2][10][12] tables (blackjack_policy,
+# blackjack_winrates) as src/main.cpp indexes them: column 0 = ace, then
+# 2..10 in columns 1..9. Policy_table_EV/generate_table.cpp and
+# Evsimulation.cpp (and blackjack_policy.h, written for them) use 2..9, 10,
+# ace instead; GENERATOR_COLUMNS[c] is the generator column of column c.
+GENERATOR_COLUMNS = np.array([9, 0, 1, 2, 3, 4, 5, 6, 7, 8])
+
+
+def upcard_column(upcard):
+    """Dealer column of an upcard (1 = ace ... 10); works on ints and arrays."""
+    return np.where(upcard == 1, 0, upcard - 1)
+
+
+def upcard_of(column):
+    """Inverse of upcard_column for one column."""
+    return 1 if column == 0 else column + 1
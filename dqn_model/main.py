@@ -1,10 +1,66 @@
-from dql_agent import train_and_export, train_and_export_test, train_and_export_quick
+from dql_agent import train_and_export, train_and_export_test, train_and_export_quick, resume_training
+from batch_env import check_parity
+from apex import train_apex
+from solver import solve_and_score
+from winrate_table import regenerate, check_against_generator
+from shoe_sim import simulate, policy_spec
+from evaluation import evaluate, format_eval
+from firmware_blob import export_blobs
+from policy_table import PolicyTable
+from dataset import generate_dataset, teacher_spec
+from sweep import run_sweep
+from config import CHECKPOINT_DIR
+import json
 import sys
+import numpy as np
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "test":
         train_and_export_test()
     elif len(sys.argv) > 1 and sys.argv[1] == "quick":
         train_and_export_quick()
+    elif len(sys.argv) > 1 and sys.argv[1] == "resume":
+        # a checkpoint root (continues from its latest checkpoint) or one ep<N> directory in it
+        resume_training(sys.argv[2] if len(sys.argv) > 2 else CHECKPOINT_DIR)
+    elif len(sys.argv) > 1 and sys.argv[1] == "parity":
+        print(f"[✅] Batched env matches scalar env on {check_parity():,} hands")
+    elif len(sys.argv) > 1 and sys.argv[1] == "apex":
+        train_apex()
+    elif len(sys.argv) > 1 and sys.argv[1] == "solve":
+        solve_and_score()
+    elif len(sys.argv) > 1 and sys.argv[1] == "winrates":
+        if len(sys.argv) > 2 and sys.argv[2] == "check":
+            check_against_generator()
+        else:
+            regenerate()
+    elif len(sys.argv) > 1 and sys.argv[1] == "shoesim":
+        # optional second argument: an exported .npy policy table or .pt inference net
+        # instead of blackjack_policy.h
+        arg = sys.argv[2] if len(sys.argv) > 2 else ""
+        simulate(policy_table=np.load(arg) if arg.endswith(".npy") else None,
+                 policy_net=arg if arg.endswith(".pt") else None, num_hands=100_000_000)
+    elif len(sys.argv) > 1 and sys.argv[1] == "eval":
+        # same seeded shoes for every policy: blackjack_policy.h, basic_strategy and
+        # optionally a .npy table or .pt inference net
+        policies = {"header": policy_spec(), "basic": policy_spec("basic")}
+        for arg in sys.argv[2:]:
+            if arg.endswith(".pt"):
+                policies[arg] = policy_spec(policy_net=arg)
+            else:
+                policies[arg] = policy_spec(np.load(arg))
+        print(format_eval(evaluate(policies, num_hands=2_000_000, workers=0)))
+    elif len(sys.argv) > 1 and sys.argv[1] == "dataset":
+        # offline transitions: main.py dataset <out dir> [basic|solver|header|.npy|.npz|.pt] [count]
+        out = sys.argv[2] if len(sys.argv) > 2 else "datasets/basic"
+        teacher = sys.argv[3] if len(sys.argv) > 3 else "basic"
+        generate_dataset(out, int(sys.argv[4]) if len(sys.argv) > 4 else 10_000_000, teacher_spec(teacher))
+    elif len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        # grid / random search over config.py settings: main.py sweep <spec.json> [out dir] (see sweep.expand_spec)
+        with open(sys.argv[2]) as f:
+            run_sweep(json.load(f), sys.argv[3] if len(sys.argv) > 3 else None)
+    elif len(sys.argv) > 1 and sys.argv[1] == "blob":
+        # compressed firmware headers + size/speed per encoding; pass exports/blackjack_q_table.npz
+        # to build the policy from the trained net (every dealer upcard, pair splits) instead
+        export_blobs(PolicyTable.load(sys.argv[2]) if len(sys.argv) > 2 else None)
     else:
         train_and_export(num_episodes=500_000)
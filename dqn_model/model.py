@@ -1,3 +1,4 @@
+import copy
 import math
 import torch
 import torch.nn as nn
@@ -108,4 +109,62 @@ class NoisyDuelingMLP(nn.Module):
         x = self.fc(x)
         v = self.value(x)
         a = self.adv(x)
-        return v + (a - a.mean(dim=1, keepdim=True))
\ No newline at end of file
+        return v + (a - a.mean(dim=1, keepdim=True))
+
+# ---------- Inference-only export ----------
+def _head_weights(layer, noisy):
+    if isinstance(layer, NoisyLinear):
+        if noisy:
+            return (layer.weight_mu + layer.weight_sigma * layer.weight_eps,
+                    layer.bias_mu + layer.bias_sigma * layer.bias_eps)
+        return layer.weight_mu, layer.bias_mu
+    return layer.weight, layer.bias
+
+
+class InferenceDuelingMLP(nn.Module):
+    """
+    Forward-only copy of a DuelingMLP / NoisyDuelingMLP. The noisy layers
+    are reduced to their means (or the current noise draw with noisy=True)
+    and the dueling combination v + a - mean(a) is folded into one linear
+    head, so a forward pass is the trunk plus a single matmul.
+    """
+    def __init__(self, net, noisy=False):
+        super().__init__()
+        self.fc = copy.deepcopy(net.fc)
+        self.head = nn.Linear(net.adv.in_features, net.adv.out_features)
+        self.fold_head(net, noisy)
+        self.requires_grad_(False)
+        self.eval()
+
+    @torch.no_grad()
+    def fold_head(self, net, noisy=False):
+        """Refold the value/advantage heads of `net` (e.g. after a new noise draw)."""
+        w_v, b_v = _head_weights(net.value, noisy)
+        w_a, b_a = _head_weights(net.adv, noisy)
+        self.head.weight.copy_(w_a - w_a.mean(0, keepdim=True) + w_v)
+        self.head.bias.copy_(b_a - b_a.mean() + b_v)
+
+    def forward(self, x):
+        return self.head(self.fc(x))
+
+
+def export_inference_net(net, quantize=False, script=True):
+    """
+    InferenceDuelingMLP for `net` on the CPU, optionally with int8 dynamic
+    quantization of the linear layers, and frozen TorchScript by default.
+    """
+    frozen = InferenceDuelingMLP(net).cpu()
+    if quantize:
+        frozen = torch.ao.quantization.quantize_dynamic(frozen, {nn.Linear}, dtype=torch.qint8)
+    if script:
+        frozen = torch.jit.freeze(torch.jit.script(frozen))
+    return frozen
+
+
+def save_inference_net(net, path, quantize=False):
+    """Write export_inference_net(net) as a TorchScript file."""
+    torch.jit.save(export_inference_net(net, quantize=quantize), path)
+
+
+def load_inference_net(path):
+    return torch.jit.load(path, map_location="cpu")
@@ -0,0 +1,99 @@
+import numpy as np
+import torch
+from config import COUNT_BINS, NUM_ACTIONS, DENSE_EXPORT_CHUNK
+from enivronment import STATE_FEATURE_SCALES
+from hand_tables import unpack_hand
+from model import InferenceDuelingMLP
+
+SPLIT = 3
+
+# ---------------- DENSE STATE GRID ----------------
+# One axis per encode_state_vec feature code: total (4-21), usable ace,
+# dealer upcard (1-10), count bin, hand size (2-5+ cards) and aces (0-4+).
+# Every encodable decision state has a cell; the pair flag is not a net
+# input, it only decides whether SPLIT is allowed in the argmax.
+HAND_SIZES = range(2, 6)
+ACE_CODES = range(0, 5)
+DENSE_SHAPE = (STATE_FEATURE_SCALES[0] + 1, 2, 10, len(COUNT_BINS), len(HAND_SIZES), len(ACE_CODES))
+_STRIDES = np.cumprod((1,) + DENSE_SHAPE[:0:-1])[::-1]
+_STRIDE_LIST = _STRIDES.tolist()
+
+
+def dense_states():
+    """(prod(DENSE_SHAPE), 6) float32 state vectors in the C order of DENSE_SHAPE."""
+    codes = np.stack(np.meshgrid(*[np.arange(n) for n in DENSE_SHAPE], indexing="ij"), -1)
+    codes = codes.reshape(-1, len(DENSE_SHAPE))
+    codes[:, 4] += HAND_SIZES[0]
+    return (codes / np.array(STATE_FEATURE_SCALES, dtype=np.float32)).astype(np.float32)
+
+
+def state_index(states):
+    """Flat DENSE_SHAPE index of one (6,) or many (N, 6) encoded states."""
+    codes = np.rint(np.asarray(states) * np.array(STATE_FEATURE_SCALES)).astype(np.int64)
+    codes[..., 4] = np.clip(codes[..., 4], HAND_SIZES[0], HAND_SIZES[-1]) - HAND_SIZES[0]
+    codes[..., 5] = np.minimum(codes[..., 5], ACE_CODES[-1])
+    return codes @ _STRIDES
+
+
+def dense_q_values(policy_net, chunk=DENSE_EXPORT_CHUNK):
+    """
+    Q-values of `policy_net` for every DENSE_SHAPE cell, in forward passes
+    of `chunk` states (0 = all in one pass; a 512-wide net then peaks
+    near 1 GB).
+    """
+    net = InferenceDuelingMLP(policy_net).cpu()
+    states = torch.from_numpy(dense_states())
+    with torch.no_grad():
+        q = torch.cat([net(part) for part in states.split(chunk or len(states))]).numpy()
+    return q.reshape(DENSE_SHAPE + (NUM_ACTIONS,))
+
+
+# ---------------- LOOKUP TABLE ----------------
+class PolicyTable:
+    """
+    Dense Q-table of a trained net with its greedy actions: `actions` has a
+    trailing pair axis, SPLIT only being picked where pair=1. Lookups are
+    an index computation, so simulators can run at table speed. Decoding
+    clips hand sizes over 5 cards and ace counts over 4 to the last cell.
+    """
+    def __init__(self, q):
+        self.q = np.asarray(q, dtype=np.float32).reshape(DENSE_SHAPE + (NUM_ACTIONS,))
+        no_split = self.q.copy()
+        no_split[..., SPLIT] = -np.inf
+        self.actions = np.stack([no_split.argmax(-1), self.q.argmax(-1)], -1).astype(np.uint8)
+        self._flat_actions = self.actions.reshape(-1, 2)
+        self._flat_q = self.q.reshape(-1, NUM_ACTIONS)
+        self._flat_action_list = self._flat_actions.tolist()
+
+    @classmethod
+    def from_net(cls, policy_net):
+        return cls(dense_q_values(policy_net))
+
+    def save(self, path):
+        np.savez_compressed(path, q=self.q, actions=self.actions)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path)["q"])
+
+    def action(self, state, pair=False):
+        """Greedy action for one encoded state (encode_state_vec output)."""
+        total, usable, dealer, tc, size, aces = [round(float(x) * k) for x, k in
+                                                 zip(state, STATE_FEATURE_SCALES)]
+        size = min(max(size, HAND_SIZES[0]), HAND_SIZES[-1]) - HAND_SIZES[0]
+        idx = (total * _STRIDE_LIST[0] + usable * _STRIDE_LIST[1] + dealer * _STRIDE_LIST[2]
+               + tc * _STRIDE_LIST[3] + size * _STRIDE_LIST[4] + min(aces, ACE_CODES[-1]))
+        return self._flat_action_list[idx][pair]
+
+    def q_values(self, states):
+        """(N, NUM_ACTIONS) Q-values for (N, 6) encoded states."""
+        return self._flat_q[state_index(states)]
+
+    def __call__(self, env, states):
+        """Batched actions for a BatchBlackjackEnv (shoe_sim / evaluation policy interface)."""
+        lanes = np.arange(env.num_envs)
+        slot = env.active_slot
+        cards = env.first_cards[lanes, slot]
+        ncards = unpack_hand(env.hand[lanes, slot])[2]
+        pair = (ncards == 2) & (cards[:, 0] == cards[:, 1]) & (env.num_slots == 1)
+        return self._flat_actions[state_index(states), pair.astype(np.int64)].astype(np.int64)
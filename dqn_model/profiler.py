@@ -0,0 +1,150 @@
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import queue
+import threading
+from collections import defaultdict
+from time import perf_counter
+from config import PROFILE_PATH, PROFILE_EVERY, PROFILE_CPROFILE_WINDOW
+
+
+# ---------------- NON-BLOCKING WRITER ----------------
+class MetricsWriter:
+    """
+    Appends metric records to a JSON-lines (.jsonl) or CSV (.csv) file from
+    a daemon thread, so the training loop only pays for a queue put.
+    CSV columns come from the first record.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        self.queue.put(record)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", newline="") as f:
+            writer = None
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    return
+                if self.path.endswith(".csv"):
+                    if writer is None:
+                        writer = csv.DictWriter(f, fieldnames=list(record), extrasaction="ignore")
+                        writer.writeheader()
+                    writer.writerow(record)
+                else:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+# ---------------- PHASE PROFILER ----------------
+class PhaseProfiler:
+    """
+    Wall-clock time per training-loop phase plus throughput counters.
+
+    One perf_counter cursor is shared by all phases: `lap(name)` charges
+    the time since the previous lap to `name`, so a loop iteration costs a
+    few timer reads and dict adds. Every `every` iterations `tick` closes a
+    window: it turns the totals into a record (seconds and share per phase,
+    counter rates per second), hands it to a MetricsWriter when `path` is
+    set, and resets. With `cprofile_window` set, that window (0-based) is
+    also run under cProfile and its top functions printed and saved next to
+    `path`. Device work is asynchronous on CUDA, so GPU time lands in the
+    phase that next waits on it.
+    """
+    def __init__(self, phases=(), counters=(), path=PROFILE_PATH, every=PROFILE_EVERY,
+                 cprofile_window=PROFILE_CPROFILE_WINDOW):
+        self.path = path
+        self.every = every
+        self.cprofile_window = cprofile_window
+        self.writer = MetricsWriter(path) if path else None
+        # Declared names are reported (as 0) in every window, so CSV columns stay fixed
+        self.phases = defaultdict(float, dict.fromkeys(phases, 0.0))
+        self.counters = defaultdict(int, dict.fromkeys(counters, 0))
+        self.window = 0
+        self.iterations = 0
+        self.last_record = None
+        self._profile = None
+        self.window_start = self.last = perf_counter()
+        self._maybe_start_cprofile()
+
+    def lap(self, phase):
+        now = perf_counter()
+        self.phases[phase] += now - self.last
+        self.last = now
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def tick(self):
+        """End of one loop iteration; closes the window every `every` iterations."""
+        self.iterations += 1
+        if self.iterations % self.every == 0:
+            self.flush()
+
+    def flush(self):
+        now = perf_counter()
+        seconds = now - self.window_start
+        if seconds <= 0:
+            return None
+        record = {"window": self.window, "iterations": self.iterations, "seconds": round(seconds, 6)}
+        for name, value in self.counters.items():
+            record[f"{name}_per_sec"] = value / seconds
+        for phase, spent in self.phases.items():
+            record[f"{phase}_s"] = spent
+            record[f"{phase}_frac"] = spent / seconds
+        if self.writer is not None:
+            self.writer.write(record)
+        self._maybe_stop_cprofile()
+        self.last_record = record
+        self.phases = defaultdict(float, dict.fromkeys(self.phases, 0.0))
+        self.counters = defaultdict(int, dict.fromkeys(self.counters, 0))
+        self.window += 1
+        self._maybe_start_cprofile()
+        self.window_start = self.last = perf_counter()
+        return record
+
+    def summary(self):
+        """One-line digest of the last window: rates and the largest phases."""
+        r = self.last_record
+        if r is None:
+            return ""
+        rates = " ".join(f"{k[:-8]}/s={v:,.0f}" for k, v in r.items() if k.endswith("_per_sec"))
+        phases = sorted(((v, k[:-5]) for k, v in r.items() if k.endswith("_frac")), reverse=True)
+        return rates + " | " + " ".join(f"{name}={frac:.0%}" for frac, name in phases[:4])
+
+    def _maybe_start_cprofile(self):
+        if self.cprofile_window is not None and self.window == self.cprofile_window:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def _maybe_stop_cprofile(self):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out).sort_stats("cumulative")
+        stats.print_stats(20)
+        print(f"[🟢] cProfile of window {self.window}:\n{out.getvalue()}")
+        if self.path:
+            stats.dump_stats(f"{os.path.splitext(self.path)[0]}_window{self.window}.prof")
+        self._profile = None
+
+    def close(self):
+        if self.iterations % self.every:
+            self.flush()
+        self._maybe_stop_cprofile()
+        if self.writer is not None:
+            self.writer.close()
@@ -1,53 +1,329 @@
+import operator
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
 import numpy as np
 import torch
 
 
+def _allocate_storage(buffer, capacity, state_shape, feature_scales=None):
+    """
+    Preallocate the transition arrays on `buffer`.
+    With `feature_scales` (one per state feature, state = code / scale, as
+    produced by encode_state_vec) states are kept as uint8 codes and
+    actions/dones as uint8; `_decode_states` turns codes back into the exact
+    float32 features through a lookup table on sample.
+    """
+    buffer.compact = feature_scales is not None
+    if buffer.compact:
+        scales = np.asarray(feature_scales, dtype=np.float64)
+        if tuple(state_shape) != (len(scales),):
+            raise ValueError("feature_scales needs exactly one scale per state feature")
+        buffer._scales = scales
+        buffer._lut = (np.arange(256)[None, :] / scales[:, None]).astype(np.float32)
+        buffer._lut_cols = np.arange(len(scales))
+        state_dtype, action_dtype, done_dtype = np.uint8, np.uint8, np.uint8
+    else:
+        state_dtype, action_dtype, done_dtype = np.float32, np.int64, np.float32
+
+    buffer.states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+    buffer.actions = np.zeros((capacity,), dtype=action_dtype)
+    buffer.rewards = np.zeros((capacity,), dtype=np.float32)
+    buffer.next_states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+    buffer.dones = np.zeros((capacity,), dtype=done_dtype)
+
+
+def _encode_states(buffer, states):
+    if not buffer.compact:
+        return states
+    return np.rint(np.asarray(states, dtype=np.float64) * buffer._scales).astype(np.uint8)
+
+
+def _decode_states(buffer, codes):
+    if not buffer.compact:
+        return codes
+    return buffer._lut[buffer._lut_cols, codes]
+
+
+def _gather(buffer, idxs):
+    """Rows `idxs` as NumPy arrays (states decoded), in sample() order."""
+    return (_decode_states(buffer, buffer.states[idxs]), buffer.actions[idxs], buffer.rewards[idxs],
+            _decode_states(buffer, buffer.next_states[idxs]), buffer.dones[idxs])
+
+
+def _storage_nbytes(buffer):
+    return sum(getattr(buffer, name).nbytes for name in ("states", "actions", "rewards", "next_states", "dones"))
+
+
+def _n_step_rows(buffer, states, actions, rewards, next_states, dones, streams):
+    """The rows a push stores: as given, or the n-step rows they complete."""
+    if buffer.accumulator is None:
+        return states, actions, rewards, next_states, dones
+    return buffer.accumulator.push_batch(states, actions, rewards, next_states, dones, streams)
+
+
+def _ring_slices(position, n, capacity):
+    """Split a write of `n` items at `position` into at most two contiguous (dst, src) slices."""
+    first = min(n, capacity - position)
+    slices = [(slice(position, position + first), slice(0, first))]
+    if n > first:
+        slices.append((slice(0, n - first), slice(first, n)))
+    return slices
+
+
+def _write_batch(buffer, states, actions, rewards, next_states, dones):
+    """Vectorized ring-buffer write shared by both buffers; returns the indices written."""
+    states, actions, rewards, next_states, dones = (
+        np.asarray(x) for x in (states, actions, rewards, next_states, dones))
+    n = len(actions)
+    buffer.writes += n
+    if n > buffer.capacity:
+        # Only the newest `capacity` transitions would survive anyway
+        states, actions, rewards, next_states, dones = (
+            x[-buffer.capacity:] for x in (states, actions, rewards, next_states, dones))
+        buffer.position = (buffer.position + n - buffer.capacity) % buffer.capacity
+        n = buffer.capacity
+
+    states, next_states = _encode_states(buffer, states), _encode_states(buffer, next_states)
+    for dst, src in _ring_slices(buffer.position, n, buffer.capacity):
+        buffer.states[dst] = states[src]
+        buffer.actions[dst] = actions[src]
+        buffer.rewards[dst] = rewards[src]
+        buffer.next_states[dst] = next_states[src]
+        buffer.dones[dst] = dones[src]
+
+    idxs = (buffer.position + np.arange(n)) % buffer.capacity
+    buffer.position = (buffer.position + n) % buffer.capacity
+    buffer.size = min(buffer.size + n, buffer.capacity)
+    return idxs
+
+
+def _overwritten(buffer, idxs, written):
+    """
+    Mask of the slots in `idxs` rewritten since the buffer's write count was
+    `written`: more rows went in since then than the slot's age (rows
+    written after it).
+    """
+    age = (buffer.position - 1 - idxs) % buffer.capacity
+    return buffer.writes - written > age
+
+
+# ============================================================
+# 📥 Local transition staging
+# ============================================================
+class TransitionStaging:
+    """
+    Collects transitions with the same `push` signature as the buffers and
+    writes them to a buffer with a single `push_batch` call on `flush`.
+    """
+    def __init__(self):
+        self.clear()
+
+    def push(self, state, action, reward, next_state, done):
+        self.states.append(state)
+        self.actions.append(action)
+        self.rewards.append(reward)
+        self.next_states.append(next_state)
+        self.dones.append(done)
+
+    def flush(self, replay):
+        if self.actions:
+            replay.push_batch(np.stack(self.states), np.asarray(self.actions, dtype=np.int64),
+                              np.asarray(self.rewards, dtype=np.float32), np.stack(self.next_states),
+                              np.asarray(self.dones, dtype=np.float32))
+        self.clear()
+
+    def clear(self):
+        self.states, self.actions, self.rewards, self.next_states, self.dones = [], [], [], [], []
+
+    def __len__(self):
+        return len(self.actions)
+
+
+# ============================================================
+# 🔗 n-step return accumulation
+# ============================================================
+class NStepAccumulator:
+    """
+    Per-stream staging ring that turns 1-step transitions into n-step ones.
+    A stream is one sequence of decisions (a hand, or a BatchRollout lane
+    that is re-dealt after each hand). Each stream holds its last < n steps;
+    when an n-th arrives the oldest leaves as
+    (s_t, a_t, r_t + γ r_t+1 + ... + γ^(n-1) r_t+n-1, s_t+n, False), and on
+    `done` every waiting step leaves with its return truncated at the end of
+    the hand and done=True. A row whose bootstrap is used is therefore
+    always exactly n steps long, so the learner's discount is γ^n for all
+    of them.
+    """
+    def __init__(self, n, gamma, state_shape):
+        self.n = n
+        self.gamma = gamma
+        self.state_shape = tuple(state_shape)
+        self.powers = gamma ** np.arange(n)
+        # tail[j, k] = γ^(k-j) for k >= j: returns of every slot at once
+        k = np.arange(n)
+        self.tail = np.triu(gamma ** np.maximum(k[None, :] - k[:, None], 0))
+        self._allocate(0)
+
+    def _allocate(self, num_streams):
+        self.states = np.zeros((num_streams, self.n, *self.state_shape), dtype=np.float32)
+        self.actions = np.zeros((num_streams, self.n), dtype=np.int64)
+        self.rewards = np.zeros((num_streams, self.n), dtype=np.float64)
+        self.count = np.zeros(num_streams, dtype=np.int64)
+
+    def _grow(self, num_streams):
+        old = (self.states, self.actions, self.rewards, self.count)
+        self._allocate(max(num_streams, 2 * len(self.count)))
+        for new, array in zip((self.states, self.actions, self.rewards, self.count), old):
+            new[:len(array)] = array
+
+    def clear(self):
+        """Drop every partial window (e.g. between unrelated transition sources)."""
+        self.count[:] = 0
+
+    def pending(self):
+        return int(self.count.sum())
+
+    def push_batch(self, states, actions, rewards, next_states, dones, streams=None):
+        """
+        Stage 1-step transitions of `streams` (one id per row, rows of a
+        stream in time order; None means all rows form one stream) and
+        return the n-step (states, actions, rewards, next_states, dones)
+        rows completed by them.
+        """
+        states = np.asarray(states, dtype=np.float32).reshape(-1, *self.state_shape)
+        next_states = np.asarray(next_states, dtype=np.float32).reshape(-1, *self.state_shape)
+        actions, rewards, dones = (np.asarray(x).reshape(-1) for x in (actions, rewards, dones))
+        dones = dones.astype(bool)
+        streams = (np.zeros(len(actions), dtype=np.int64) if streams is None
+                   else np.asarray(streams, dtype=np.int64).reshape(-1))
+        out = []
+        if len(streams):
+            if streams.max() >= len(self.count):
+                self._grow(int(streams.max()) + 1)
+            # Rows are applied in rounds holding each stream at most once
+            # (its k-th row in round k), so each round is one vectorized step
+            order = np.argsort(streams, kind="stable")
+            ordered = streams[order]
+            starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+            occurrence = np.empty(len(streams), dtype=np.int64)
+            occurrence[order] = np.arange(len(streams)) - np.repeat(starts, np.diff(np.r_[starts, len(streams)]))
+            rounds = int(occurrence.max()) + 1
+            for k in range(rounds):
+                rows = slice(None) if rounds == 1 else np.flatnonzero(occurrence == k)
+                self._step(states[rows], actions[rows], rewards[rows], next_states[rows], dones[rows],
+                           streams[rows], out)
+        if not out:
+            return (np.zeros((0, *self.state_shape), np.float32), np.zeros(0, np.int64), np.zeros(0, np.float32),
+                    np.zeros((0, *self.state_shape), np.float32), np.zeros(0, np.float32))
+        return tuple(np.concatenate(col) for col in zip(*out))
+
+    def _step(self, states, actions, rewards, next_states, dones, streams, out):
+        """One step of distinct `streams`; completed n-step rows are appended to `out`."""
+        slot = self.count[streams]
+        self.states[streams, slot] = states
+        self.actions[streams, slot] = actions
+        self.rewards[streams, slot] = rewards
+        self.count[streams] += 1
+
+        full = (self.count[streams] == self.n) & ~dones
+        if full.any():
+            s = streams[full]
+            out.append((self.states[s, 0], self.actions[s, 0], (self.rewards[s] @ self.powers).astype(np.float32),
+                        next_states[full], np.zeros(len(s), np.float32)))
+            self.states[s, :-1] = self.states[s, 1:]
+            self.actions[s, :-1] = self.actions[s, 1:]
+            self.rewards[s, :-1] = self.rewards[s, 1:]
+            self.count[s] -= 1
+
+        if dones.any():
+            s = streams[dones]
+            waiting = np.arange(self.n)[None, :] < self.count[s][:, None]
+            returns = np.where(waiting, self.rewards[s], 0.0) @ self.tail.T
+            row, j = np.nonzero(waiting)
+            out.append((self.states[s[row], j], self.actions[s[row], j], returns[row, j].astype(np.float32),
+                        next_states[dones][row], np.ones(len(row), np.float32)))
+            self.count[s] = 0
+
+
+def _init_n_step(buffer, n_step, gamma, state_shape):
+    """
+    n-step settings of a buffer: `discount` is the bootstrap factor its rows
+    need (gamma ** n_step; None without a gamma, i.e. the learner's own),
+    and with n_step > 1 pushes go through an NStepAccumulator first.
+    """
+    if n_step > 1 and gamma is None:
+        raise ValueError("n_step > 1 needs the gamma the returns are discounted with")
+    buffer.n_step = n_step
+    buffer.gamma = gamma
+    buffer.discount = None if gamma is None else gamma ** n_step
+    buffer.accumulator = NStepAccumulator(n_step, gamma, state_shape) if n_step > 1 else None
+
+
 # ============================================================
 # 🧱 Base Replay Buffer (fast vectorized version)
 # ============================================================
 class ReplayBuffer:
-    def __init__(self, capacity, state_shape, device=None):
+    def __init__(self, capacity, state_shape, device=None, feature_scales=None, n_step=1, gamma=None):
         """
         Fast, vectorized experience replay buffer for DQN-style agents.
         Stores transitions as preallocated NumPy arrays for maximum speed.
+        Pass `feature_scales` for compact uint8 storage (see _allocate_storage)
+        and `n_step` > 1 (with `gamma`) to store n-step returns (see _init_n_step).
         """
         self.capacity = capacity
         self.device = device or torch.device("cpu")
 
         # Preallocate contiguous arrays
-        self.states = np.zeros((capacity, *state_shape), dtype=np.float32)
-        self.actions = np.zeros((capacity,), dtype=np.int64)
-        self.rewards = np.zeros((capacity,), dtype=np.float32)
-        self.next_states = np.zeros((capacity, *state_shape), dtype=np.float32)
-        self.dones = np.zeros((capacity,), dtype=np.float32)
+        _allocate_storage(self, capacity, state_shape, feature_scales)
+        _init_n_step(self, n_step, gamma, state_shape)
 
-        # Ring buffer pointers
+        # Ring buffer pointers; `writes` counts every row ever written
         self.position = 0
         self.size = 0
+        self.writes = 0
 
     def push(self, state, action, reward, next_state, done):
         """Add a new transition to the buffer."""
-        self.states[self.position] = state
+        if self.accumulator is not None:
+            return self.push_batch([state], [action], [reward], [next_state], [done])
+        self.states[self.position] = _encode_states(self, state)
         self.actions[self.position] = action
         self.rewards[self.position] = reward
-        self.next_states[self.position] = next_state
+        self.next_states[self.position] = _encode_states(self, next_state)
         self.dones[self.position] = done
 
         self.position = (self.position + 1) % self.capacity
         self.size = min(self.size + 1, self.capacity)
+        self.writes += 1
 
-    def sample(self, batch_size):
-        """Sample a random batch of transitions."""
+    def push_batch(self, states, actions, rewards, next_states, dones, streams=None):
+        """
+        Add many transitions at once with slice writes (wraps around at capacity).
+        `streams` only matters for n-step buffers (see NStepAccumulator.push_batch).
+        """
+        _write_batch(self, *_n_step_rows(self, states, actions, rewards, next_states, dones, streams))
+
+    def sample_indices(self, batch_size):
+        """Uniform random indices for one batch."""
         if self.size < batch_size:
             raise ValueError("Not enough samples in buffer to draw a batch.")
+        return np.random.randint(0, self.size, size=batch_size)
+
+    def gather(self, idxs):
+        """(states, actions, rewards, next_states, dones) NumPy arrays for `idxs`."""
+        return _gather(self, idxs)
 
-        idxs = np.random.randint(0, self.size, size=batch_size)
+    def sample(self, batch_size):
+        """Sample a random batch of transitions."""
+        states, actions, rewards, next_states, dones = self.gather(self.sample_indices(batch_size))
         return (
-            torch.as_tensor(self.states[idxs], dtype=torch.float32, device=self.device),
-            torch.as_tensor(self.actions[idxs], dtype=torch.int64, device=self.device),
-            torch.as_tensor(self.rewards[idxs], dtype=torch.float32, device=self.device),
-            torch.as_tensor(self.next_states[idxs], dtype=torch.float32, device=self.device),
-            torch.as_tensor(self.dones[idxs], dtype=torch.float32, device=self.device),
+            torch.as_tensor(states, dtype=torch.float32, device=self.device),
+            torch.as_tensor(actions, dtype=torch.int64, device=self.device),
+            torch.as_tensor(rewards, dtype=torch.float32, device=self.device),
+            torch.as_tensor(next_states, dtype=torch.float32, device=self.device),
+            torch.as_tensor(dones, dtype=torch.float32, device=self.device),
         )
 
     def is_ready(self, batch_size, warmup=5000):
@@ -58,82 +334,367 @@ class ReplayBuffer:
         """Completely reset the buffer."""
         self.position = 0
         self.size = 0
+        self.end_streams()
+
+    def end_streams(self):
+        """Drop partially accumulated n-step windows."""
+        if self.accumulator is not None:
+            self.accumulator.clear()
+
+    def nbytes(self):
+        """Memory held by the transition arrays."""
+        return _storage_nbytes(self)
 
     def __len__(self):
         return self.size
 
 
 # ============================================================
-# ⚖️ Prioritized Replay Buffer (fast version)
+# 🌲 Segment trees for prioritized replay
+# ============================================================
+class SegmentTree:
+    """
+    Array-backed binary tree over `capacity` leaves that keeps a reduction
+    (sum or min) of all leaves at the root. Leaves live at
+    [leaf_offset, leaf_offset + capacity). Batch updates and prefix-sum
+    searches are vectorized one tree level at a time, so both cost
+    O(batch * log N) NumPy work instead of Python loops.
+    """
+    def __init__(self, capacity, op, scalar_op, neutral, dtype=np.float64):
+        self.capacity = capacity
+        self.leaf_offset = 1
+        while self.leaf_offset < capacity:
+            self.leaf_offset *= 2
+        self.op = op
+        self.scalar_op = scalar_op
+        self.neutral = neutral
+        self.tree = np.full((2 * self.leaf_offset,), neutral, dtype=dtype)
+
+    def update(self, idxs, values):
+        """Set leaves `idxs` to `values` and refresh their ancestors."""
+        nodes = np.asarray(idxs, dtype=np.int64) + self.leaf_offset
+        self.tree[nodes] = values
+        nodes = np.unique(nodes)
+        while nodes[0] > 1:
+            nodes = nodes // 2
+            keep = np.ones(len(nodes), dtype=bool)
+            keep[1:] = nodes[1:] != nodes[:-1]
+            nodes = nodes[keep]
+            self.tree[nodes] = self.op(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+
+    def update_one(self, idx, value):
+        """Single-leaf update with plain Python scalars (cheaper than `update` for one item)."""
+        tree, op = self.tree, self.scalar_op
+        node = idx + self.leaf_offset
+        tree[node] = value
+        node //= 2
+        while node >= 1:
+            tree[node] = op(tree.item(2 * node), tree.item(2 * node + 1))
+            node //= 2
+
+    def leaves(self, idxs):
+        return self.tree[np.asarray(idxs, dtype=np.int64) + self.leaf_offset]
+
+    def root(self):
+        return self.tree[1]
+
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        # float32: at tens of millions of slots the two trees would otherwise
+        # outweigh the compact transition rows
+        super().__init__(capacity, np.add, operator.add, 0.0, dtype=np.float32)
+
+    def find_prefix(self, mass):
+        """For each value in `mass`, the leaf whose prefix-sum interval contains it."""
+        nodes = np.ones(len(mass), dtype=np.int64)
+        mass = np.array(mass, dtype=np.float64)
+        while nodes[0] < self.leaf_offset:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = mass > left_sum
+            mass -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return nodes - self.leaf_offset
+
+
+class MinTree(SegmentTree):
+    def __init__(self, capacity):
+        # Holds the same float32 leaves as the sum tree, so its root is the
+        # exact minimum of the values sampling uses (see sample_indices)
+        super().__init__(capacity, np.minimum, min, np.inf, dtype=np.float32)
+
+
+# ============================================================
+# ⚖️ Prioritized Replay Buffer (sum-tree version)
 # ============================================================
 class PrioritizedReplayBuffer:
-    def __init__(self, capacity, state_shape, alpha=0.6, device=None):
+    def __init__(self, capacity, state_shape, alpha=0.6, device=None, feature_scales=None, n_step=1, gamma=None):
         """
         Prioritized replay buffer with vectorized storage.
         α controls how strongly priorities affect sampling (0 = uniform).
+        priority^α is kept in a sum tree (sampling) and a min tree
+        (importance-weight normalization), so push, sample and
+        update_priorities are all O(log N).
+        Pass `feature_scales` for compact uint8 storage (see _allocate_storage)
+        and `n_step` > 1 (with `gamma`) to store n-step returns (see _init_n_step).
         """
         self.capacity = capacity
         self.device = device or torch.device("cpu")
         self.alpha = alpha
 
         # Main storage (vectorized)
-        self.states = np.zeros((capacity, *state_shape), dtype=np.float32)
-        self.actions = np.zeros((capacity,), dtype=np.int64)
-        self.rewards = np.zeros((capacity,), dtype=np.float32)
-        self.next_states = np.zeros((capacity, *state_shape), dtype=np.float32)
-        self.dones = np.zeros((capacity,), dtype=np.float32)
-
-        # Priority data
-        self.priorities = np.ones((capacity,), dtype=np.float32)
+        _allocate_storage(self, capacity, state_shape, feature_scales)
+        _init_n_step(self, n_step, gamma, state_shape)
+
+        # priority^α per slot, as the sum tree's leaves (the min tree mirrors them)
+        self.sum_tree = SumTree(capacity)
+        self.min_tree = MinTree(capacity)
+        self.max_priority = 1.0
         self.position = 0
         self.size = 0
+        self.writes = 0
+
+    def _set_priorities(self, idxs, priorities):
+        scaled = np.asarray(priorities, dtype=np.float64) ** self.alpha
+        self.sum_tree.update(idxs, scaled)
+        self.min_tree.update(idxs, scaled)
 
     def push(self, state, action, reward, next_state, done):
         """Add a transition with the current max priority."""
-        max_prio = self.priorities[:self.size].max() if self.size > 0 else 1.0
-
-        self.states[self.position] = state
+        if self.accumulator is not None:
+            return self.push_batch([state], [action], [reward], [next_state], [done])
+        self.states[self.position] = _encode_states(self, state)
         self.actions[self.position] = action
         self.rewards[self.position] = reward
-        self.next_states[self.position] = next_state
+        self.next_states[self.position] = _encode_states(self, next_state)
         self.dones[self.position] = done
-        self.priorities[self.position] = max_prio
+        scaled = self.max_priority ** self.alpha
+        self.sum_tree.update_one(self.position, scaled)
+        self.min_tree.update_one(self.position, scaled)
 
         self.position = (self.position + 1) % self.capacity
         self.size = min(self.size + 1, self.capacity)
+        self.writes += 1
 
-    def sample(self, batch_size, beta=0.4):
-        """Sample transitions with probability proportional to priority^α."""
+    def push_batch(self, states, actions, rewards, next_states, dones, streams=None):
+        """
+        Add many transitions at once, all at the current max priority.
+        `streams` only matters for n-step buffers (see NStepAccumulator.push_batch).
+        """
+        idxs = _write_batch(self, *_n_step_rows(self, states, actions, rewards, next_states, dones, streams))
+        if len(idxs):
+            self._set_priorities(idxs, np.full(len(idxs), self.max_priority))
+
+    def end_streams(self):
+        """Drop partially accumulated n-step windows."""
+        if self.accumulator is not None:
+            self.accumulator.clear()
+
+    def sample_indices(self, batch_size, beta=0.4):
+        """Indices drawn proportionally to priority^α, plus their (B,) IS weights."""
         if self.size == 0:
             raise ValueError("Cannot sample from an empty buffer.")
 
-        scaled_prios = self.priorities[:self.size] ** self.alpha
-        probs = scaled_prios / scaled_prios.sum()
+        # Stratified sampling: one uniform draw per equal slice of total priority
+        total = self.sum_tree.root()
+        segment = total / batch_size
+        mass = (np.arange(batch_size) + np.random.random_sample(batch_size)) * segment
+        idxs = np.minimum(self.sum_tree.find_prefix(mass), self.size - 1)
+
+        # Importance-sampling weights, normalized by the largest possible weight:
+        # (p_i / p_min) ** -β, both read from the same float32 leaves, so no
+        # weight exceeds 1
+        leaves = self.sum_tree.leaves(idxs).astype(np.float64)
+        weights = (leaves / float(self.min_tree.root())) ** (-beta)
+        return idxs, weights
 
-        # Faster random sampling with replacement (no need for unique indices)
-        idxs = np.random.choice(self.size, batch_size, p=probs, replace=True)
+    def gather(self, idxs):
+        """(states, actions, rewards, next_states, dones) NumPy arrays for `idxs`."""
+        return _gather(self, idxs)
 
-        # Importance-sampling weights
-        weights = (self.size * probs[idxs]) ** (-beta)
-        weights /= weights.max()  # normalize to [0,1]
+    def sample(self, batch_size, beta=0.4):
+        """Sample transitions with probability proportional to priority^α."""
+        idxs, weights = self.sample_indices(batch_size, beta)
+        states, actions, rewards, next_states, dones = self.gather(idxs)
 
-        states = torch.as_tensor(self.states[idxs], dtype=torch.float32, device=self.device)
-        actions = torch.as_tensor(self.actions[idxs], dtype=torch.int64, device=self.device)
-        rewards = torch.as_tensor(self.rewards[idxs], dtype=torch.float32, device=self.device)
-        next_states = torch.as_tensor(self.next_states[idxs], dtype=torch.float32, device=self.device)
-        dones = torch.as_tensor(self.dones[idxs], dtype=torch.float32, device=self.device)
+        states = torch.as_tensor(states, dtype=torch.float32, device=self.device)
+        actions = torch.as_tensor(actions, dtype=torch.int64, device=self.device)
+        rewards = torch.as_tensor(rewards, dtype=torch.float32, device=self.device)
+        next_states = torch.as_tensor(next_states, dtype=torch.float32, device=self.device)
+        dones = torch.as_tensor(dones, dtype=torch.float32, device=self.device)
         weights = torch.as_tensor(weights[:, None], dtype=torch.float32, device=self.device)
 
         return (states, actions, rewards, next_states, dones, idxs, weights)
 
-    def update_priorities(self, idxs, new_priorities):
-        """Update sampling priorities (usually TD-error magnitudes)."""
-        for i, p in zip(idxs, new_priorities):
-            self.priorities[i] = float(abs(p) + 1e-5)
+    def update_priorities(self, idxs, new_priorities, written=None):
+        """
+        Update sampling priorities (usually TD-error magnitudes). `written`
+        is self.writes when `idxs` were sampled (a scalar or one per index);
+        slots overwritten since then hold new transitions and are skipped.
+        """
+        idxs = np.asarray(idxs, dtype=np.int64)
+        priorities = np.abs(np.asarray(new_priorities, dtype=np.float64)).reshape(-1) + 1e-5
+        if written is not None:
+            fresh = ~_overwritten(self, idxs, np.asarray(written))
+            idxs, priorities = idxs[fresh], priorities[fresh]
+            if not len(idxs):
+                return
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self._set_priorities(idxs, priorities)
 
     def is_ready(self, batch_size, warmup=5000):
         """Check if buffer has enough data to start training."""
         return self.size >= max(batch_size, warmup)
 
+    def nbytes(self):
+        """Memory held by the transition arrays and the priority trees."""
+        return _storage_nbytes(self) + self.sum_tree.tree.nbytes + self.min_tree.tree.nbytes
+
     def __len__(self):
         return self.size
+
+
+# ============================================================
+# 🚚 Background batch prefetching
+# ============================================================
+class PrefetchSampler:
+    """
+    Wraps a ReplayBuffer / PrioritizedReplayBuffer and samples the next
+    `depth` batches on a worker thread, into preallocated tensors (pinned
+    host memory plus device copies on CUDA), while the learner runs its
+    update. It exposes the same push / push_batch / sample /
+    update_priorities / len interface as the wrapped buffer.
+
+    Pushes take a lock shared with the worker. Priority updates are queued
+    and applied by the worker, in the order the learner issued them, before
+    it samples its next batch, so a prefetched batch is at most `depth`
+    updates stale. Returned tensors are reused: a batch stays valid until
+    the next call to `sample`. `writes` is the wrapped buffer's write count
+    when the last returned batch was sampled (see update_priorities).
+    """
+    def __init__(self, replay, batch_size, depth=2, device=None):
+        self.replay = replay
+        self.batch_size = batch_size
+        self.depth = depth
+        self.device = device or replay.device
+        self.prioritized = isinstance(replay, PrioritizedReplayBuffer)
+        self.discount = replay.discount
+        self.beta = 0.4
+        self.writes = replay.writes
+
+        self.lock = threading.Lock()
+        self._updates = deque()
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        self._slots = [self._make_slot() for _ in range(depth + 1)]
+        for slot in range(depth + 1):
+            self._free.put(slot)
+        self._in_use = None
+        self._worker = None
+        self._error = None
+
+    def _make_slot(self):
+        b, state_shape = self.batch_size, self.replay.states.shape[1:]
+        pin = self.device.type == "cuda"
+        host = [
+            torch.empty((b, *state_shape), dtype=torch.float32, pin_memory=pin),
+            torch.empty((b,), dtype=torch.int64, pin_memory=pin),
+            torch.empty((b,), dtype=torch.float32, pin_memory=pin),
+            torch.empty((b, *state_shape), dtype=torch.float32, pin_memory=pin),
+            torch.empty((b,), dtype=torch.float32, pin_memory=pin),
+            torch.ones((b, 1), dtype=torch.float32, pin_memory=pin),
+        ]
+        dev = [torch.empty_like(t, device=self.device) for t in host] if pin else host
+        return host, dev
+
+    # ---- worker ----
+    def _apply_updates(self):
+        while self._updates:
+            self.replay.update_priorities(*self._updates.popleft())
+
+    def _run(self):
+        try:
+            while True:
+                slot = self._free.get()
+                if slot is None:
+                    return
+                with self.lock:
+                    self._apply_updates()
+                    if self.prioritized:
+                        idxs, weights = self.replay.sample_indices(self.batch_size, self.beta)
+                    else:
+                        idxs, weights = self.replay.sample_indices(self.batch_size), None
+                    arrays = self.replay.gather(idxs)
+                    written = self.replay.writes
+
+                host, dev = self._slots[slot]
+                for tensor, array in zip(host, arrays):
+                    tensor.copy_(torch.from_numpy(array))
+                if weights is not None:
+                    host[5].copy_(torch.from_numpy(weights[:, None]))
+                if dev is not host:
+                    for d, h in zip(dev, host):
+                        d.copy_(h, non_blocking=True)
+                self._ready.put((slot, idxs, written))
+        except BaseException as e:  # surface worker errors in the learner thread
+            self._error = e
+            self._ready.put(None)
+
+    # ---- buffer interface ----
+    def push(self, state, action, reward, next_state, done):
+        with self.lock:
+            self.replay.push(state, action, reward, next_state, done)
+
+    def push_batch(self, states, actions, rewards, next_states, dones, streams=None):
+        with self.lock:
+            self.replay.push_batch(states, actions, rewards, next_states, dones, streams)
+
+    def end_streams(self):
+        with self.lock:
+            self.replay.end_streams()
+
+    def sample(self, batch_size, beta=0.4):
+        if batch_size != self.batch_size:
+            raise ValueError(f"PrefetchSampler was built for batch_size={self.batch_size}")
+        self.beta = beta
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="replay-prefetch", daemon=True)
+            self._worker.start()
+        if self._in_use is not None:
+            self._free.put(self._in_use)
+
+        item = self._ready.get()
+        if item is None:
+            raise RuntimeError("replay prefetch worker failed") from self._error
+        slot, idxs, self.writes = item
+        self._in_use = slot
+        states, actions, rewards, next_states, dones, weights = self._slots[slot][1]
+        if self.prioritized:
+            return (states, actions, rewards, next_states, dones, idxs, weights)
+        return (states, actions, rewards, next_states, dones)
+
+    def update_priorities(self, idxs, new_priorities, written=None):
+        self._updates.append((idxs, new_priorities, written))
+
+    @contextmanager
+    def paused(self):
+        """Keep the worker off the buffer (queued priority updates applied) and yield it, e.g. to checkpoint."""
+        with self.lock:
+            self._apply_updates()
+            yield self.replay
+
+    def close(self):
+        """Stop the worker and apply any priority updates still queued."""
+        if self._worker is not None:
+            self._free.put(None)
+            self._worker.join()
+            self._worker = None
+        with self.lock:
+            self._apply_updates()
+
+    def is_ready(self, batch_size, warmup=5000):
+        return self.replay.is_ready(batch_size, warmup)
+
+    def __len__(self):
+        return len(self.replay)
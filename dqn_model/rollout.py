@@ -0,0 +1,75 @@
+import numpy as np
+import torch
+from batch_env import BatchBlackjackEnv
+from config import NUM_ACTIONS, NUM_DECKS, MAX_STEPS, SHOE_PENETRATION, DEVICE, ANALYTIC_DEALER
+
+
+# ---------------- BATCHED ROLLOUT DRIVER ----------------
+class BatchRollout:
+    """
+    Keeps `num_envs` hands in flight on a BatchBlackjackEnv. Every round the
+    pending decision states of all hands go through the policy net in one
+    forward pass, the argmax actions are scattered back to the hands, and
+    finished hands are re-dealt straight away, so decision throughput grows
+    with the batch instead of being bound by per-call Python overhead.
+    """
+    def __init__(self, policy_net, num_envs, device=DEVICE, num_decks=NUM_DECKS,
+                 penetration=SHOE_PENETRATION, reward_scale=1.0, shaping_coeff=0.0,
+                 max_steps=MAX_STEPS, seed=None, analytic_dealer=ANALYTIC_DEALER):
+        self.policy_net = policy_net
+        self.device = device
+        self.env = BatchBlackjackEnv(num_envs, num_decks=num_decks, penetration=penetration,
+                                     reward_scale=reward_scale, shaping_coeff=shaping_coeff,
+                                     max_steps=max_steps, seed=seed, analytic_dealer=analytic_dealer)
+        self.rng = np.random.default_rng(seed)
+        self.states = self.env.reset()
+        self.hand_rewards = np.zeros(num_envs, dtype=np.float64)
+        self.decisions = 0
+        self.hands = 0
+
+    def select_actions(self, states):
+        """Greedy actions for a (N, 6) batch of states with a single forward pass."""
+        with torch.no_grad():
+            s = torch.from_numpy(states).to(self.device)
+            qvals = self.policy_net(s)
+            actions = qvals.argmax(1).cpu().numpy()
+            bad = ~torch.isfinite(qvals).all(1).cpu().numpy()
+        if bad.any():
+            actions[bad] = self.rng.integers(0, NUM_ACTIONS, bad.sum())
+        return actions
+
+    def step(self, replay=None):
+        """
+        Advance every hand by one decision, push the transitions to `replay`
+        with one push_batch call (lane ids as streams, for n-step buffers),
+        re-deal finished hands, and return the total rewards of the hands
+        that finished this round.
+        """
+        states = self.states
+        actions = self.select_actions(states)
+        next_states, rewards, dones, active = self.env.step(actions)
+
+        if replay is not None:
+            replay.push_batch(states[active], actions[active], rewards[active],
+                              next_states[active], dones[active], streams=np.flatnonzero(active))
+        self.hand_rewards += rewards
+        self.decisions += int(active.sum())
+
+        finished = np.flatnonzero(dones & active)
+        finished_rewards = self.hand_rewards[finished].copy()
+        self.hand_rewards[finished] = 0.0
+        self.hands += len(finished)
+        if len(finished):
+            next_states[finished] = self.env.reset(finished)
+        self.states = next_states
+        return finished_rewards
+
+    def play_hands(self, num_hands, replay=None):
+        """Run rounds until at least `num_hands` hands have finished; returns their rewards."""
+        results = []
+        done = 0
+        while done < num_hands:
+            finished = self.step(replay)
+            results.append(finished)
+            done += len(finished)
+        return np.concatenate(results)[:num_hands]
@@ -0,0 +1,258 @@
+import os
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from batch_env import BatchBlackjackEnv
+from config import (COUNT_BINS, NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION, BET_RAMP,
+                    SIM_LANES, SIM_WORKERS, SIM_HANDS_PER_HOUR, SIM_BANKROLL, INFERENCE_QUANTIZE)
+from hand_tables import HAND_TOTAL, USABLE_ACE, hand_cell, unpack_hand, upcard_column
+from model import NoisyDuelingMLP, export_inference_net, load_inference_net
+from policy_table import PolicyTable
+from solver import StrategySolver
+from winrate_table import decode_header_actions, load_policy_header
+
+
+# ---------------- POLICIES ----------------
+class TablePolicy:
+    """
+    Batched actions from a policy table: either the [22, 2, num_count_bins]
+    array written by utils.export_policy (action ids) or a
+    [22][2][10][12] firmware table with the src/main.cpp dealer columns
+    (winrate_table.load_policy_header, firmware_blob.firmware_table; split
+    codes, see winrate_table.decode_header_actions). Hands are looked up at
+    their table cell (hand_tables.hand_cell), so A,7 reads soft 18.
+    """
+    def __init__(self, table):
+        self.table = np.asarray(table)
+
+    def __call__(self, env, states):
+        lanes = np.arange(env.num_envs)
+        slot = env.active_slot
+        hands = env.hand[lanes, slot]
+        total, usable = hand_cell(hands)
+        tc = np.rint(states[:, 3] * (len(COUNT_BINS) - 1)).astype(np.int64)
+        if self.table.ndim == 3:
+            return self.table[total, usable, tc].astype(np.int64)
+
+        cards = env.first_cards[lanes, slot]
+        ncards = unpack_hand(hands)[2]
+        pair = (ncards == 2) & (cards[:, 0] == cards[:, 1]) & (env.num_slots == 1)
+        code = self.table[total, usable, upcard_column(env.dealer_up), tc].astype(np.int64)
+        return decode_header_actions(code, pair, ncards)
+
+
+class NetPolicy:
+    """Greedy batched actions from a Q-network (one forward pass per decision round)."""
+    def __init__(self, policy_net):
+        self.policy_net = policy_net.eval()
+
+    def __call__(self, env, states):
+        with torch.no_grad():
+            qvals = self.policy_net(torch.from_numpy(states))
+        return qvals.argmax(1).numpy()
+
+
+class BasicStrategyPolicy:
+    """enivronment.basic_strategy in batch: hit until 17 (soft 18), never double or split."""
+    def __call__(self, env, states):
+        hands = env.hand[np.arange(env.num_envs), env.active_slot]
+        total, usable = HAND_TOTAL[hands], USABLE_ACE[hands]
+        stand = np.where(usable, total >= 18, total >= 17)
+        return np.where(stand, 1, 0).astype(np.int64)
+
+
+class SolverPolicy:
+    """
+    DP teacher: solver.StrategySolver's best action for every lane, SPLIT
+    only on a first-hand pair. Actions are memoized per (hand state,
+    upcard, count bin, pair card), so a warm batch costs one np.unique and
+    a dict lookup per distinct key.
+    """
+    def __init__(self, solver=None):
+        self.solver = solver or StrategySolver()
+        self.cache = {}
+
+    def _action(self, state, upcard, tc, pair_card):
+        if pair_card:
+            return self.solver.best_action([pair_card, pair_card], upcard, tc)
+        return int(np.argmax(self.solver.state_action_evs(state, upcard, tc)))
+
+    def __call__(self, env, states):
+        lanes = np.arange(env.num_envs)
+        slot = env.active_slot
+        hands = env.hand[lanes, slot]
+        cards = env.first_cards[lanes, slot]
+        ncards = unpack_hand(hands)[2]
+        pair = (ncards == 2) & (cards[:, 0] == cards[:, 1]) & (env.num_slots == 1)
+        pair_card = np.where(pair, cards[:, 0], 0)
+        tc = np.rint(states[:, 3] * (len(COUNT_BINS) - 1)).astype(np.int64)
+        keys = ((hands * 11 + env.dealer_up) * len(COUNT_BINS) + tc) * 11 + pair_card
+        uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        actions = np.empty(len(uniq), dtype=np.int64)
+        for i, (key, j) in enumerate(zip(uniq.tolist(), first.tolist())):
+            action = self.cache.get(key)
+            if action is None:
+                action = self.cache[key] = self._action(int(hands[j]), int(env.dealer_up[j]),
+                                                        int(tc[j]), int(pair_card[j]))
+            actions[i] = action
+        return actions[inverse]
+
+
+def policy_spec(policy_table=None, policy_net=None):
+    """
+    Picklable description of a policy for worker processes: a net's CPU
+    weights and width, the path of a saved inference net
+    (model.save_inference_net), a table (default: blackjack_policy.h), a
+    policy_table.PolicyTable, "basic" or "solver" (the DP teacher).
+    """
+    if isinstance(policy_net, str):
+        return ("inference", policy_net)
+    if isinstance(policy_table, PolicyTable):
+        return ("dense", policy_table.q)
+    if policy_net is not None:
+        return ("net", ({k: v.detach().cpu().clone() for k, v in policy_net.state_dict().items()},
+                        policy_net.fc[0].out_features))
+    if isinstance(policy_table, str) and policy_table in ("basic", "solver"):
+        return (policy_table, None)
+    return ("table", np.asarray(policy_table if policy_table is not None else load_policy_header()))
+
+
+def build_policy(spec):
+    """Batched policy callable for a policy_spec."""
+    kind, payload = spec
+    if kind == "net":
+        state_dict, hidden = payload
+        net = NoisyDuelingMLP(6, NUM_ACTIONS, hidden=hidden)
+        net.load_state_dict(state_dict)
+        return NetPolicy(export_inference_net(net, quantize=INFERENCE_QUANTIZE))
+    if kind == "inference":
+        return NetPolicy(load_inference_net(payload))
+    if kind == "dense":
+        return PolicyTable(payload)
+    if kind == "basic":
+        return BasicStrategyPolicy()
+    if kind == "solver":
+        return SolverPolicy()
+    return TablePolicy(payload)
+
+
+# ---------------- SIMULATION ----------------
+def play_shoes(policy, num_hands, bet_ramp=BET_RAMP, lanes=SIM_LANES, num_decks=NUM_DECKS,
+               penetration=SHOE_PENETRATION, seed=None):
+    """
+    Play at least `num_hands` hands through `lanes` persistent shoes, each
+    dealt to `penetration` and reshuffled, betting bet_ramp[tc_idx] units on
+    every hand from the true-count bin at the deal. Returns sums over the
+    finished hands (hands, profit, profit**2, units bet), plus hands and
+    profit per count bin.
+    """
+    env = BatchBlackjackEnv(lanes, num_decks=num_decks, penetration=penetration, seed=seed,
+                            analytic_dealer=False)
+    bet_ramp = np.asarray(bet_ramp, dtype=np.float64)
+    states = env.reset()
+    bets = bet_ramp[env.tc_idx]
+    deal_bin = env.tc_idx.copy()
+    hand_reward = np.zeros(lanes)
+    totals = {"hands": 0, "profit": 0.0, "profit_sq": 0.0, "units_bet": 0.0,
+              "bin_hands": np.zeros(len(COUNT_BINS), dtype=np.int64),
+              "bin_profit": np.zeros(len(COUNT_BINS))}
+
+    while totals["hands"] < num_hands:
+        actions = np.minimum(policy(env, states), NUM_ACTIONS - 1)
+        states, rewards, dones, active = env.step(actions)
+        hand_reward += rewards
+        finished = np.flatnonzero(dones & active)
+        if not len(finished):
+            continue
+        profit = hand_reward[finished] * bets[finished]
+        totals["hands"] += len(finished)
+        totals["profit"] += profit.sum()
+        totals["profit_sq"] += np.square(profit).sum()
+        totals["units_bet"] += bets[finished].sum()
+        np.add.at(totals["bin_hands"], deal_bin[finished], 1)
+        np.add.at(totals["bin_profit"], deal_bin[finished], profit)
+        hand_reward[finished] = 0.0
+
+        states[finished] = env.reset(finished)
+        deal_bin[finished] = env.tc_idx[finished]
+        bets[finished] = bet_ramp[deal_bin[finished]]
+    return totals
+
+
+def summarize(totals, hands_per_hour=SIM_HANDS_PER_HOUR, bankroll=SIM_BANKROLL):
+    """
+    EV and standard deviation per hand (in units), EV per unit bet, per-hour
+    win rate, risk of ruin for `bankroll` units (exp(-2 EV B / var)) and N0,
+    the hands needed for the EV to equal one standard deviation.
+    """
+    n = totals["hands"]
+    ev = totals["profit"] / n
+    var = max(totals["profit_sq"] / n - ev * ev, 0.0)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bin_ev = totals["bin_profit"] / totals["bin_hands"]
+    return {
+        "hands": n,
+        "ev_per_hand": ev,
+        "std_per_hand": std,
+        "ev_stderr": std / np.sqrt(n),
+        "ev_per_unit_bet": totals["profit"] / totals["units_bet"],
+        "avg_bet": totals["units_bet"] / n,
+        "ev_per_hour": ev * hands_per_hour,
+        "std_per_hour": std * np.sqrt(hands_per_hour),
+        "risk_of_ruin": float(np.exp(-2 * ev * bankroll / var)) if ev > 0 and var > 0 else 1.0,
+        "n0": var / (ev * ev) if ev != 0 else float("inf"),
+        "bin_hands": totals["bin_hands"],
+        "bin_ev": bin_ev,
+    }
+
+
+def _merge(parts):
+    out = dict(parts[0])
+    for part in parts[1:]:
+        for key, value in part.items():
+            out[key] = out[key] + value
+    return out
+
+
+def _worker(spec, num_hands, bet_ramp, lanes, num_decks, penetration, seed):
+    torch.set_num_threads(1)
+    return play_shoes(build_policy(spec), num_hands, bet_ramp, lanes, num_decks, penetration, seed)
+
+
+def simulate(policy_table=None, policy_net=None, num_hands=10_000_000, bet_ramp=BET_RAMP,
+             workers=SIM_WORKERS, lanes=SIM_LANES, num_decks=NUM_DECKS,
+             penetration=SHOE_PENETRATION, hands_per_hour=SIM_HANDS_PER_HOUR, bankroll=SIM_BANKROLL,
+             seed=0, print_progress=True):
+    """
+    Whole-shoe bet-spread simulation over `workers` processes (0 = every
+    core), each playing num_hands / workers hands with play_shoes. Decisions
+    come from `policy_net` if given (a net, or the path of a saved inference
+    net), else `policy_table` (default: the
+    Policy_table_EV/blackjack_policy.h table, "basic" for basic_strategy).
+    Returns summarize() output.
+    """
+    spec = policy_spec(policy_table, policy_net)
+    workers = workers or os.cpu_count()
+    per_worker = -(-num_hands // workers)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    args = [(spec, per_worker, bet_ramp, lanes, num_decks, penetration, s) for s in seeds]
+    start = time.time()
+    if workers == 1:
+        parts = [_worker(*args[0])]
+    else:
+        with mp.get_context("spawn").Pool(workers) as pool:
+            parts = pool.starmap(_worker, args)
+    result = summarize(_merge(parts), hands_per_hour, bankroll)
+    result["seconds"] = time.time() - start
+
+    if print_progress:
+        print(f"[✅] {result['hands']:,} hands in {result['seconds']:.1f}s "
+              f"({result['hands'] / result['seconds']:,.0f} hands/s)")
+        print(f"EV/hand={result['ev_per_hand']:+.4f} ±{result['ev_stderr']:.4f} | "
+              f"SD/hand={result['std_per_hand']:.3f} | EV/unit bet={result['ev_per_unit_bet']:+.4f} | "
+              f"Avg bet={result['avg_bet']:.2f}")
+        print(f"EV/hour={result['ev_per_hour']:+.2f} units (SD {result['std_per_hour']:.1f}) | "
+              f"RoR({bankroll} units)={result['risk_of_ruin']:.3%} | N0={result['n0']:,.0f} hands")
+    return result
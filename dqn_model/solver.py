@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import numpy as np
+from config import COUNT_BINS, NUM_ACTIONS, NUM_DECKS, SHOE_PENETRATION
+from enivronment import HILO_TAGS
+from dealer_dist import dealer_outcome_probs, stand_ev
+from hand_tables import COUNT_BITS, hand_state, next_hand_state, hand_total_of, usable_ace_of, cell_total_of
+
+HIT, STAND, DOUBLE, SPLIT, SURRENDER = range(5)
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 5_000))  # long all-ace hit chains
+
+
+# ---------------- COUNT-BIN COMPOSITIONS ----------------
+def count_bin_composition(tc_idx, num_decks=NUM_DECKS, penetration=SHOE_PENETRATION):
+    """
+    Representative unseen-card counts (index 0 unused) for true-count bin
+    `tc_idx`, halfway to the cut card. The dealt cards carry the bin's
+    Hi-Lo running count, split evenly between missing low cards (2-6) and
+    extra high cards (ace, tens), each spread over its ranks in shoe
+    proportions.
+    """
+    decks_left = num_decks * (1 - penetration / 2)
+    counts = np.array([0] + [4] * 9 + [16], dtype=np.float64) * decks_left
+    running = (tc_idx - abs(COUNT_BINS[0])) * decks_left
+    low, high = HILO_TAGS == 1, HILO_TAGS == -1
+    shift = running / 2
+    counts[low] -= shift * counts[low] / counts[low].sum()
+    counts[high] += shift * counts[high] / counts[high].sum()
+    return np.maximum(counts, 0.0)
+
+
+# ---------------- SOLVER ----------------
+class StrategySolver:
+    """
+    EV of every action for a player hand against a dealer upcard, with the
+    shoe for each true-count bin approximated by count_bin_composition.
+
+    Rules follow play_round: DOUBLE and SURRENDER are allowed on any hand,
+    a pair splits once (the reward is the mean of both hands, and a split
+    ace + ten pays 1.5 as a natural), and an illegal SPLIT wastes steps
+    until the hand is lost. Cards are drawn with the bin's rank
+    frequencies, so values only depend on (hand state, upcard, bin) and
+    are memoized on that key (minus the state's card count, which never
+    changes an outcome). All EVs are conditional on the dealer not holding
+    a natural, since the engines settle naturals before any action.
+    """
+    def __init__(self, num_decks=NUM_DECKS, penetration=SHOE_PENETRATION):
+        self.compositions = [count_bin_composition(tc, num_decks, penetration)
+                             for tc in range(len(COUNT_BINS))]
+        self.freqs = [(c / c[1:].sum()).tolist() for c in self.compositions]
+        self._dealer = {}   # (upcard, tc_idx) -> dealer outcome probs
+        self._stand = {}    # (hard/aces key, upcard, tc_idx) -> STAND EV
+        self._values = {}   # (hard/aces key, upcard, tc_idx) -> best EV without a split
+
+    def dealer_probs(self, upcard, tc_idx):
+        key = (upcard, tc_idx)
+        probs = self._dealer.get(key)
+        if probs is None:
+            probs = self._dealer[key] = dealer_outcome_probs(upcard, self.compositions[tc_idx])
+        return probs
+
+    def _stand_ev(self, state, upcard, tc_idx):
+        key = (state >> COUNT_BITS, upcard, tc_idx)
+        ev = self._stand.get(key)
+        if ev is None:
+            ev = self._stand[key] = stand_ev(hand_total_of[state], self.dealer_probs(upcard, tc_idx))
+        return ev
+
+    def _draw_evs(self, state, upcard, tc_idx):
+        """(HIT EV, DOUBLE EV) of `state`, hitting on optimally afterwards."""
+        freqs = self.freqs[tc_idx]
+        nxt = next_hand_state[state]
+        hit = double = 0.0
+        for r in range(1, 11):
+            s = nxt[r]
+            if hand_total_of[s] > 21:
+                hit -= freqs[r]
+                double -= 2 * freqs[r]
+            else:
+                hit += freqs[r] * self.value(s, upcard, tc_idx)
+                double += 2 * freqs[r] * self._stand_ev(s, upcard, tc_idx)
+        return hit, double
+
+    def value(self, state, upcard, tc_idx):
+        """Best EV of a live hand `state` that can no longer split."""
+        key = (state >> COUNT_BITS, upcard, tc_idx)
+        v = self._values.get(key)
+        if v is None:
+            hit, double = self._draw_evs(state, upcard, tc_idx)
+            v = self._values[key] = max(hit, double, self._stand_ev(state, upcard, tc_idx), -0.5)
+        return v
+
+    def _split_ev(self, card, upcard, tc_idx):
+        freqs = self.freqs[tc_idx]
+        ev = 0.0
+        for r in range(1, 11):
+            if {card, r} == {1, 10}:
+                ev += freqs[r] * 1.5
+            else:
+                ev += freqs[r] * self.value(hand_state([card, r]), upcard, tc_idx)
+        return ev
+
+    def action_evs(self, cards, upcard, tc_idx, can_split=True):
+        """
+        EVs of [HIT, STAND, DOUBLE, SPLIT, SURRENDER] for `cards`. A natural
+        is worth 1.5 whatever the action. SPLIT is -1 where it is not a legal
+        split (not a pair, or `can_split` is False).
+        """
+        if len(cards) == 2 and sorted(cards) == [1, 10]:
+            return np.full(NUM_ACTIONS, 1.5)
+        evs = self.state_action_evs(hand_state(cards), upcard, tc_idx)
+        if can_split and len(cards) == 2 and cards[0] == cards[1]:
+            evs[SPLIT] = self._split_ev(cards[0], upcard, tc_idx)
+        return evs
+
+    def state_action_evs(self, state, upcard, tc_idx):
+        """action_evs of a packed hand state that cannot split (SPLIT is -1)."""
+        evs = np.full(NUM_ACTIONS, -1.0)
+        if hand_total_of[state] > 21:
+            return evs
+        evs[HIT], evs[DOUBLE] = self._draw_evs(state, upcard, tc_idx)
+        evs[STAND] = self._stand_ev(state, upcard, tc_idx)
+        evs[SURRENDER] = -0.5
+        return evs
+
+    def best_action(self, cards, upcard, tc_idx, can_split=True):
+        """Teacher action: argmax of action_evs."""
+        return int(np.argmax(self.action_evs(cards, upcard, tc_idx, can_split)))
+
+    def solve_table(self):
+        """
+        EVs for every two-card starting hand, upcard and count bin.
+        Returns (hands, evs): hands is a list of (c1, c2) with c1 <= c2 and
+        evs has shape [len(hands), 10, len(COUNT_BINS), NUM_ACTIONS], upcard
+        index 0 being the ace.
+        """
+        hands = [(c1, c2) for c1 in range(1, 11) for c2 in range(c1, 11)]
+        evs = np.empty((len(hands), 10, len(COUNT_BINS), NUM_ACTIONS))
+        for tc in range(len(COUNT_BINS)):
+            for up in range(1, 11):
+                for i, (c1, c2) in enumerate(hands):
+                    evs[i, up - 1, tc] = self.action_evs([c1, c2], up, tc)
+        return hands, evs
+
+    # ---------------- ORACLE ----------------
+    def policy_ev(self, policy_fn, cards, upcard, tc_idx):
+        """
+        EV of playing `cards` with `policy_fn(state, upcard, tc_idx, can_split)
+        -> action` for every decision, under the same rules as action_evs.
+        """
+        if len(cards) == 2 and sorted(cards) == [1, 10]:
+            return 1.5
+        freqs = self.freqs[tc_idx]
+        card = cards[0]  # the split card, when the starting hand is a pair
+        memo = {}
+
+        def play(state, can_split):
+            key = (state, can_split)
+            if key in memo:
+                return memo[key]
+            action = policy_fn(state, upcard, tc_idx, can_split)
+            if action == STAND:
+                ev = self._stand_ev(state, upcard, tc_idx)
+            elif action == SURRENDER:
+                ev = -0.5
+            elif action == SPLIT and can_split:
+                ev = sum(freqs[r] * (1.5 if {card, r} == {1, 10} else
+                                     play(hand_state([card, r]), False))
+                         for r in range(1, 11))
+            elif action in (HIT, DOUBLE):
+                bet = 2 if action == DOUBLE else 1
+                ev = 0.0
+                for r in range(1, 11):
+                    s = next_hand_state[state][r]
+                    if hand_total_of[s] > 21:
+                        ev -= bet * freqs[r]
+                    elif action == DOUBLE:
+                        ev += bet * freqs[r] * self._stand_ev(s, upcard, tc_idx)
+                    else:
+                        ev += freqs[r] * play(s, False)
+            else:
+                ev = -1.0
+            memo[key] = ev
+            return ev
+
+        return play(hand_state(cards), len(cards) == 2 and cards[0] == cards[1])
+
+    def score_policy_table(self, policy_table):
+        """
+        Score an exported [22, 2, num_count_bins] policy table (see
+        utils.export_policy) against the solver. For each count bin, returns
+        the table's EV, the optimal EV and their gap, averaged over upcards
+        and starting hands with the bin's card frequencies. Hands are looked
+        up at their table cell (hand_tables.cell_total_of, ace as 11 while
+        usable), the row convention of export_policy_net.
+        """
+        def table_policy(state, upcard, tc_idx, can_split):
+            return int(policy_table[cell_total_of[state], int(usable_ace_of[state]), tc_idx])
+
+        scores = []
+        for tc in range(len(COUNT_BINS)):
+            f = np.asarray(self.freqs[tc])
+            table_ev = best_ev = 0.0
+            for up in range(1, 11):
+                for c1 in range(1, 11):
+                    for c2 in range(1, 11):
+                        w = f[up] * f[c1] * f[c2]
+                        table_ev += w * self.policy_ev(table_policy, [c1, c2], up, tc)
+                        best_ev += w * self.action_evs([c1, c2], up, tc).max()
+            scores.append({"tc": COUNT_BINS[tc], "table_ev": table_ev,
+                           "optimal_ev": best_ev, "regret": best_ev - table_ev})
+        return scores
+
+
+def solve_and_score(policy_path=os.path.join("exports", "blackjack_policy.npy")):
+    """Solve the full table, save it to exports/ and score the exported policy if there is one."""
+    solver = StrategySolver()
+    start = time.perf_counter()
+    hands, evs = solver.solve_table()
+    print(f"[✅] Solved {evs.shape[0] * evs.shape[1] * evs.shape[2]:,} (hand, upcard, count) "
+          f"entries in {time.perf_counter() - start:.1f}s")
+    os.makedirs("exports", exist_ok=True)
+    np.save(os.path.join("exports", "solver_evs.npy"), evs)
+    np.save(os.path.join("exports", "solver_hands.npy"), np.array(hands, dtype=np.uint8))
+    if os.path.exists(policy_path):
+        for row in solver.score_policy_table(np.load(policy_path)):
+            print(f"TC{row['tc']:+3d}  table EV={row['table_ev']:+.4f}  "
+                  f"optimal EV={row['optimal_ev']:+.4f}  regret={row['regret']:.4f}")
+    return solver, hands, evs
@@ -0,0 +1,274 @@
+"""
+Hyperparameter / seed sweeps over config.py settings.
+
+Every trial is a fresh `python sweep.py --trial <trial.json>` process that
+gets its config overrides through DQN_CONFIG_OVERRIDES, which config.py
+applies on import: `from config import *` copies, default arguments and
+the trial's evaluation workers all see them, config.py is never edited
+and nothing leaks between trials. Trials run SWEEP_PARALLEL at a time
+with SWEEP_THREADS torch/BLAS threads each and stream their evaluations to
+<trial dir>/evals.jsonl (training phase metrics to metrics.jsonl, stdout to
+train.log). The parent reads those files, prunes trials that fall below the
+median of their peers at the same episode (by touching <trial dir>/STOP),
+and ranks configurations by eval EV at the end.
+"""
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+import numpy as np
+import config
+from config import (SWEEP_THREADS, SWEEP_PARALLEL, SWEEP_PRUNE_WARMUP, SWEEP_PRUNE_MIN_TRIALS,
+                    SWEEP_FINAL_EVAL_HANDS)
+
+STOP_FILE = "STOP"
+EVALS_FILE = "evals.jsonl"
+# Applied under every trial's own overrides: one eval worker per trial, and
+# per-window training metrics written next to the trial's other files
+_TRIAL_DEFAULTS = {"EVAL_WORKERS": 1, "PROFILE_PATH": "metrics.jsonl"}
+
+
+# ---------------- SEARCH SPEC ----------------
+def _sample(rng, dist):
+    kind, *args = dist
+    if kind == "uniform":
+        return float(rng.uniform(*args))
+    if kind == "log_uniform":
+        return float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+    if kind == "int":
+        return int(rng.integers(args[0], args[1] + 1))
+    if kind == "choice":
+        return args[int(rng.integers(len(args)))]
+    raise ValueError(f"unknown distribution {kind!r} (uniform, log_uniform, int, choice)")
+
+
+def expand_spec(spec):
+    """
+    Trials of a sweep spec, one per (configuration, seed):
+
+        {"episodes": 50000, "eval_every": 5000, "seeds": [0, 1],
+         "fixed": {"REPLAY_CAPACITY": 200000},
+         "grid": {"LR": [0.0001, 0.0003], "HIDDEN": [256, 512]}}
+
+    or, for random search, "random": {"LR": ["log_uniform", 1e-5, 1e-3],
+    "GAMMA": ["uniform", 0.9, 0.999], "HIDDEN": ["choice", 256, 512],
+    "TARGET_UPDATE_STEPS": ["int", 500, 5000]} with "samples": N (drawn
+    from "search_seed"). Keys are config.py names, other than
+    config.DERIVED_SETTINGS. Every trial runs with NUM_EPISODES set to
+    "episodes", so settings derived from it follow the trial's length.
+    """
+    if "grid" in spec:
+        names = list(spec["grid"])
+        configs = [dict(zip(names, values)) for values in itertools.product(*spec["grid"].values())]
+    elif "random" in spec:
+        rng = np.random.default_rng(spec.get("search_seed", 0))
+        configs = [{name: _sample(rng, dist) for name, dist in spec["random"].items()}
+                   for _ in range(spec.get("samples", 8))]
+    else:
+        configs = [{}]
+    fixed = spec.get("fixed", {})
+    unknown = sorted(name for name in {*fixed, *configs[0]} if not hasattr(config, name))
+    if unknown:
+        raise ValueError(f"not config.py settings: {', '.join(unknown)}")
+    derived = sorted({*fixed, *configs[0]} & {*config.DERIVED_SETTINGS, "NUM_EPISODES"})
+    if derived:
+        raise ValueError(f"derived from the spec's \"episodes\", not settable: {', '.join(derived)}")
+    episodes = spec.get("episodes", 50_000)
+
+    trials = []
+    for i, params in enumerate(configs):
+        for seed in spec.get("seeds", [0]):
+            trials.append({"id": f"c{i:03d}-s{seed}", "config_id": i, "params": params, "seed": seed,
+                           "config": {**_TRIAL_DEFAULTS, **fixed, **params, "NUM_EPISODES": episodes},
+                           "episodes": episodes, "eval_every": spec.get("eval_every", 5_000)})
+    return trials
+
+
+# ---------------- TRIAL PROCESS ----------------
+def _eval_record(episode, result):
+    net, vs = result["policies"]["net"], result["vs_net"]["basic"]
+    return {"episode": episode, "ev": float(net["ev"]), "ci": float(net["ci"]),
+            "vs_basic": float(vs["diff"]), "vs_basic_ci": float(vs["ci"]), "time": time.time()}
+
+
+def _trial_main(trial_path):
+    """Entry point of one trial process (cwd = its trial directory)."""
+    with open(trial_path) as f:
+        trial = json.load(f)
+    import random
+    import torch
+    import dql_agent
+    from evaluation import evaluate
+    from shoe_sim import policy_spec
+
+    torch.set_num_threads(trial["threads"])
+    random.seed(trial["seed"])
+    np.random.seed(trial["seed"])
+    torch.manual_seed(trial["seed"])
+
+    with open(EVALS_FILE, "a", buffering=1) as evals:
+        def report(episode, result):
+            evals.write(json.dumps(_eval_record(episode, result)) + "\n")
+
+        policy_net = dql_agent._train_and_export_core(
+            trial["episodes"], print_progress=True, reward_window=trial["eval_every"],
+            eval_callback=report, should_stop=lambda: os.path.exists(STOP_FILE))
+        if not os.path.exists(STOP_FILE) and trial["final_eval_hands"]:
+            # Same EVAL_SEED shoes for every trial, so final EVs are directly comparable
+            result = evaluate({"net": policy_spec(policy_net=policy_net), "basic": policy_spec("basic")},
+                              num_hands=trial["final_eval_hands"], workers=1)
+            report("final", result)
+
+
+# ---------------- SCHEDULER ----------------
+def _read_records(path, offset):
+    """Complete JSON lines appended to `path` since `offset`, and the new offset."""
+    if not os.path.exists(path):
+        return [], offset
+    with open(path) as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind("\n") + 1
+    return [json.loads(line) for line in data[:end].splitlines() if line], offset + len(data[:end].encode())
+
+
+def _latest_ev(records, episode):
+    """EV of the latest evaluation at or before `episode`, or None."""
+    evals = [r for r in records if r["episode"] != "final" and r["episode"] <= episode]
+    return max(evals, key=lambda r: r["episode"])["ev"] if evals else None
+
+
+def _should_prune(trial_id, record, reports, warmup, min_trials):
+    """
+    Median stopping rule: below the median EV of the other trials, each at
+    its latest evaluation at or before this episode. Trials evaluate
+    asynchronously and skip points while their evaluator is busy, so peers
+    rarely share the exact episode.
+    """
+    if sum(r["episode"] != "final" for r in reports[trial_id]) < warmup:
+        return False
+    peers = [ev for other, records in reports.items() if other != trial_id
+             for ev in [_latest_ev(records, record["episode"])] if ev is not None]
+    return len(peers) + 1 >= min_trials and record["ev"] < np.median(peers)
+
+
+def run_sweep(spec, out_dir=None, parallel=SWEEP_PARALLEL, threads=SWEEP_THREADS,
+              prune_warmup=SWEEP_PRUNE_WARMUP, prune_min_trials=SWEEP_PRUNE_MIN_TRIALS,
+              final_eval_hands=SWEEP_FINAL_EVAL_HANDS, poll_interval=1.0):
+    """
+    Run every trial of `spec` (see expand_spec) under `out_dir` and return
+    the ranked summary rows (also written to <out_dir>/summary.json).
+    """
+    out_dir = out_dir or os.path.join("sweeps", time.strftime("%Y%m%d-%H%M%S"))
+    trials = expand_spec(spec)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "spec.json"), "w") as f:
+        json.dump(spec, f, indent=1)
+    for trial in trials:
+        trial.update(threads=threads, final_eval_hands=final_eval_hands,
+                     dir=os.path.abspath(os.path.join(out_dir, trial["id"])))
+        os.makedirs(trial["dir"], exist_ok=True)
+        with open(os.path.join(trial["dir"], "trial.json"), "w") as f:
+            json.dump(trial, f, indent=1)
+
+    parallel = parallel or max(1, (os.cpu_count() or 1) // threads)
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads), PYTHONUNBUFFERED="1")
+    print(f"[🟢] Sweep of {len(trials)} trials, {parallel} at a time, in {out_dir}")
+    start = time.time()
+    pending, running = deque(trials), {}
+    reports = {t["id"]: [] for t in trials}
+    offsets = dict.fromkeys(reports, 0)
+    status = {}
+    try:
+        while pending or running:
+            while pending and len(running) < parallel:
+                trial = pending.popleft()
+                log = open(os.path.join(trial["dir"], "train.log"), "w")
+                proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--trial",
+                                         os.path.join(trial["dir"], "trial.json")],
+                                        cwd=trial["dir"], stdout=log, stderr=subprocess.STDOUT,
+                                        env=dict(env, DQN_CONFIG_OVERRIDES=json.dumps(trial["config"])))
+                running[trial["id"]] = (trial, proc, log)
+            time.sleep(poll_interval)
+
+            for trial_id, (trial, proc, log) in list(running.items()):
+                exited = proc.poll() is not None  # before reading, so no record is missed
+                records, offsets[trial_id] = _read_records(os.path.join(trial["dir"], EVALS_FILE),
+                                                           offsets[trial_id])
+                for record in records:
+                    reports[trial_id].append(record)
+                    if (record["episode"] != "final" and not exited
+                            and _should_prune(trial_id, record, reports, prune_warmup, prune_min_trials)):
+                        open(os.path.join(trial["dir"], STOP_FILE), "w").close()
+                        print(f"[🟢] Pruning {trial_id} at episode {record['episode']:,} (EV={record['ev']:+.4f})")
+                if exited:
+                    log.close()
+                    del running[trial_id]
+                    if proc.returncode:
+                        status[trial_id] = "failed"
+                    else:
+                        status[trial_id] = "pruned" if os.path.exists(os.path.join(trial["dir"], STOP_FILE)) else "done"
+                    last = reports[trial_id][-1]["ev"] if reports[trial_id] else float("nan")
+                    print(f"[{len(status)}/{len(trials)}] {trial_id} {status[trial_id]} | EV={last:+.4f} | "
+                          f"Time={time.time() - start:.1f}s")
+    except KeyboardInterrupt:
+        for _, proc, _ in running.values():
+            proc.terminate()
+        raise
+
+    rows = summarize_sweep(trials, reports, status)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(rows, f, indent=1)
+    print(format_sweep(rows))
+    return rows
+
+
+# ---------------- SUMMARY ----------------
+def summarize_sweep(trials, reports, status):
+    """
+    One row per configuration, ranked: configurations whose seeds all
+    finished first, by mean final EV, then pruned / failed ones by their
+    last intermediate EV. With several seeds the CI is the spread across
+    seeds (it includes the eval noise); with one it is that eval's CI.
+    """
+    from evaluation import Z_95
+
+    rows = []
+    for config_id, group in itertools.groupby(trials, key=lambda t: t["config_id"]):
+        group = list(group)
+        last = [reports[t["id"]][-1] for t in group if reports[t["id"]]]
+        states = {status.get(t["id"], "failed") for t in group}
+        row = {"config_id": config_id, "params": group[0]["params"], "seeds": len(last),
+               "status": "done" if states == {"done"} else "/".join(sorted(states - {"done"})),
+               "ev": None, "ci": None, "vs_basic": None}
+        if last:
+            evs = np.array([r["ev"] for r in last])
+            row["ev"] = float(evs.mean())
+            row["ci"] = float(Z_95 * evs.std(ddof=1) / np.sqrt(len(evs)) if len(evs) > 1 else last[0]["ci"])
+            row["vs_basic"] = float(np.mean([r["vs_basic"] for r in last]))
+        rows.append(row)
+    rows.sort(key=lambda r: (r["status"] != "done", r["ev"] is None, -(r["ev"] or 0.0)))
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+    return rows
+
+
+def format_sweep(rows):
+    lines = [f"{'rank':>4}  {'configuration':<40} {'seeds':>5}  {'EV/hand':>16}  {'vs basic':>9}  status"]
+    for r in rows:
+        params = " ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in r["params"].items())
+        ev = f"{r['ev']:+.4f}±{r['ci']:.4f}" if r["ev"] is not None else "-"
+        vs = f"{r['vs_basic']:+.4f}" if r["vs_basic"] is not None else "-"
+        lines.append(f"{r['rank']:>4}  {params or '(defaults)':<40} {r['seeds']:>5}  {ev:>16}  {vs:>9}  {r['status']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--trial":
+        _trial_main(sys.argv[2])
+    else:
+        with open(sys.argv[1]) as f:
+            run_sweep(json.load(f), sys.argv[2] if len(sys.argv) > 2 else None)
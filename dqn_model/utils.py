@@ -11,7 +11,9 @@ def export_policy(policy_table, filename_prefix="blackjack_policy"):
       - .txt for human-readable action names
     
     Args:
-        policy_table: numpy array of shape [22, 2, num_count_bins]
+        policy_table: numpy array of shape [22, 2, num_count_bins], rows are
+            blackjack totals (one ace as 11 while it does not bust, see
+            hand_tables.hand_cell), so A,7 is row 18 with usable_ace = 1
         filename_prefix: base name for exported files
     """
     os.makedirs("exports", exist_ok=True)
@@ -31,6 +33,7 @@ def export_policy(policy_table, filename_prefix="blackjack_policy"):
         f.write(f"// Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write("// Dimensions: [22][2][%d]\n" % shape[2])
         f.write("// Format: [player_total][usable_ace][true_count_bin]\n")
+        f.write("// player_total counts one ace as 11 while that does not bust (A,7 = soft 18)\n")
         f.write("// Actions: 0=HIT, 1=STAND, 2=DOUBLE, 3=SPLIT, 4=SURRENDER\n\n")
         f.write("#ifndef BLACKJACK_POLICY_H\n")
         f.write("#define BLACKJACK_POLICY_H\n\n")
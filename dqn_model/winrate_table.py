@@ -0,0 +1,368 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import multiprocessing as mp
+import numpy as np
+from config import (NUM_DECKS, SHOE_PENETRATION, WINRATE_BATCH, WINRATE_MIN_HANDS,
+                    WINRATE_MAX_HANDS, WINRATE_HALF_WIDTH, WINRATE_WORKERS)
+from hand_tables import (EMPTY_HAND, NEXT_STATE, BEST_TOTAL, USABLE_ACE, GENERATOR_COLUMNS, hand_cell,
+                         hand_state, unpack_hand, upcard_of)
+from solver import count_bin_composition
+
+HIT, STAND, DOUBLE, SPLIT, SURRENDER = range(5)
+SPLIT_CODE = 30          # policy codes 30-32: split a pair, else play code - 30
+NUM_TOTALS, NUM_UPCARDS, NUM_TC = 22, 10, 12
+Z_95 = 1.96
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+POLICY_HEADER = os.path.join(_DIR, "Policy_table_EV", "blackjack_policy.h")
+GENERATOR_SOURCE = os.path.join(_DIR, "Policy_table_EV", "generate_table.cpp")
+OUTPUT_HEADER = os.path.join(_DIR, "..", "src", "win_rate_table.h")
+# Marks headers written with the src/main.cpp dealer columns (hand_tables.upcard_column)
+FIRMWARE_COLUMNS_TAG = "// Dealer columns: A,2,3,4,5,6,7,8,9,10 (src/main.cpp order)"
+
+
+# ---------------- POLICY HEADER ----------------
+def load_policy_header(path=POLICY_HEADER, name="blackjack_policy"):
+    """
+    Parse the `name`[22][2][10][12] initializer of a policy (or win-rate)
+    header into a uint8 array with the src/main.cpp dealer columns. Braces
+    left short (`{0}`) are zero-filled, as in C. Headers without
+    FIRMWARE_COLUMNS_TAG (blackjack_policy.h, generate_table.cpp output)
+    are in the generator's 2..10, ace order and get their columns reordered.
+    """
+    with open(path) as f:
+        text = f.read()
+    firmware_columns = FIRMWARE_COLUMNS_TAG in text
+    text = re.sub(r"//[^\n]*|/\*.*?\*/", "", text, flags=re.S)
+    body = text[text.index("=", text.index(name)) + 1:]
+    tokens = re.findall(r"\{|\}|\d+", body)
+    shape = (NUM_TOTALS, 2, NUM_UPCARDS, NUM_TC)
+    policy = np.zeros(shape, dtype=np.uint8)
+    index, depth = [], -1
+    for tok in tokens:
+        if tok == "{":
+            depth += 1
+            index.append(0)
+        elif tok == "}":
+            index.pop()
+            depth -= 1
+            if depth < 0:
+                break
+            index[-1] += 1
+        else:
+            if depth == len(shape) - 1:
+                policy[tuple(index)] = int(tok)
+            index[-1] += 1
+    return policy if firmware_columns else policy[:, :, GENERATOR_COLUMNS]
+
+
+def decode_header_actions(code, pair, ncards):
+    """
+    Actions for blackjack_policy.h codes: 30-32 split a pair, else play
+    code - 30, and DOUBLE or SPLIT where they are not allowed fall back
+    to HIT, as in generate_table.cpp.
+    """
+    act = np.where(code >= SPLIT_CODE, np.where(pair, SPLIT, code - SPLIT_CODE), code)
+    act = np.where((act == DOUBLE) & (ncards > 2), HIT, act)
+    return np.where((act == SPLIT) & ~pair, HIT, act)
+
+
+def starting_cards(pt, ace):
+    """
+    Starting cards for cell (pt, ace), dealt as generate_table.cpp does:
+    soft totals are an ace plus pt - 11, hard totals a ten plus pt - 10, or
+    a split of pt when that would be under 2. Hard 21 needs three cards.
+    None if the cell is unused.
+    """
+    if pt < 4 or (ace and pt < 12):
+        return None
+    if ace:
+        return [1, pt - 11]
+    if pt == 21:
+        return [10, 6, 5]
+    if pt - 10 >= 2:
+        return [10, pt - 10]
+    return [pt // 2, pt - pt // 2]
+
+
+# ---------------- CELL SIMULATION ----------------
+def _cell_shoe(cards, upcard, tc_col, num_decks, penetration):
+    """Unseen cards for a cell: the count-bin composition minus the cards already on the table."""
+    counts = np.rint(count_bin_composition(tc_col, num_decks, penetration)).astype(np.int64)
+    for c in cards + [upcard]:
+        counts[c] = max(counts[c] - 1, 0)
+    return np.repeat(np.arange(11, dtype=np.int8), counts)
+
+
+def play_cell_batch(policy, cards, upcard, dc, tc_col, shoe, num_hands, rng):
+    """
+    Play `num_hands` hands of one cell at once and return their scores
+    (100 win, 50 push, 0 loss, on the sign of the total profit, like
+    generate_table.cpp). Each hand gets its own shuffle of `shoe`.
+
+    Play follows generate_table.cpp (DOUBLE on two cards only, one split,
+    policy codes 30-32 split pairs, hands looked up and scored at their
+    blackjack total, see hand_tables.hand_cell, dealer hits soft 17) on the
+    environment's hand tables; naturals are settled first and code 4
+    surrenders half the bet.
+    """
+    deck = rng.permuted(np.tile(shoe, (num_hands, 1)), axis=1)
+    deck_len = deck.shape[1]
+    lanes = np.arange(num_hands)
+    cursor = np.zeros(num_hands, dtype=np.int64)
+
+    def draw(idx):
+        c = deck[idx, cursor[idx] % deck_len].astype(np.int64)
+        cursor[idx] += 1
+        return c
+
+    hole = draw(lanes)
+    dealer = NEXT_STATE[NEXT_STATE[EMPTY_HAND, upcard], hole]
+    start = hand_state(cards)
+
+    # Two hand slots per lane; slot 1 only exists after a split
+    state = np.full((num_hands, 2), start, dtype=np.int64)
+    first = np.full((num_hands, 2), cards[0], dtype=np.int64)
+    second = np.full((num_hands, 2), cards[1], dtype=np.int64)
+    bet = np.ones((num_hands, 2))
+    result = np.full((num_hands, 2), np.nan)       # settled reward, nan while live or standing
+    has_slot = np.zeros((num_hands, 2), dtype=bool)
+    has_slot[:, 0] = True
+    split_done = np.zeros(num_hands, dtype=bool)
+
+    # Naturals
+    player_bj = sorted(cards) == [1, 10]
+    dealer_bj = ((upcard == 1) & (hole == 10)) | ((upcard == 10) & (hole == 1))
+    if player_bj:
+        result[:, 0] = np.where(dealer_bj, 0.0, 1.5)
+    else:
+        result[dealer_bj, 0] = -1.0
+
+    for slot in (0, 1):
+        acting = has_slot[:, slot] & np.isnan(result[:, slot])
+        while acting.any():
+            idx = np.flatnonzero(acting)
+            st = state[idx, slot]
+            ncards = unpack_hand(st)[2]
+            total, usable = hand_cell(st)
+            code = policy[total, usable, dc, tc_col].astype(np.int64)
+            pair = (ncards == 2) & (first[idx, slot] == second[idx, slot]) & ~split_done[idx]
+            act = decode_header_actions(code, pair, ncards)
+
+            stand = idx[act == STAND]
+            acting[stand] = False
+
+            sur = idx[act == SURRENDER]
+            result[sur, slot] = -0.5
+            acting[sur] = False
+
+            dbl = idx[act == DOUBLE]
+            bet[dbl, slot] = 2.0
+            state[dbl, slot] = NEXT_STATE[state[dbl, slot], draw(dbl)]
+            acting[dbl] = False
+
+            hit = idx[act == HIT]
+            state[hit, slot] = NEXT_STATE[state[hit, slot], draw(hit)]
+
+            spl = idx[act == SPLIT]
+            if len(spl):
+                c = first[spl, slot]
+                split_done[spl] = True
+                has_slot[spl, 1] = True
+                for s in (0, 1):
+                    new = draw(spl)
+                    second[spl, s] = new
+                    state[spl, s] = NEXT_STATE[NEXT_STATE[EMPTY_HAND, c], new]
+
+            busted = idx[(BEST_TOTAL[state[idx, slot]] > 21)]
+            result[busted, slot] = -1.0 * bet[busted, slot]
+            acting[busted] = False
+
+    # Dealer plays once if some hand is still standing (H17, as in generate_table.cpp)
+    def dealer_draws(st):
+        return (BEST_TOTAL[st] < 17) | ((BEST_TOTAL[st] == 17) & USABLE_ACE[st])
+
+    standing = has_slot & np.isnan(result)
+    live = standing.any(axis=1)
+    drawing = live & dealer_draws(dealer)
+    while drawing.any():
+        idx = np.flatnonzero(drawing)
+        dealer[idx] = NEXT_STATE[dealer[idx], draw(idx)]
+        drawing[idx] = dealer_draws(dealer[idx])
+
+    player_total = BEST_TOTAL[state]
+    dealer_total = BEST_TOTAL[dealer][:, None]
+    vs = np.where((dealer_total > 21) | (player_total > dealer_total), 1.0,
+                  np.where(player_total < dealer_total, -1.0, 0.0))
+    result = np.where(standing, vs * bet, result)
+    profit = np.where(has_slot, result, 0.0).sum(axis=1)
+    return np.where(profit > 0, 100.0, np.where(profit == 0, 50.0, 0.0))
+
+
+def simulate_cell(policy, pt, ace, dc, tc_col, seed=None, half_width=WINRATE_HALF_WIDTH,
+                  min_hands=WINRATE_MIN_HANDS, max_hands=WINRATE_MAX_HANDS, batch=WINRATE_BATCH,
+                  num_decks=NUM_DECKS, penetration=SHOE_PENETRATION):
+    """
+    Win rate of one cell, sampling batches until the 95% confidence
+    half-width is at most `half_width` (after `min_hands`, capped at
+    `max_hands`). Returns (rate, half_width, hands); unused cells are (0, 0, 0).
+    """
+    cards = starting_cards(pt, ace)
+    if cards is None:
+        return 0.0, 0.0, 0
+    rng = np.random.default_rng(seed)
+    upcard = upcard_of(dc)
+    shoe = _cell_shoe(cards, upcard, tc_col, num_decks, penetration)
+    n, total, total_sq = 0, 0.0, 0.0
+    while True:
+        scores = play_cell_batch(policy, cards, upcard, dc, tc_col, shoe, batch, rng)
+        n += len(scores)
+        total += scores.sum()
+        total_sq += np.square(scores).sum()
+        mean = total / n
+        var = max(total_sq / n - mean * mean, 0.0)
+        hw = Z_95 * np.sqrt(var / n)
+        if n >= max_hands or (n >= min_hands and hw <= half_width):
+            return mean, hw, n
+
+
+# ---------------- TABLE ----------------
+_policy = None
+
+
+def _init_worker(policy):
+    global _policy
+    _policy = policy
+
+
+def _run_cell(args):
+    (pt, ace, dc, tc_col), seed, kwargs = args
+    return simulate_cell(_policy, pt, ace, dc, tc_col, seed=seed, **kwargs)
+
+
+def generate_winrate_table(policy=None, workers=WINRATE_WORKERS, seed=0, print_progress=True, **kwargs):
+    """
+    Fill the [22][2][10][12] win-rate table (src/main.cpp dealer columns)
+    with simulate_cell across a process pool (`workers`=0 uses every core). Every cell gets its own
+    seed from `seed`, so the table is reproducible for a given policy.
+    Returns (rates, half_widths, hands), each shaped like the table.
+    """
+    if policy is None:
+        policy = load_policy_header()
+    cells = [(pt, ace, dc, tc) for pt in range(NUM_TOTALS) for ace in range(2)
+             for dc in range(NUM_UPCARDS) for tc in range(NUM_TC)]
+    seeds = np.random.SeedSequence(seed).spawn(len(cells))
+    jobs = [(cell, s, kwargs) for cell, s in zip(cells, seeds)]
+
+    shape = (NUM_TOTALS, 2, NUM_UPCARDS, NUM_TC)
+    rates, half_widths = np.zeros(shape), np.zeros(shape)
+    hands = np.zeros(shape, dtype=np.int64)
+    start = time.time()
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(policy,)) as pool:
+        for i, (rate, hw, n) in enumerate(pool.imap(_run_cell, jobs, chunksize=8)):
+            rates[cells[i]], half_widths[cells[i]], hands[cells[i]] = rate, hw, n
+            if print_progress and (i + 1) % 480 == 0:
+                print(f"[{i + 1:,}/{len(cells):,} cells] hands={hands.sum():,} | Time={time.time() - start:.1f}s")
+    if print_progress:
+        print(f"[✅] {hands.sum():,} hands in {time.time() - start:.1f}s, "
+              f"max 95% half-width {half_widths.max():.2f}")
+    return rates, half_widths, hands
+
+
+def write_winrate_header(rates, half_widths=None, path=OUTPUT_HEADER):
+    """Write `rates` in the src/win_rate_table.h format (rounded down, like generate_table.cpp)."""
+    table = np.floor(rates).astype(np.uint8)
+    with open(path, "w") as f:
+        f.write("#ifndef BLACKJACK_WINRATES_H\n")
+        f.write("#define BLACKJACK_WINRATES_H\n\n")
+        f.write("#include <stdint.h>\n\n")
+        f.write("// Win Rate Table (0 to 100)\n")
+        f.write("// 0 = Loss, 50 = Push, 100 = Win\n")
+        f.write(FIRMWARE_COLUMNS_TAG + "\n")
+        if half_widths is not None:
+            f.write(f"// Every cell within +/-{half_widths.max():.2f} (95% CI)\n")
+        f.write(f"const uint8_t blackjack_winrates[{NUM_TOTALS}][2][{NUM_UPCARDS}][{NUM_TC}] = {{\n")
+        for pt in range(NUM_TOTALS):
+            f.write(f"    // Total {pt}\n")
+            f.write("    {\n")
+            for ace in range(2):
+                rows = ",".join("{" + ",".join(str(v) for v in table[pt, ace, dc]) + "}"
+                                for dc in range(NUM_UPCARDS))
+                f.write("        {" + rows + "}" + ("," if ace < 1 else "") + "\n")
+            f.write("    }" + ("," if pt < NUM_TOTALS - 1 else "") + "\n")
+        f.write("};\n\n")
+        f.write("#endif\n")
+
+
+def regenerate(path=OUTPUT_HEADER, **kwargs):
+    """generate_winrate_table + write_winrate_header; the error bounds go next to the header as .npz."""
+    rates, half_widths, hands = generate_winrate_table(**kwargs)
+    write_winrate_header(rates, half_widths, path)
+    np.savez(os.path.splitext(path)[0] + "_ci.npz", rates=rates, half_widths=half_widths, hands=hands)
+    print(f"[✅] Wrote {path}")
+    return rates, half_widths, hands
+
+
+# ---------------- CHECK AGAINST generate_table.cpp ----------------
+# (total, usable ace, dealer column, count column): mostly soft hands, at a zero count
+CHECK_CELLS = ((13, 1, 5, 5), (17, 1, 4, 5), (18, 1, 9, 5), (19, 1, 6, 5), (20, 1, 9, 5), (20, 1, 5, 5),
+               (12, 0, 3, 5), (16, 0, 9, 5))
+
+_GENERATOR_HARNESS = """
+#define main generate_table_main
+#include "generate_table.cpp"
+#undef main
+#include <cstdio>
+#include <cstdlib>
+int main(int argc, char** argv) {
+    long n = atol(argv[1]);
+    for (int i = 2; i + 3 < argc; i += 4) {
+        long total = 0;
+        for (long k = 0; k < n; ++k) total += playHand(atoi(argv[i]), atoi(argv[i + 1]), atoi(argv[i + 2]), atoi(argv[i + 3]));
+        printf("%.4f\\n", (double)total / n);
+    }
+    return 0;
+}
+"""
+
+
+def check_against_generator(cells=CHECK_CELLS, hands=200_000, tolerance=1.5, seed=0, compiler=None):
+    """
+    Win rates of `cells` from simulate_cell next to generate_table.cpp's
+    own playHand (built against Policy_table_EV/blackjack_policy.h),
+    `hands` hands each. The generator deals from an infinite deck and never
+    peeks for a dealer natural, so rates agree to about a point, not
+    exactly; a cell passes within `tolerance` points. Returns rows of
+    (cell, python rate, C++ rate, passed), or None without a C++ compiler.
+    """
+    compiler = compiler or shutil.which("c++") or shutil.which("g++")
+    if compiler is None:
+        print("[🟢] No C++ compiler, skipping the generate_table.cpp check")
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        src, exe = os.path.join(tmp, "harness.cpp"), os.path.join(tmp, "harness")
+        with open(src, "w") as f:
+            f.write(_GENERATOR_HARNESS)
+        subprocess.run([compiler, "-O2", "-I", os.path.dirname(GENERATOR_SOURCE), "-o", exe, src], check=True)
+        args = [str(v) for pt, ace, dc, tc in cells for v in (pt, ace, GENERATOR_COLUMNS[dc], tc)]
+        output = subprocess.run([exe, str(hands), *args], check=True, capture_output=True, text=True).stdout
+    cpp_rates = [float(v) for v in output.split()]
+
+    policy = load_policy_header()
+    seeds = np.random.SeedSequence(seed).spawn(len(cells))
+    rows = []
+    for cell, s, cpp in zip(cells, seeds, cpp_rates):
+        rate, _, _ = simulate_cell(policy, *cell, seed=s, min_hands=hands, max_hands=hands)
+        rows.append((cell, rate, cpp, abs(rate - cpp) <= tolerance))
+    for (pt, ace, dc, tc), rate, cpp, passed in rows:
+        print(f"{'soft' if ace else 'hard'} {pt:>2} vs {upcard_of(dc):>2} (tc col {tc}): "
+              f"python={rate:6.2f} c++={cpp:6.2f} diff={rate - cpp:+5.2f}{'' if passed else '  MISMATCH'}")
+    failed = sum(not r[3] for r in rows)
+    print(f"[{'❌' if failed else '✅'}] {len(rows) - failed}/{len(rows)} cells within {tolerance} points "
+          f"of generate_table.cpp")
+    return rows